@@ -0,0 +1,129 @@
+"""Peak memory and GC time of list export row handling.
+
+Compares per-row dicts (``dict(zip(headers, row))`` coerced by
+``coerce_list_export_to_api_v3``) with compact ``ListMemberExportRow``
+objects expanded only at the writer, on a synthetic export:
+
+    $ python benchmarks/list_export_memory.py --rows 1000000
+
+Rows wait in a buffer of ``--buffer`` rows before they are serialized, as
+they do in a prefetch queue.
+"""
+
+import argparse
+import gc
+import json
+import os
+import sys
+import time
+import tracemalloc
+from collections import deque
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from tap_mailchimp.client import (ApiVersionTool, ExportRow,  # noqa: E402
+                                  ListMemberExportRow, Status)
+
+MERGE_FIELDS = [{'type': 'text', 'name': 'Field {}'.format(i),
+                 'tag': 'F{}'.format(i)} for i in range(20)]
+MERGE_FIELDS += [{'type': 'number', 'name': 'Score', 'tag': 'SCORE'},
+                 {'type': 'date', 'name': 'Birthday', 'tag': 'BDAY'}]
+HEADERS = (['Email Address', 'MEMBER_RATING', 'OPTIN_TIME', 'CONFIRM_TIME',
+            'LATITUDE', 'LONGITUDE', 'GMTOFF', 'DSTOFF', 'TIMEZONE', 'CC',
+            'LAST_CHANGED', 'LEID', 'EUID', 'NOTES'] +
+           [f['name'] for f in MERGE_FIELDS])
+
+
+def export_lines(rows):
+    yield json.dumps(HEADERS)
+    for i in range(rows):
+        yield json.dumps(['user{}@example.com'.format(i), 2,
+                          '2017-01-01 10:00:00', '2017-01-01 10:05:00',
+                          '42.36', '-71.06', '-5', '-4', 'America/New_York',
+                          'US', '2018-03-04 05:06:07', str(i), 'e{}'.format(i),
+                          ''] +
+                         ['value {} {}'.format(i, j) for j in range(20)] +
+                         [str(i % 100), '1990-05-06'])
+
+
+def dict_rows(lines, mappings):
+    headers = json.loads(next(lines))
+    for line in lines:
+        export_data = dict(zip(headers, json.loads(line)))
+        yield ApiVersionTool.coerce_list_export_to_api_v3(
+            mappings, 'L1', Status.subscribed, export_data
+        )
+
+
+def compact_rows(lines, mappings):
+    headers = json.loads(next(lines))
+    header_index = {h: i for i, h in enumerate(headers)}
+    plan = ApiVersionTool.compile_list_export_plan(mappings, header_index)
+    for line in lines:
+        row = ExportRow(headers, header_index, json.loads(line))
+        yield ListMemberExportRow(plan, 'L1', Status.subscribed, row.values)
+
+
+def write(rows, buffer_size):
+    """Serialize rows after they waited in a buffer. Returns bytes written."""
+    buffer = deque()
+    n_bytes = 0
+    for row in rows:
+        buffer.append(row)
+        if len(buffer) > buffer_size:
+            n_bytes += _serialize(buffer.popleft())
+    while buffer:
+        n_bytes += _serialize(buffer.popleft())
+    return n_bytes
+
+
+def _serialize(row):
+    if isinstance(row, ListMemberExportRow):
+        row = row.to_api_v3()
+    return len(json.dumps(row))
+
+
+def measure(pipeline, rows, buffer_size, trace):
+    mappings = ApiVersionTool.api_v3_map_with_merge_fields(MERGE_FIELDS)
+    gc_time = [0.0]
+    gc_start = [0.0]
+
+    def on_gc(phase, info):
+        if phase == 'start':
+            gc_start[0] = time.perf_counter()
+        else:
+            gc_time[0] += time.perf_counter() - gc_start[0]
+
+    gc.collect()
+    gc.callbacks.append(on_gc)
+    if trace:
+        tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        write(pipeline(export_lines(rows), mappings), buffer_size)
+        elapsed = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1] if trace else None
+    finally:
+        if trace:
+            tracemalloc.stop()
+        gc.callbacks.remove(on_gc)
+    return {'seconds': round(elapsed, 2), 'gc_seconds': round(gc_time[0], 3),
+            'peak_mib': None if peak is None else round(peak / 2 ** 20, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--buffer', type=int, default=10000)
+    args = parser.parse_args()
+    for name, pipeline in (('dict', dict_rows), ('compact', compact_rows)):
+        # Time and GC without tracemalloc, which slows allocation down.
+        result = measure(pipeline, args.rows, args.buffer, trace=False)
+        result['peak_mib'] = measure(pipeline, args.rows, args.buffer,
+                                     trace=True)['peak_mib']
+        print(json.dumps({'pipeline': name, 'rows': args.rows,
+                          'buffer': args.buffer, **result}))
+
+
+if __name__ == '__main__':
+    main()
@@ -35,4 +35,9 @@ setup(name='tap-mailchimp',
       install_requires=['python-dateutil',
                         'requests',
                         'singer-python'],
-      entry_points={'console_scripts': ['tap-mailchimp = tap_mailchimp:main']})
+      extras_require={'streaming': ['ijson>=3.1'],
+                      'columnar': ['pyarrow']},
+      entry_points={'console_scripts': [
+          'tap-mailchimp = tap_mailchimp:main',
+          'tap-mailchimp-merge-state = tap_mailchimp.shards:main'
+      ]})
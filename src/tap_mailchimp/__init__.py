@@ -7,6 +7,19 @@ Tap data:
     $ tap-mailchimp -c config.json [--catalog catalog.json] [--state state.json]
 
 By default all data is tapped.
+
+Tap one of several shards of the list members and email activity:
+
+    $ tap-mailchimp -c config.json --shard-index 0 --shard-count 3
+
+Merge the states of the shards:
+
+    $ tap-mailchimp-merge-state state-0.json state-1.json state-2.json
+
+Tap several accounts in one process with a config listing them (see
+`tap_mailchimp.accounts`):
+
+    $ tap-mailchimp -c accounts.json [--state state.json]
 """
 
 from tap_mailchimp.main import main
@@ -0,0 +1,213 @@
+"""Tap several MailChimp accounts in one process.
+
+Usage:
+
+    $ tap-mailchimp -c accounts.json [--catalog catalog.json] [--state state.json]
+
+where the config holds settings shared by every account and the accounts:
+
+    {"accounts": [{"account": "acme",
+                   "user_name": "acme",
+                   "api_key": "...-us1"},
+                  {"account": "globex",
+                   "user_name": "globex",
+                   "api_key": "...-us6",
+                   "start_date": "2020-01-01"}],
+     "start_date": "2019-01-01",
+     "account_workers": 2}
+
+Settings of an account override the shared ones, except the settings of the
+process (workers, HTTP pool, rate limit and HTTP metrics). The streams of an
+account are named ``<account>__<stream>``, also in the discovered catalog, its
+columnar output goes to
+``<output_dir>/<account>`` and its fingerprint index to
+``<fingerprint_index>.<account>``. The state holds the state of each account
+by account name.
+
+The accounts share one HTTP connection pool per data center, an optional
+request rate limit and the schema documents.
+"""
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import tap_mailchimp.jsonext as json
+import tap_mailchimp.logger as logger
+from .config import (Keys, TapConfig, DEFAULT_ACCOUNT_WORKERS,
+                     DEFAULT_HTTP_METRICS_INTERVAL, DEFAULT_HTTP_POOL_SIZE,
+                     DEFAULT_MAX_REQUESTS_PER_SECOND, DEFAULT_OUTPUT_DIR,
+                     DEFAULT_RAW_HTTP_METRICS)
+from .messages import write_state_json
+from .metrics import http_metrics
+from .pools import SessionPool
+from .state import TapState
+from .streams import Stream
+from .tap import MailChimpTap
+
+# Shared settings of the process rather than of the accounts.
+_process_keys = (Keys.accounts, Keys.account_workers, Keys.http_pool_size,
+                 Keys.max_requests_per_second, Keys.raw_http_metrics,
+                 Keys.http_metrics_interval)
+
+
+def is_multi_account(config):
+    return Keys.accounts in config
+
+
+def account_configs(config):
+    """`TapConfig` of each account of a multi-account config dict."""
+    shared = {k: v for k, v in config.items() if k not in _process_keys}
+    configs = []
+    names = set()
+    for account in config[Keys.accounts]:
+        name = account.get(Keys.account)
+        if not name or name in names:
+            raise ValueError('Every account needs a unique name',
+                             {'account': name})
+        names.add(name)
+        for key in _process_keys:
+            if key in account:
+                raise ValueError('Setting of the process, not of an account',
+                                 {'account': name, 'key': key})
+        cfg = {**shared, **account}
+        cfg.setdefault(Keys.stream_prefix, '{}__'.format(name))
+        if Keys.output_dir not in account:
+            cfg[Keys.output_dir] = os.path.join(
+                shared.get(Keys.output_dir, DEFAULT_OUTPUT_DIR), name
+            )
+        if (shared.get(Keys.fingerprint_index) and
+                Keys.fingerprint_index not in account):
+            cfg[Keys.fingerprint_index] = '{}.{}'.format(
+                shared[Keys.fingerprint_index], name
+            )
+        configs.append(TapConfig(cfg))
+    return configs
+
+
+def account_catalog(catalog, prefix):
+    """Catalog entries of the account whose streams are named `prefix` + id.
+
+    The entries are renamed to the tap's stream ids. Entries of unprefixed
+    stream ids apply to every account; those of other accounts are dropped.
+    """
+    if catalog is None:
+        return None
+    prefix = prefix or ''
+    entries = []
+    for entry in catalog.get('streams', []):
+        stream_id = entry.get('tap_stream_id') or entry['stream']
+        if stream_id in Stream.supported_streams:
+            entries.append(entry)
+        elif (prefix and stream_id.startswith(prefix) and
+              stream_id[len(prefix):] in Stream.supported_streams):
+            stream_id = stream_id[len(prefix):]
+            entries.append(dict(entry, tap_stream_id=stream_id,
+                                stream=stream_id))
+    return {'streams': entries}
+
+
+class AccountStates:
+    """States of several accounts, written as one state message.
+
+    Every state message holds the latest state of each account, so that the
+    state written by one account never drops the others.
+    """
+
+    def __init__(self, state=None):
+        self._states = state or {}
+        self._lock = threading.Lock()
+        self._json = {name: json.dumps(s) for name, s in self._states.items()}
+
+    def state(self, account):
+        return TapState(self._states.get(account),
+                        writer=lambda value_json: self._write(account,
+                                                              value_json))
+
+    def _write(self, account, value_json):
+        with self._lock:
+            self._json[account] = value_json
+            write_state_json('{{{}}}'.format(', '.join(
+                '{}: {}'.format(json.dumps(name), v)
+                for name, v in self._json.items()
+            )))
+
+
+class MultiAccountTap:
+    """Run one `MailChimpTap` per account, `account_workers` at a time.
+
+    Usage:
+        >>> tap = MultiAccountTap(config, state)
+        >>> tap.pour()
+
+    Args:
+        config (dict): Multi-account config, see the module docstring.
+        state (dict): State of each account by account name. Optional.
+        catalog (dict): Catalog with the prefixed streams of the accounts,
+            see `account_catalog`. Optional.
+    """
+
+    def __init__(self, config, state=None, catalog=None):
+        self.configs = account_configs(config)
+        self.states = AccountStates(state)
+        self.catalog = catalog
+        self.workers = config.get(Keys.account_workers,
+                                  DEFAULT_ACCOUNT_WORKERS)
+        self.raw_http_metrics = config.get(Keys.raw_http_metrics,
+                                           DEFAULT_RAW_HTTP_METRICS)
+        self.http_metrics_interval = config.get(
+            Keys.http_metrics_interval, DEFAULT_HTTP_METRICS_INTERVAL
+        )
+        self.pool = SessionPool(
+            pool_size=config.get(Keys.http_pool_size, DEFAULT_HTTP_POOL_SIZE),
+            max_requests_per_second=config.get(
+                Keys.max_requests_per_second, DEFAULT_MAX_REQUESTS_PER_SECOND
+            )
+        )
+
+    def tap(self, config):
+        return MailChimpTap(config, self.states.state(config.account),
+                            catalog=account_catalog(self.catalog,
+                                                    config.stream_prefix),
+                            session=self.pool.session(config.api_key),
+                            shared_http_metrics=True)
+
+    def pour(self):
+        """Pour every account. Returns False if an account failed."""
+        # HTTP metrics are aggregated for the whole process.
+        http_metrics.configure(raw=self.raw_http_metrics,
+                               interval=self.http_metrics_interval)
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                return all(executor.map(self._pour_account, self.configs))
+        finally:
+            http_metrics.flush()
+            self.pool.close()
+
+    def discover(self):
+        """Catalog with the streams of every account, named by its prefix.
+
+        The schemas are only discovered for the first account; they are the
+        same for every account.
+        """
+        try:
+            catalog = self.tap(self.configs[0]).discover()
+        finally:
+            self.pool.close()
+        entries = []
+        for config in self.configs:
+            prefix = config.stream_prefix or ''
+            entries.extend(dict(entry,
+                                tap_stream_id=prefix + entry['tap_stream_id'],
+                                stream=prefix + entry['stream'])
+                           for entry in catalog['streams'])
+        return {'streams': entries}
+
+    def _pour_account(self, config):
+        logger.info({'action': 'start', 'account': config.account})
+        try:
+            self.tap(config).pour()
+        except Exception as e:
+            logger.exception(e, account=config.account)
+            return False
+        logger.info({'action': 'finish', 'account': config.account})
+        return True
@@ -0,0 +1,159 @@
+"""Bulk reads through the `MailChimp Batch Operations API`_.
+
+Many GET operations are submitted at once to ``/batches``; the finished batch
+is downloaded as a gzipped tar archive of JSON files holding the responses.
+
+.. _`MailChimp Batch Operations API`:
+   https://developer.mailchimp.com/documentation/mailchimp/guides/how-to-use-batch-operations/
+"""
+
+import time
+from contextlib import closing
+from urllib.parse import urljoin
+import requests
+from singer.metrics import Tag
+import tap_mailchimp.logger as logger
+import tap_mailchimp.jsonext as json
+from .metrics import http_timer, STATUS_HOOKS
+from .utils import check_deadline
+
+DEFAULT_POLL_INTERVAL = 10
+
+
+class BatchError(Exception):
+    pass
+
+
+class BatchStatus:
+    pending = 'pending'
+    preprocessing = 'preprocessing'
+    started = 'started'
+    finalizing = 'finalizing'
+    finished = 'finished'
+
+    _running = (pending, preprocessing, started, finalizing)
+
+
+class BatchOperations:
+    """Run GET operations as one MailChimp batch.
+
+    Args:
+        base_url (str): API v3 base URL, e.g.
+            'https://us1.api.mailchimp.com/3.0/'.
+        auth: requests authentication for the API.
+        headers (dict): Request headers. Optional.
+        timeout (float): Request timeout in seconds. Optional.
+        poll_interval (float): Seconds between batch status requests.
+        max_wait (float): Seconds to wait for a batch to finish before
+            raising `BatchError`. Optional, default is to wait forever.
+        session (requests.Session): Session sending the requests. Optional.
+    """
+
+    def __init__(self, base_url, auth=None, headers=None, timeout=None,
+                 poll_interval=DEFAULT_POLL_INTERVAL, max_wait=None,
+                 session=None):
+        self.base_url = base_url if base_url.endswith('/') else base_url + '/'
+        self.poll_interval = poll_interval
+        self.max_wait = max_wait
+        self._auth = auth
+        self._headers = headers
+        self._timeout = timeout
+        self._http = session or requests
+
+    def run(self, operations, deadline=None):
+        """Submit `operations` and yield their results once finished.
+
+        Each result is a dict with `operation_id`, `status_code` and the
+        decoded JSON `response`. Results are not ordered.
+        """
+        batch = self.submit(operations)
+        batch = self.wait(batch['id'], deadline=deadline)
+        yield from self.results(batch)
+
+    def submit(self, operations):
+        url = urljoin(self.base_url, 'batches')
+        with http_timer({Tag.endpoint: 'batches',
+                         'action': 'submit',
+                         'operations': len(operations)}):
+            response = self._http.post(url, json={'operations': operations},
+                                       auth=self._auth, headers=self._headers,
+                                       timeout=self._timeout,
+                                       hooks=STATUS_HOOKS)
+        response.raise_for_status()
+        batch = response.json()
+        logger.info({'action': 'submit_batch',
+                     'batch_id': batch['id'],
+                     'operations': len(operations)})
+        return batch
+
+    def status(self, batch_id):
+        url = urljoin(self.base_url, 'batches/{}'.format(batch_id))
+        response = self._http.get(url, auth=self._auth, headers=self._headers,
+                                  timeout=self._timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def wait(self, batch_id, deadline=None):
+        start = time.time()
+        while True:
+            check_deadline(deadline)
+            batch = self.status(batch_id)
+            if batch['status'] == BatchStatus.finished:
+                logger.info({'action': 'finish_batch',
+                             'batch_id': batch_id,
+                             'total_operations': batch.get('total_operations'),
+                             'errored_operations':
+                                 batch.get('errored_operations'),
+                             'wait_time': time.time() - start})
+                return batch
+            if batch['status'] not in BatchStatus._running:
+                raise BatchError('Batch failed',
+                                 {'batch_id': batch_id,
+                                  'status': batch['status']})
+            if self.max_wait and time.time() - start > self.max_wait:
+                raise BatchError('Batch did not finish in time',
+                                 {'batch_id': batch_id,
+                                  'status': batch['status'],
+                                  'max_wait': self.max_wait})
+            time.sleep(self.poll_interval)
+
+    def results(self, batch):
+        url = batch['response_body_url']
+        with http_timer({Tag.endpoint: 'batches',
+                         'action': 'download',
+                         'batch_id': batch['id']}):
+            response = self._http.get(url, stream=True, timeout=self._timeout,
+                                      hooks=STATUS_HOOKS)
+        if not response.ok:
+            # Results are deleted some days after the batch finished.
+            response.close()
+            raise BatchError('Batch results are not available',
+                             {'batch_id': batch['id'],
+                              'status_code': response.status_code})
+        import tarfile
+        with closing(response):
+            # Stream through the archive without saving it to disk.
+            with tarfile.open(fileobj=response.raw, mode='r|gz') as archive:
+                for member in archive:
+                    if not member.isfile():
+                        continue
+                    with closing(archive.extractfile(member)) as f:
+                        operation_results = json.loads(f.read().decode('utf-8'))
+                    for result in operation_results:
+                        yield self._decode_result(batch, result)
+
+    @staticmethod
+    def _decode_result(batch, result):
+        status_code = result.get('status_code')
+        body = result.get('response')
+        if isinstance(body, str):
+            body = json.loads(body) if body else None
+        if status_code is None or status_code >= 400:
+            raise BatchError('Batch operation failed',
+                             {'batch_id': batch['id'],
+                              'operation_id': result.get('operation_id'),
+                              'status_code': status_code,
+                              'response': body})
+        return {'operation_id': result.get('operation_id'),
+                'status_code': status_code,
+                'response': body}
@@ -0,0 +1,88 @@
+"""Catalog discovery and stream/property selection for singer.io."""
+
+import os
+import time
+from singer import metadata
+import tap_mailchimp.logger as logger
+import tap_mailchimp.jsonext as json
+
+
+def discover(streams):
+    """Build a catalog dict from `TapStream` objects."""
+    entries = []
+    for stream in streams:
+        schema = stream.schema.to_dict()
+        key_properties = stream._key_properties
+        if stream.replication_key is None:
+            replication = {'replication_method': 'FULL_TABLE'}
+        else:
+            replication = {'replication_method': 'INCREMENTAL',
+                           'valid_replication_keys': [stream.replication_key]}
+        mdata = metadata.get_standard_metadata(schema=schema,
+                                               key_properties=key_properties,
+                                               **replication)
+        mdata = metadata.to_map(mdata)
+        for prop in schema.get('properties', {}):
+            mdata = metadata.write(mdata, ('properties', prop),
+                                   'selected-by-default', True)
+        entries.append({'tap_stream_id': stream.stream_id,
+                        'stream': stream.stream_id,
+                        'key_properties': key_properties,
+                        'schema': schema,
+                        'metadata': metadata.to_list(mdata)})
+    return {'streams': entries}
+
+
+def load_cached_catalog(path, max_age):
+    """Load a catalog cached at `path` if younger than `max_age` hours."""
+    if not path or not os.path.exists(path):
+        return None
+    age = (time.time() - os.path.getmtime(path)) / 3600
+    if max_age is not None and age > max_age:
+        logger.info({'action': 'expire', 'target': 'catalog_cache',
+                     'path': path, 'age_hours': age})
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def write_cached_catalog(path, catalog):
+    tmp_path = '{}.tmp'.format(path)
+    with open(tmp_path, 'w') as f:
+        json.dump(catalog, f)
+    os.replace(tmp_path, path)
+
+
+def stream_selection(catalog):
+    """Map each selected stream id to its selected top-level properties.
+
+    A property is selected if it is marked `selected`, has `automatic`
+    inclusion, or is `selected-by-default` and not explicitly deselected.
+    The value is None when every property of the stream is selected.
+
+    Args:
+        catalog (dict): Catalog (or legacy properties) in dict form.
+    """
+    selection = {}
+    for entry in catalog.get('streams', []):
+        stream_id = entry.get('tap_stream_id') or entry['stream']
+        mdata = metadata.to_map(entry.get('metadata', []))
+        schema = entry.get('schema', {})
+        if not _is_selected(mdata, (), schema):
+            continue
+        all_props = schema.get('properties', {})
+        props = {prop for prop, spec in all_props.items()
+                 if _is_selected(mdata, ('properties', prop), spec)}
+        selection[stream_id] = None if props == set(all_props) else props
+    return selection
+
+
+def _is_selected(mdata, breadcrumb, schema):
+    if metadata.get(mdata, breadcrumb, 'inclusion') == 'automatic':
+        return True
+    selected = metadata.get(mdata, breadcrumb, 'selected')
+    if selected is None:
+        selected = schema.get('selected')
+    if selected is None and breadcrumb:
+        selected = metadata.get(mdata, breadcrumb, 'selected-by-default')
+    return bool(selected)
@@ -5,27 +5,42 @@ We use this to wrap the mailchimp3_ client and augment with:
 1. Schema support.
 2. Streaming responses especially for large datasets.
 3. Access to the `MailChimp export API`_.
+4. Bulk reads through the batch operations API (see `tap_mailchimp.batch`).
+5. Incremental parsing of large API v3 pages (requires ijson_).
 
 .. _mailchimp3: https://pypi.python.org/pypi/mailchimp3
 
+.. _ijson: https://pypi.python.org/pypi/ijson
+
 .. _`MailChimp export API`:
    https://developer.mailchimp.com/documentation/mailchimp/guides/how-to-use-the-export-api/
 """
 
-from collections import namedtuple
+from collections import abc, namedtuple
+from concurrent.futures import Future, ThreadPoolExecutor
+import copy
 from datetime import datetime
 from json.decoder import JSONDecodeError
-from contextlib import closing
-from urllib.parse import urlparse
+from contextlib import closing, contextmanager
+from urllib.parse import urljoin, urlparse
+import threading
+import time
 import requests
-from mailchimp3 import MailChimp as MailChimp3ApiClient
-from singer import Timer
-from singer.metrics import Metric, Tag
-from .utils import (walk, datify, datify_or_none, int_or_float,
-                    mailchimp_email_id, set_deep)
+from requests.structures import CaseInsensitiveDict
+from singer.metrics import Tag
+from .utils import (check_deadline, datify, datify_or_none,
+                    int_or_float, mailchimp_email_id, set_deep)
 import tap_mailchimp.logger as logger
 import tap_mailchimp.jsonext as json
-from .metrics import progress_counter
+from .batch import BatchOperations, DEFAULT_POLL_INTERVAL
+from .metrics import (http_metrics, http_timer, progress_counter,
+                      response_bytes, STATUS_HOOKS)
+
+
+BATCH_PAGE_SIZE = 1000
+# Export lines between deadline checks.
+EXPORT_CHECK_INTERVAL = 1000
+REF_FETCH_WORKERS = 8
 
 
 class SubscriberActivityExportError(Exception):
@@ -44,21 +59,191 @@ class HashAlgo:
     _available = (sha256,)
 
 
+class ExportRow:
+    """Raw list export row with a header shared by all rows.
+
+    `header_index` maps a column name to its position; with duplicate
+    column names the last one wins, as in a dict built from the row.
+    """
+
+    __slots__ = ('headers', 'header_index', 'values')
+
+    def __init__(self, headers, header_index, values):
+        self.headers = headers
+        self.header_index = header_index
+        self.values = values
+
+    def to_dict(self):
+        return dict(zip(self.headers, self.values))
+
+
+ExportPlan = namedtuple('ExportPlan', ['email_index', 'columns'])
+
+
+class ListMemberExportRow:
+    """List export row pending coercion to an API v3 list member."""
+
+    __slots__ = ('plan', 'list_id', 'status', 'values')
+
+    def __init__(self, plan, list_id, status, values):
+        self.plan = plan
+        self.list_id = list_id
+        self.status = status
+        self.values = values
+
+    def to_api_v3(self):
+        return ApiVersionTool.expand_list_export_row(self.plan, self.list_id,
+                                                     self.status, self.values)
+
+
+def _wire_bytes(response):
+    """Bytes of a response body read off the wire, before decoding."""
+    try:
+        return response.raw.tell()
+    except (AttributeError, OSError):
+        return None
+
+
+@contextmanager
+def _transfer_counter(response, endpoint):
+    """Count decoded bytes of streamed response lines and log them with the
+    wire bytes once the response is closed.
+
+    Usage:
+        >>> with _transfer_counter(response, 'list_export') as lines:
+        ...     for line in lines(response.iter_lines()):
+        ...         pass
+    """
+    decoded = [0]
+
+    def lines(iterable):
+        for line in iterable:
+            # iter_lines strips the line separator.
+            decoded[0] += len(line) + 1
+            yield line
+    try:
+        yield lines
+    finally:
+        response_bytes(decoded[0], endpoint,
+                       {'content_encoding':
+                            response.headers.get('Content-Encoding')},
+                       wire_bytes=_wire_bytes(response))
+
+
+class RefCache:
+    """Thread-safe cache of JSON documents by URL path.
+
+    Concurrent requests for the same path share a single fetch. The host is
+    not part of the key: schema documents are the same on every data center.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._futures = {}
+
+    def get(self, url, fetch):
+        """Return the document at `url`, fetched by `fetch(url)` once."""
+        key = urlparse(url)._replace(scheme='', netloc='').geturl()
+        with self._lock:
+            future = self._futures.get(key)
+            owner = future is None
+            if owner:
+                future = self._futures[key] = Future()
+        if owner:
+            try:
+                future.set_result(fetch(url).json())
+            except Exception as e:
+                with self._lock:
+                    del self._futures[key]
+                future.set_exception(e)
+        return future.result()
+
+
+# Schema documents are the same for every client (and account) of a run.
+_ref_cache = RefCache()
+
+
+def _find_refs(obj, skip_root=False):
+    """Objects with a `$ref` in `obj`, not descending into them."""
+    refs = []
+    nodes = [obj]
+    while nodes:
+        node = nodes.pop()
+        if isinstance(node, abc.Mapping):
+            if '$ref' in node and not (skip_root and node is obj):
+                refs.append(node)
+                continue
+            nodes.extend(node.values())
+        elif isinstance(node, list):
+            nodes.extend(node)
+    return refs
+
+
+class CountingReader:
+    """File-like wrapper counting the bytes read from `fileobj`."""
+
+    def __init__(self, fileobj):
+        self.bytes_read = 0
+        self._fileobj = fileobj
+
+    def read(self, size=-1):
+        data = self._fileobj.read(size)
+        self.bytes_read += len(data)
+        return data
+
+
 class MailChimp:
     def __init__(self, user_name, api_key, user_agent=None, timeout=None,
-                 request_headers=None, exclude_links=False, **kwargs):
+                 request_headers=None, exclude_links=False, pager=None,
+                 batch_poll_interval=DEFAULT_POLL_INTERVAL,
+                 batch_max_wait=None, stream_json=False, session=None,
+                 **kwargs):
+        # Imported here (and ijson only if used) to keep startup fast.
+        from mailchimp3 import MailChimp as MailChimp3ApiClient
         self.exclude_links = exclude_links
+        self._ijson = None
+        if stream_json:
+            try:
+                import ijson
+                self._ijson = ijson
+            except ImportError:
+                logger.warning({'action': 'replace',
+                                'target': 'stream_json',
+                                'reason': 'ijson is not installed',
+                                'old': stream_json,
+                                'new': False})
+                stream_json = False
+        self.stream_json = stream_json
+        self.pager = pager
+        self.batch_poll_interval = batch_poll_interval
+        self.batch_max_wait = batch_max_wait
         self._user_name = user_name
         self._api_key = api_key
         self._timeout = timeout
-        self._headers = request_headers or requests.utils.default_headers()
+        self._headers = (CaseInsensitiveDict(request_headers)
+                         if request_headers
+                         else requests.utils.default_headers())
         if user_agent is not None:
             self._headers['User-Agent'] = user_agent
+        self._response_info = threading.local()
+        # A shared session (see pools.SessionPool) or one connection per
+        # request.
+        self._session = session
+        self._http = session or requests
+        self._ref_cache = _ref_cache
+        self._schemas = {}
         self._mc3 = MailChimp3ApiClient(user_name, api_key, timeout=timeout,
-                                        request_headers=self._headers, **kwargs)
-
-    def list_export(self, list_id, status=Status.subscribed, segment=None,
-                    since=None, hashed=None):
+                                        request_headers=self._headers,
+                                        request_hooks={
+                                            'response': self._on_response
+                                        },
+                                        **kwargs)
+        if session is not None:
+            # mailchimp3 sends every request through _make_request.
+            self._mc3._make_request = lambda **kw: session.request(**kw)
+
+    def list_export_rows(self, list_id, status=Status.subscribed, segment=None,
+                         since=None, hashed=None, deadline=None):
         post_data = {'apikey': self._api_key,
                      'id': list_id,
                      'status': status}
@@ -70,39 +255,66 @@ class MailChimp:
         if hashed:
             post_data['hashed'] = hashed
         url = '{}/list/'.format(self._export_base)
-        with Timer(Metric.http_request_duration,
-                   {Tag.endpoint: 'list_export',
-                    'url': url,
-                    'list_id': list_id,
-                    'status': status,
-                    'segment': segment,
-                    'since': since,
-                    'hashed': hashed}):
-            response = requests.post(url, data=post_data, stream=True,
-                                     timeout=self._timeout,
-                                     headers=self._headers)
-        with closing(response):
-            _iter = response.iter_lines()
+        with http_timer({Tag.endpoint: 'list_export',
+                         'url': url,
+                         'list_id': list_id,
+                         'status': status,
+                         'segment': segment,
+                         'since': since,
+                         'hashed': hashed}):
+            response = self._http.post(url, data=post_data, stream=True,
+                                       timeout=self._timeout,
+                                       headers=self._headers,
+                                       hooks=STATUS_HOOKS)
+        with closing(response), \
+                _transfer_counter(response, 'list_export') as lines:
+            _iter = lines(response.iter_lines())
             first_line = next(_iter)
             if isinstance(first_line, bytes):
                 first_line = first_line.decode('utf-8')
             headers = json.loads(first_line)
-            for l in _iter:
+            # One header index is shared by every row of the export.
+            header_index = {h: i for i, h in enumerate(headers)}
+            for i, l in enumerate(_iter):
+                if i % EXPORT_CHECK_INTERVAL == 0:
+                    check_deadline(deadline)
                 if isinstance(l, bytes):
                     l = l.decode('utf-8')
-                record = json.loads(l)
-                yield dict(zip(headers, record))
-
-    def list_export_api_v3(self, list_id, status=Status.subscribed, **kwargs):
-        merge_fields_gen = self.iter_items('lists.merge_fields', list_id=list_id,
-                                           get_all=True)
+                yield ExportRow(headers, header_index, json.loads(l))
+
+    def list_export(self, list_id, status=Status.subscribed, **kwargs):
+        for row in self.list_export_rows(list_id, status, **kwargs):
+            yield row.to_dict()
+
+    def list_export_api_v3(self, list_id, status=Status.subscribed,
+                           compact=False, properties=None, merge_fields=None,
+                           **kwargs):
+        """Iterate list export rows converted to API v3 list members.
+
+        If `compact` is true, yield `ListMemberExportRow` objects which hold
+        the raw export columns and are only coerced and expanded to API v3
+        dicts by `ListMemberExportRow.to_api_v3`. If `properties` is given,
+        only columns mapping to those top-level API v3 properties are kept.
+        The list's `merge_fields` are fetched unless given.
+        """
+        if properties is not None and 'merge_fields' not in properties:
+            merge_fields_gen = []
+        elif merge_fields is not None:
+            merge_fields_gen = merge_fields
+        else:
+            merge_fields_gen = self.iter_items('lists.merge_fields',
+                                               list_id=list_id, get_all=True)
         mappings = ApiVersionTool.api_v3_map_with_merge_fields(merge_fields_gen)
-        for item in self.list_export(list_id, status, **kwargs):
-            yield ApiVersionTool.coerce_list_export_to_api_v3(mappings, list_id,
-                                                              status, item)
+        plan = None
+        for row in self.list_export_rows(list_id, status, **kwargs):
+            if plan is None:
+                plan = ApiVersionTool.compile_list_export_plan(
+                    mappings, row.header_index, properties)
+            item = ListMemberExportRow(plan, list_id, status, row.values)
+            yield item if compact else item.to_api_v3()
 
     def subscriber_activity_export(self, campaign_id, include_empty=False,
-                                   since=None):
+                                   since=None, deadline=None):
         post_data = {'apikey': self._api_key,
                      'id': campaign_id,
                      'include_empty': include_empty}
@@ -110,19 +322,23 @@ class MailChimp:
         if since:
             post_data['since'] = since
         url = '{}/campaignSubscriberActivity/'.format(self._export_base)
-        with Timer(Metric.http_request_duration,
-                   {Tag.endpoint: 'subscriber_activity_export',
-                    'url': url,
-                    'campaign_id': campaign_id,
-                    'include_empty': include_empty,
-                    'since': since}):
-            response = requests.post(url,
-                                     data=post_data,
-                                     stream=True,
-                                     timeout=self._timeout,
-                                     headers=self._headers)
-        with closing(response):
-            for l in response.iter_lines():
+        with http_timer({Tag.endpoint: 'subscriber_activity_export',
+                         'url': url,
+                         'campaign_id': campaign_id,
+                         'include_empty': include_empty,
+                         'since': since}):
+            response = self._http.post(url,
+                                       data=post_data,
+                                       stream=True,
+                                       timeout=self._timeout,
+                                       headers=self._headers,
+                                       hooks=STATUS_HOOKS)
+        with closing(response), \
+                _transfer_counter(response,
+                                  'subscriber_activity_export') as lines:
+            for i, l in enumerate(lines(response.iter_lines())):
+                if i % EXPORT_CHECK_INTERVAL == 0:
+                    check_deadline(deadline)
                 if isinstance(l, bytes):
                     l = l.decode('utf-8')
                 # ignore empty lines
@@ -135,7 +351,8 @@ class MailChimp:
         except AttributeError:
             return dt
 
-    def subscriber_activity_export_api_v3(self, campaign_id, **kwargs):
+    def subscriber_activity_export_api_v3(self, campaign_id, properties=None,
+                                          **kwargs):
         campaign_meta = self.campaigns.get(campaign_id=campaign_id)
         list_id = campaign_meta['recipients']['list_id']
         since = self._format_time_for_export(kwargs.pop('since', None))
@@ -154,53 +371,193 @@ class MailChimp:
                     'since': since,
                     'kwargs': kwargs
                 })
-            yield ApiVersionTool.coerce_activity_export_to_api_v3(campaign_id,
-                                                                  list_id, item)
+            yield ApiVersionTool.coerce_activity_export_to_api_v3(
+                campaign_id, list_id, item, properties)
 
-    def iter_all(self, endpoint, get_all=False, offset=0, **kwargs):
+    def iter_all(self, endpoint, get_all=False, offset=0, deadline=None,
+                 **kwargs):
         api = self._api_object(endpoint)
-        args = {**kwargs}
-        if self.exclude_links:
-            ef = set(args.get('exclude_fields', '').split(','))
-            ef.add('_links')
-            ef.add('{}._links'.format(self._coll_key(endpoint)))
-            args['exclude_fields'] = ','.join(ef)
+        args = self._query_args(endpoint, kwargs)
+        pager = None if get_all else self.pager
         while True:
-            with Timer(Metric.http_request_duration,
-                       {Tag.endpoint: endpoint,
-                        'get_all': get_all,
-                        'offset': offset,
-                        **args}):
-                response = api.all(offset=offset, get_all=get_all, **args)
+            check_deadline(deadline)
+            if pager is not None:
+                args['count'] = pager.count(endpoint, kwargs.get('count'))
+            start = time.time()
+            try:
+                with http_timer({Tag.endpoint: endpoint,
+                                 'get_all': get_all,
+                                 'offset': offset,
+                                 **args}):
+                    response = api.all(offset=offset, get_all=get_all, **args)
+            except requests.exceptions.Timeout:
+                if pager is None or not pager.back_off(endpoint,
+                                                       args['count']):
+                    raise
+                continue
+            elapsed = time.time() - start
+            n_bytes, wire_bytes = self._last_response_bytes
+            response_bytes(n_bytes, endpoint, {'get_all': get_all},
+                           wire_bytes=wire_bytes)
             n = len(response[self._coll_key(endpoint)])
+            if pager is not None:
+                pager.observe(endpoint, args['count'], n, elapsed, n_bytes)
             offset += n
             yield response
             if get_all or n == 0:
                 break
 
-    def iter_items(self, endpoint, **kwargs):
+    def iter_items_streamed(self, endpoint, offset=0, deadline=None,
+                            **kwargs):
+        """Iterate items of an endpoint, parsing each page incrementally.
+
+        Items are yielded as they are read from the socket instead of after
+        the whole page is parsed.
+        """
+        kwargs.pop('get_all', None)
+        path, params = self._api_path(endpoint, kwargs)
+        params = self._query_args(endpoint, params)
+        url = urljoin(self._mc3.base_url, path.lstrip('/'))
+        prefix = '{}.item'.format(self._coll_key(endpoint))
+        pager = self.pager
+        while True:
+            check_deadline(deadline)
+            if pager is not None:
+                params['count'] = pager.count(endpoint, kwargs.get('count'))
+            start = time.time()
+            try:
+                with http_timer({Tag.endpoint: endpoint,
+                                 'offset': offset,
+                                 'streamed': True,
+                                 **params}):
+                    response = self._http.get(url,
+                                              params={**params,
+                                                      'offset': offset},
+                                              auth=self._mc3.auth,
+                                              headers=self._headers,
+                                              timeout=self._timeout,
+                                              stream=True,
+                                              hooks=STATUS_HOOKS)
+                    response.raise_for_status()
+            except requests.exceptions.Timeout:
+                if pager is None or not pager.back_off(endpoint,
+                                                       params['count']):
+                    raise
+                continue
+            n = 0
+            with closing(response):
+                response.raw.decode_content = True
+                body = CountingReader(response.raw)
+                for item in self._ijson.items(body, prefix,
+                                                     use_float=True):
+                    n += 1
+                    yield item
+            elapsed = time.time() - start
+            response_bytes(body.bytes_read, endpoint, {'streamed': True},
+                           wire_bytes=_wire_bytes(response))
+            if pager is not None:
+                pager.observe(endpoint, params['count'], n, elapsed,
+                              body.bytes_read)
+            offset += n
+            if n == 0:
+                break
+
+    def batch_iter_items(self, endpoint, count=None, offset=0, deadline=None,
+                         **kwargs):
+        """Iterate items of an endpoint fetched in one batch of page GETs.
+
+        Items are yielded in no particular order.
+        """
+        count = count or BATCH_PAGE_SIZE
+        path, params = self._api_path(endpoint, kwargs)
+        params = self._query_args(endpoint, params)
         total_items = self.total_items(endpoint, **kwargs)
+        operations = [{'method': 'GET',
+                       'path': path,
+                       'operation_id': '{}:{}'.format(path, page_offset),
+                       'params': {**params,
+                                  'count': count,
+                                  'offset': page_offset}}
+                      for page_offset in range(offset, total_items, count)]
+        if not operations:
+            return
+        check_deadline(deadline)
+        batch = BatchOperations(self._mc3.base_url,
+                                auth=self._mc3.auth,
+                                headers=self._headers,
+                                timeout=self._timeout,
+                                poll_interval=self.batch_poll_interval,
+                                max_wait=self.batch_max_wait,
+                                session=self._session)
+        coll_key = self._coll_key(endpoint)
         with progress_counter(total_items, endpoint, tags=kwargs) as pc:
-            for response in self.iter_all(endpoint, **kwargs):
+            for result in batch.run(operations, deadline=deadline):
+                current_items = result['response'][coll_key]
+                yield from current_items
+                pc.increment(len(current_items))
+
+    def iter_items(self, endpoint, deadline=None, **kwargs):
+        total_items = self.total_items(endpoint, **kwargs)
+        with progress_counter(total_items, endpoint, tags=kwargs) as pc:
+            if self.stream_json and not kwargs.get('get_all'):
+                for item in self.iter_items_streamed(endpoint,
+                                                     deadline=deadline,
+                                                     **kwargs):
+                    yield item
+                    pc.increment()
+                return
+            for response in self.iter_all(endpoint, deadline=deadline,
+                                          **kwargs):
                 current_items = response[self._coll_key(endpoint)]
                 yield from current_items
                 pc.increment(len(current_items))
 
     def total_items(self, endpoint, **kwargs):
+        kwargs.pop('fields', None)
         api = self._api_object(endpoint)
-        with Timer(Metric.http_request_duration,
-                   {Tag.endpoint: endpoint,
-                    'fields': 'total_items',
-                    **kwargs}):
+        with http_timer({Tag.endpoint: endpoint,
+                         'fields': 'total_items',
+                         **kwargs}):
             response = api.all(fields='total_items', **kwargs)
         return response['total_items']
 
+    def projection_args(self, endpoint, included, excluded=None):
+        """Query parameters projecting collection items on some properties.
+
+        Args:
+            endpoint (str): API endpoint, e.g. 'lists.members'.
+            included (set): Top-level item properties to fetch. None for all.
+            excluded (set): Known top-level item properties not to fetch.
+                Optional; if given the shorter of `fields` or
+                `exclude_fields` is used.
+        """
+        if included is None:
+            return {}
+        coll_key = self._coll_key(endpoint)
+        fields = ['{}.{}'.format(coll_key, p) for p in sorted(included)]
+        fields = ','.join(fields + ['total_items'])
+        if excluded is not None:
+            excluded = set(excluded)
+            if self.exclude_links:
+                excluded.add('_links')
+            exclude_fields = ','.join('{}.{}'.format(coll_key, p)
+                                      for p in sorted(excluded))
+            if len(exclude_fields) < len(fields):
+                return {'exclude_fields': exclude_fields}
+        return {'fields': fields}
+
     def schema(self, endpoint='', fetch_refs=True):
         return self._get_schema(endpoint, False, fetch_refs)
 
     def item_schema(self, endpoint='', fetch_refs=True):
         return self._get_schema(endpoint, True, fetch_refs)
 
+    def cache_item_schema(self, endpoint, schema):
+        """Use `schema` as the item schema of `endpoint`, e.g. from a cached
+        catalog."""
+        url = self._schema_url(endpoint, True)
+        self._schemas[(url, True)] = copy.deepcopy(schema)
+
     def __getattr__(self, attr):
         return getattr(self._mc3, attr)
 
@@ -215,16 +572,50 @@ class MailChimp:
 
     def _get_schema(self, endpoint, item_def, fetch_refs):
         url = self._schema_url(endpoint, item_def)
-        with Timer(Metric.http_request_duration,
-                   {Tag.endpoint: endpoint,
-                    'url': url,
-                    'action': 'get_schema',
-                    'item_def': item_def,
-                    'fetch_refs': fetch_refs}):
-            schema = self._get(url).json()
-            if fetch_refs:
-                walk(schema, self._fill_in_refs)
-        return schema
+        key = (url, fetch_refs)
+        schema = self._schemas.get(key)
+        if schema is None:
+            with http_timer({Tag.endpoint: endpoint,
+                             'url': url,
+                             'action': 'get_schema',
+                             'item_def': item_def,
+                             'fetch_refs': fetch_refs}):
+                schema = copy.deepcopy(self._ref_cache.get(url, self._get))
+                if fetch_refs:
+                    self._resolve_refs(schema)
+            self._schemas[key] = schema
+        # Callers modify their schema.
+        return copy.deepcopy(schema)
+
+    def _resolve_refs(self, schema):
+        """Replace `$ref` objects in `schema` by the documents they point to.
+
+        Refs are resolved level by level: the distinct URLs of a level are
+        fetched concurrently (through the shared ref cache), then the refs
+        inside the fetched documents form the next level. A ref to a document
+        that is already being expanded further up is left as is.
+        """
+        level = [(node, ()) for node in _find_refs(schema)]
+        with ThreadPoolExecutor(max_workers=REF_FETCH_WORKERS) as executor:
+            while level:
+                urls = {node['$ref'] for node, _ in level}
+                documents = dict(zip(urls, executor.map(
+                    lambda url: self._ref_cache.get(url, self._get), urls
+                )))
+                next_level = []
+                for node, ancestors in level:
+                    url = node['$ref']
+                    if url in ancestors:
+                        logger.debug({'action': 'skip_ref',
+                                      'reason': 'cycle',
+                                      'url': url})
+                        continue
+                    node.update(copy.deepcopy(documents[url]))
+                    next_level.extend(
+                        (child, ancestors + (url,))
+                        for child in _find_refs(node, skip_root=True)
+                    )
+                level = next_level
 
     def _schema_url(self, endpoint, item_def):
         if endpoint == '':
@@ -252,7 +643,47 @@ class MailChimp:
         return urlparse(self._mc3.base_url).netloc
 
     def _get(self, url):
-        return requests.get(url, timeout=self._timeout, headers=self._headers)
+        return self._http.get(url, timeout=self._timeout,
+                              headers=self._headers)
+
+    def _on_response(self, response, *args, **kwargs):
+        # requests response hook: remember the payload size of the latest
+        # API v3 response of this thread, decoded and on the wire.
+        self._response_info.bytes = (len(response.content),
+                                     _wire_bytes(response))
+        http_metrics.set_status(response.status_code)
+        return response
+
+    @property
+    def _last_response_bytes(self):
+        return getattr(self._response_info, 'bytes', (None, None))
+
+    def _query_args(self, endpoint, kwargs):
+        args = {**kwargs}
+        if self.exclude_links and 'fields' not in args:
+            ef = set(args.get('exclude_fields', '').split(','))
+            ef.discard('')
+            ef.add('_links')
+            ef.add('{}._links'.format(self._coll_key(endpoint)))
+            args['exclude_fields'] = ','.join(ef)
+        return args
+
+    _path_map = {'lists': ('/lists', ()),
+                 'lists.members': ('/lists/{list_id}/members', ('list_id',)),
+                 'lists.merge_fields': ('/lists/{list_id}/merge-fields',
+                                        ('list_id',)),
+                 'campaigns': ('/campaigns', ()),
+                 'reports.email_activity': (
+                     '/reports/{campaign_id}/email-activity',
+                     ('campaign_id',)
+                 )}
+
+    @classmethod
+    def _api_path(cls, endpoint, kwargs):
+        """Split kwargs into the URL path of an endpoint and query params."""
+        fmt, path_keys = cls._path_map[endpoint]
+        params = {k: v for k, v in kwargs.items() if k not in path_keys}
+        return fmt.format(**kwargs), params
 
     def _api_object(self, endpoint):
         obj = self._mc3
@@ -260,14 +691,6 @@ class MailChimp:
             obj = getattr(obj, p)
         return obj
 
-    def _fill_in_refs(self, obj):
-        try:
-            url = obj['$ref']
-            json = self._get(url).json()
-            obj.update(json)
-        except (TypeError, KeyError):
-            pass
-
     _coll_key_map = {'reports.email_activity': 'emails'}
 
     @classmethod
@@ -323,7 +746,7 @@ class ApiVersionTool:
                 mappings[name]['coerce'] = datify_or_none
             else:
                 mappings[name]['coerce'] = str
-        logger.info({
+        logger.info(lambda: {
             'description': 'No API v3 mapping available for list export columns',
             'columns': [k for k, v in mappings.items() if v is None]
         })
@@ -331,7 +754,41 @@ class ApiVersionTool:
         return {k: v for k, v in mappings.items() if v is not None}
 
     @staticmethod
-    def coerce_list_export_to_api_v3(mappings, list_id, status, export_data):
+    def compile_list_export_plan(mappings, header_index, properties=None):
+        """Resolve mappings against an export header once for all rows.
+
+        Columns whose API v3 top-level property is not in `properties` are
+        pruned and never coerced.
+        """
+        columns = []
+        for old_key, xform in mappings.items():
+            i = header_index.get(old_key)
+            if i is None:
+                continue
+            path = tuple(xform['v3_key'].split('.'))
+            if properties is not None and path[0] not in properties:
+                continue
+            columns.append((i, old_key, path, xform['coerce']))
+        return ExportPlan(header_index['Email Address'], tuple(columns))
+
+    @classmethod
+    def expand_list_export_row(cls, plan, list_id, status, values):
+        api_v3_data = {'id': mailchimp_email_id(values[plan.email_index]),
+                       'list_id': list_id,
+                       'status': status}
+        n = len(values)
+        for i, old_key, path, coerce in plan.columns:
+            if i >= n:
+                continue
+            old_value = values[i]
+            if old_value is None or old_value == '':
+                continue
+            set_deep(api_v3_data, path, cls._coerce(old_key, old_value, coerce))
+        return api_v3_data
+
+    @classmethod
+    def coerce_list_export_to_api_v3(cls, mappings, list_id, status,
+                                     export_data):
         email_address = export_data['Email Address']
         api_v3_data = {'id': mailchimp_email_id(email_address),
                        'list_id': list_id,
@@ -341,22 +798,27 @@ class ApiVersionTool:
             if old_value is None or old_value == '':
                 continue
             new_key, coerce = xform['v3_key'], xform['coerce']
-            try:
-                new_value = coerce(old_value)
-            except Exception as e:
-                # Add some execution context to the error.
-                ctx = {'error': str(e),
-                       'error_type': type(e).__name__,
-                       'key': old_key,
-                       'value': old_value,
-                       'type': type(old_value).__name__,
-                       'coerce': coerce.__name__}
-                raise e.__class__(json.dumps(ctx)) from e
-            set_deep(api_v3_data, new_key, new_value, sep='.')
+            set_deep(api_v3_data, new_key, cls._coerce(old_key, old_value, coerce),
+                     sep='.')
         return api_v3_data
 
     @staticmethod
-    def coerce_activity_export_to_api_v3(campaign_id, list_id, export_data):
+    def _coerce(old_key, old_value, coerce):
+        try:
+            return coerce(old_value)
+        except Exception as e:
+            # Add some execution context to the error.
+            ctx = {'error': str(e),
+                   'error_type': type(e).__name__,
+                   'key': old_key,
+                   'value': old_value,
+                   'type': type(old_value).__name__,
+                   'coerce': coerce.__name__}
+            raise e.__class__(json.dumps(ctx)) from e
+
+    @staticmethod
+    def coerce_activity_export_to_api_v3(campaign_id, list_id, export_data,
+                                         properties=None):
         if not isinstance(export_data, dict):
             fmt = 'dict expected (got {}: {})'
             msg = fmt.format(type(export_data).__name__, export_data)
@@ -377,10 +839,14 @@ class ApiVersionTool:
             d['email_address'] = email_address
             d['email_id'] = mailchimp_email_id(email_address)
             d['list_id'] = list_id
+            if properties is not None and 'activity' not in properties:
+                continue
             d['activity'] = []
             for activity in activity_list:
                 a = {'action': activity['action'],
                      'ip': activity['ip'],
                      'timestamp': datify(activity['timestamp'])}
                 d['activity'].append(a)
+        if properties is not None:
+            d = {k: v for k, v in d.items() if k in properties}
         return d
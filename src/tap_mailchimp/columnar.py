@@ -0,0 +1,212 @@
+"""Columnar output of item streams to Parquet or Arrow IPC files.
+
+Records are written to partitioned files instead of Singer RECORD messages:
+
+    <output_dir>/<stream_id>/<partition_key>=<item_id>/part-<run>-<n>.parquet
+
+Every finished file is appended to ``<output_dir>/manifest.jsonl`` (one JSON
+object per file with stream, item id, path, format and row count), and the
+JSON schema of each stream is written to ``<output_dir>/<stream_id>/schema.json``.
+Requires pyarrow_.
+
+.. _pyarrow: https://pypi.python.org/pypi/pyarrow
+"""
+
+import os
+import threading
+import time
+import tap_mailchimp.jsonext as json
+import tap_mailchimp.logger as logger
+
+# pyarrow, imported by the first ColumnarSink; it is slow to import.
+pa = None
+
+
+class OutputFormat:
+    singer = 'singer'
+    parquet = 'parquet'
+    arrow = 'arrow'
+
+    _columnar = (parquet, arrow)
+
+
+DEFAULT_FILE_ROWS = 100000
+
+_extensions = {OutputFormat.parquet: 'parquet', OutputFormat.arrow: 'arrow'}
+
+
+class ColumnarSink:
+    """Directory of columnar files written by several item streams.
+
+    Args:
+        output_dir (str): Root directory of the files. Created if missing.
+        output_format (str): `OutputFormat.parquet` or `OutputFormat.arrow`.
+        file_rows (int): Rows per file (and row group).
+    """
+
+    def __init__(self, output_dir, output_format=OutputFormat.parquet,
+                 file_rows=DEFAULT_FILE_ROWS):
+        _import_pyarrow(output_format)
+        if output_format not in OutputFormat._columnar:
+            raise ValueError('Unknown columnar output format',
+                             {'output_format': output_format})
+        self.output_dir = output_dir
+        self.output_format = output_format
+        self.file_rows = file_rows
+        self._run = time.strftime('%Y%m%dT%H%M%S')
+        self._lock = threading.Lock()
+        self._schemas = set()
+        os.makedirs(output_dir, exist_ok=True)
+
+    def writer(self, stream_id, partition_key, item_id, json_schema):
+        with self._lock:
+            if stream_id not in self._schemas:
+                self._schemas.add(stream_id)
+                os.makedirs(os.path.join(self.output_dir, stream_id),
+                            exist_ok=True)
+                self._write_json(os.path.join(self.output_dir, stream_id,
+                                              'schema.json'),
+                                 json_schema)
+        return ColumnarWriter(self, stream_id, partition_key, item_id,
+                              json_schema)
+
+    def add_to_manifest(self, entry):
+        with self._lock:
+            path = os.path.join(self.output_dir, 'manifest.jsonl')
+            with open(path, 'a') as f:
+                f.write(json.dumps(entry) + '\n')
+
+    def _write_json(self, path, obj):
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(obj, f, indent=2)
+        os.replace(tmp_path, path)
+
+
+class ColumnarWriter:
+    """Buffer the records of one item stream and write them as files.
+
+    Records are converted to rows of an Arrow schema derived from the
+    stream's JSON schema. Objects without properties are stored as JSON
+    strings, date-times as strings.
+    """
+
+    def __init__(self, sink, stream_id, partition_key, item_id, json_schema):
+        self.rows_written = 0
+        self._sink = sink
+        self._stream_id = stream_id
+        self._item_id = item_id
+        self._directory = os.path.join(
+            sink.output_dir, stream_id, '{}={}'.format(partition_key, item_id)
+        )
+        self._schema, self._convert = _arrow_struct(json_schema)
+        self._rows = []
+        self._files = 0
+
+    @property
+    def pending(self):
+        """Number of records not yet written to a file."""
+        return len(self._rows)
+
+    @property
+    def full(self):
+        return len(self._rows) >= self._sink.file_rows
+
+    def write(self, record):
+        self._rows.append(self._convert(record))
+
+    def flush(self):
+        """Write buffered records to a new file. Returns the rows written."""
+        if not self._rows:
+            return 0
+        os.makedirs(self._directory, exist_ok=True)
+        table = pa.Table.from_pylist(self._rows, schema=self._schema)
+        name = 'part-{}-{:05d}.{}'.format(self._sink._run, self._files,
+                                          _extensions[self._sink.output_format])
+        path = os.path.join(self._directory, name)
+        tmp_path = path + '.tmp'
+        if self._sink.output_format == OutputFormat.parquet:
+            pa.parquet.write_table(table, tmp_path,
+                                   row_group_size=len(self._rows))
+        else:
+            with pa.ipc.new_file(tmp_path, self._schema) as writer:
+                writer.write_table(table)
+        os.replace(tmp_path, path)
+        n = len(self._rows)
+        self._rows = []
+        self._files += 1
+        self.rows_written += n
+        self._sink.add_to_manifest({
+            'stream': self._stream_id,
+            'item_id': self._item_id,
+            'path': os.path.relpath(path, self._sink.output_dir),
+            'format': self._sink.output_format,
+            'rows': n
+        })
+        logger.debug({'action': 'write_file', 'path': path, 'rows': n})
+        return n
+
+
+def _import_pyarrow(output_format):
+    global pa
+    if pa is not None:
+        return
+    try:
+        import pyarrow
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError as e:
+        raise ImportError('pyarrow is required for {} output'
+                          .format(output_format)) from e
+    pa = pyarrow
+
+
+def _arrow_struct(json_schema):
+    """Arrow schema of a JSON object schema and a record converter."""
+    fields = []
+    converters = []
+    for name, prop in json_schema.get('properties', {}).items():
+        type_, convert = _arrow_type(prop)
+        fields.append(pa.field(name, type_))
+        converters.append((name, convert))
+
+    def convert(record):
+        return {name: (None if record.get(name) is None
+                       else conv(record[name]))
+                for name, conv in converters}
+    return pa.schema(fields), convert
+
+
+def _arrow_type(json_schema):
+    types = json_schema.get('type', 'string')
+    if isinstance(types, list):
+        types = [t for t in types if t != 'null']
+        type_ = types[0] if len(types) == 1 else None
+    else:
+        type_ = types
+    if type_ == 'integer':
+        return pa.int64(), int
+    if type_ == 'number':
+        return pa.float64(), float
+    if type_ == 'boolean':
+        return pa.bool_(), bool
+    if type_ == 'object' and json_schema.get('properties'):
+        schema, convert = _arrow_struct(json_schema)
+        return pa.struct(list(schema)), convert
+    if type_ == 'array':
+        item_type, convert_item = _arrow_type(json_schema.get('items', {}))
+        return pa.list_(item_type), lambda v: [
+            None if x is None else convert_item(x) for x in v
+        ]
+    if type_ == 'string':
+        return pa.string(), _to_string
+    # Objects without properties and mixed types.
+    return pa.string(), json.dumps
+
+
+def _to_string(value):
+    if isinstance(value, str):
+        return value
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return json.dumps(value)
@@ -14,6 +14,43 @@ DEFAULT_INCLUDE_EMPTY_ACTIVITY = False
 DEFAULT_INTERESTS_ARRAY = True
 DEFAULT_MERGE_FIELDS_ARRAY = True
 DEFAULT_USER_AGENT = 'singer.io:tap_mailchimp/alpha'
+DEFAULT_CATALOG_CACHE = None
+DEFAULT_CATALOG_CACHE_TTL = 24
+DEFAULT_ADAPTIVE_COUNT = False
+DEFAULT_MIN_COUNT = 50
+DEFAULT_MAX_COUNT = 1000
+DEFAULT_TARGET_PAGE_TIME = 20
+DEFAULT_MAX_PAGE_BYTES = 16 * 1024 * 1024
+DEFAULT_USE_BATCH = False
+DEFAULT_BATCH_POLL_INTERVAL = 10
+DEFAULT_BATCH_MAX_WAIT = None
+DEFAULT_PIPELINE_WORKERS = 0
+DEFAULT_STATE_FLUSH_INTERVAL = 60
+DEFAULT_STATE_FLUSH_RECORDS = None
+DEFAULT_STATE_FLUSH_BYTES = None
+DEFAULT_PREFETCH_DEPTH = 0
+DEFAULT_STREAM_JSON = False
+DEFAULT_METADATA_CACHE_TTL = 24
+DEFAULT_FINGERPRINT_INDEX = None
+DEFAULT_SHARD_INDEX = 0
+DEFAULT_SHARD_COUNT = 1
+DEFAULT_OUTPUT_FORMAT = 'singer'
+DEFAULT_OUTPUT_DIR = 'output'
+DEFAULT_OUTPUT_FILE_ROWS = 100000
+DEFAULT_ASYNC_LOGGING = False
+DEFAULT_RAW_HTTP_METRICS = False
+DEFAULT_HTTP_METRICS_INTERVAL = 60
+DEFAULT_TEST_MODE = False
+DEFAULT_TEST_MODE_RECORDS = 100
+DEFAULT_TEST_MODE_ITEM_STREAMS = 3
+DEFAULT_VALIDATION_RATE = 0
+DEFAULT_INTERLEAVE_STREAMS = 0
+DEFAULT_INTERLEAVE_WEIGHTS = {}
+DEFAULT_ACCOUNT = None
+DEFAULT_STREAM_PREFIX = None
+DEFAULT_ACCOUNT_WORKERS = 1
+DEFAULT_HTTP_POOL_SIZE = 10
+DEFAULT_MAX_REQUESTS_PER_SECOND = None
 
 
 class Keys:
@@ -33,6 +70,46 @@ class Keys:
     interests_array = 'interests_array'
     merge_fields_array = 'merge_fields_array'
     test_mode = 'test_mode'
+    test_mode_records = 'test_mode_records'
+    test_mode_item_streams = 'test_mode_item_streams'
+    catalog_cache = 'catalog_cache'
+    catalog_cache_ttl = 'catalog_cache_ttl'
+    adaptive_count = 'adaptive_count'
+    min_count = 'min_count'
+    max_count = 'max_count'
+    target_page_time = 'target_page_time'
+    max_page_bytes = 'max_page_bytes'
+    use_batch = 'use_batch'
+    use_list_member_batch = 'use_list_member_batch'
+    use_email_activity_batch = 'use_email_activity_batch'
+    batch_poll_interval = 'batch_poll_interval'
+    batch_max_wait = 'batch_max_wait'
+    pipeline_workers = 'pipeline_workers'
+    state_flush_interval = 'state_flush_interval'
+    state_flush_records = 'state_flush_records'
+    state_flush_bytes = 'state_flush_bytes'
+    prefetch_depth = 'prefetch_depth'
+    stream_json = 'stream_json'
+    metadata_cache_ttl = 'metadata_cache_ttl'
+    fingerprint_index = 'fingerprint_index'
+    shard_index = 'shard_index'
+    shard_count = 'shard_count'
+    output_format = 'output_format'
+    output_dir = 'output_dir'
+    output_file_rows = 'output_file_rows'
+    async_logging = 'async_logging'
+    raw_http_metrics = 'raw_http_metrics'
+    http_metrics_interval = 'http_metrics_interval'
+    validation_rate = 'validation_rate'
+    interleave_streams = 'interleave_streams'
+    interleave_weights = 'interleave_weights'
+    account = 'account'
+    stream_prefix = 'stream_prefix'
+    # Settings of the multi-account mode, see accounts.py.
+    accounts = 'accounts'
+    account_workers = 'account_workers'
+    http_pool_size = 'http_pool_size'
+    max_requests_per_second = 'max_requests_per_second'
 
 
 class TapConfig(JsonObject):
@@ -48,7 +125,39 @@ class TapConfig(JsonObject):
                 Keys.include_empty_activity: DEFAULT_INCLUDE_EMPTY_ACTIVITY,
                 Keys.interests_array: DEFAULT_INTERESTS_ARRAY,
                 Keys.merge_fields_array: DEFAULT_MERGE_FIELDS_ARRAY,
-                Keys.test_mode: False}
+                Keys.test_mode: DEFAULT_TEST_MODE,
+                Keys.test_mode_records: DEFAULT_TEST_MODE_RECORDS,
+                Keys.test_mode_item_streams: DEFAULT_TEST_MODE_ITEM_STREAMS,
+                Keys.catalog_cache: DEFAULT_CATALOG_CACHE,
+                Keys.catalog_cache_ttl: DEFAULT_CATALOG_CACHE_TTL,
+                Keys.adaptive_count: DEFAULT_ADAPTIVE_COUNT,
+                Keys.min_count: DEFAULT_MIN_COUNT,
+                Keys.max_count: DEFAULT_MAX_COUNT,
+                Keys.target_page_time: DEFAULT_TARGET_PAGE_TIME,
+                Keys.max_page_bytes: DEFAULT_MAX_PAGE_BYTES,
+                Keys.batch_poll_interval: DEFAULT_BATCH_POLL_INTERVAL,
+                Keys.batch_max_wait: DEFAULT_BATCH_MAX_WAIT,
+                Keys.pipeline_workers: DEFAULT_PIPELINE_WORKERS,
+                Keys.state_flush_interval: DEFAULT_STATE_FLUSH_INTERVAL,
+                Keys.state_flush_records: DEFAULT_STATE_FLUSH_RECORDS,
+                Keys.state_flush_bytes: DEFAULT_STATE_FLUSH_BYTES,
+                Keys.prefetch_depth: DEFAULT_PREFETCH_DEPTH,
+                Keys.stream_json: DEFAULT_STREAM_JSON,
+                Keys.metadata_cache_ttl: DEFAULT_METADATA_CACHE_TTL,
+                Keys.fingerprint_index: DEFAULT_FINGERPRINT_INDEX,
+                Keys.shard_index: DEFAULT_SHARD_INDEX,
+                Keys.shard_count: DEFAULT_SHARD_COUNT,
+                Keys.output_format: DEFAULT_OUTPUT_FORMAT,
+                Keys.output_dir: DEFAULT_OUTPUT_DIR,
+                Keys.output_file_rows: DEFAULT_OUTPUT_FILE_ROWS,
+                Keys.async_logging: DEFAULT_ASYNC_LOGGING,
+                Keys.raw_http_metrics: DEFAULT_RAW_HTTP_METRICS,
+                Keys.http_metrics_interval: DEFAULT_HTTP_METRICS_INTERVAL,
+                Keys.validation_rate: DEFAULT_VALIDATION_RATE,
+                Keys.interleave_streams: DEFAULT_INTERLEAVE_STREAMS,
+                Keys.interleave_weights: DEFAULT_INTERLEAVE_WEIGHTS,
+                Keys.account: DEFAULT_ACCOUNT,
+                Keys.stream_prefix: DEFAULT_STREAM_PREFIX}
 
     def __init__(self, cfg):
         super().__init__(cfg,
@@ -61,6 +170,42 @@ class TapConfig(JsonObject):
                                               use_export)
         self.use_email_activity_export = cfg.get(Keys.use_email_activity_export,
                                                  use_export)
+        use_batch = cfg.get(Keys.use_batch, DEFAULT_USE_BATCH)
+        self.use_list_member_batch = cfg.get(Keys.use_list_member_batch,
+                                             use_batch)
+        self.use_email_activity_batch = cfg.get(Keys.use_email_activity_batch,
+                                                use_batch)
+        if self.test_mode:
+            self._sample()
+        if not 0 <= self.validation_rate <= 1:
+            raise ValueError('validation_rate must be in [0, 1]',
+                             {'validation_rate': self.validation_rate})
+        for stream_id, weight in self.interleave_weights.items():
+            if not isinstance(weight, int) or isinstance(weight, bool) or \
+                    weight < 1:
+                raise ValueError('interleave_weights must be integers >= 1',
+                                 {'stream_id': stream_id, 'weight': weight})
+        if self.pipeline_workers and (self.interleave_streams or
+                                      self.interleave_weights):
+            raise ValueError('interleave_streams and interleave_weights '
+                             'cannot be combined with pipeline_workers',
+                             {'pipeline_workers': self.pipeline_workers,
+                              'interleave_streams': self.interleave_streams})
+        if not 0 <= self.shard_index < max(self.shard_count, 1):
+            raise ValueError('shard_index must be in [0, shard_count)',
+                             {'shard_index': self.shard_index,
+                              'shard_count': self.shard_count})
+
+    def _sample(self):
+        # Only fetch the first page of each stream. A batch would fetch every
+        # page on the server, so use API v3 instead.
+        self.count = min(self.count, self.test_mode_records)
+        self.adaptive_count = False
+        self.use_list_member_batch = False
+        self.use_email_activity_batch = False
+        logger.info({'action': 'test_mode',
+                     'records': self.test_mode_records,
+                     'item_streams': self.test_mode_item_streams})
 
     @staticmethod
     def _parse_start_date(d):
@@ -0,0 +1,169 @@
+"""On-disk index of record content hashes to skip unchanged records."""
+
+import hashlib
+import sqlite3
+import threading
+import tap_mailchimp.jsonext as json
+
+
+# Keys per SELECT ... IN (...) query, below SQLite's variable limit.
+LOOKUP_CHUNK = 500
+# Hashes a session keeps in memory before staging them in the index file.
+MAX_PENDING = 10000
+
+
+def content_hash(record):
+    """64 bit hash of a record's JSON content."""
+    data = json.dumps(record, sort_keys=True, separators=(',', ':'))
+    digest = hashlib.blake2b(data.encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big', signed=True)
+
+
+def _chunks(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+class FingerprintIndex:
+    """SQLite file holding one content hash per record of an item stream.
+
+    Usage:
+        >>> index = FingerprintIndex('fingerprints.db')
+        >>> session = index.session('list_members', list_id)
+        >>> session.prefetch(member['id'] for member in page)
+        >>> for member in page:
+        ...     if session.changed(member['id'], member):
+        ...         write(member)
+        >>> session.commit()
+        >>> index.close()
+
+    Hashes seen by a session are only stored on `commit`, i.e. once the
+    stream poured every record; until then they are staged in a separate
+    table, so an interrupted stream emits its records again on the next
+    run.
+
+    Args:
+        path (str): Path of the index file. Created if missing.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            for table in ('fingerprints', 'pending_fingerprints'):
+                self._conn.execute('CREATE TABLE IF NOT EXISTS {} ('
+                                   'stream_id TEXT, item_id TEXT, key TEXT, '
+                                   'hash INTEGER, '
+                                   'PRIMARY KEY (stream_id, item_id, key)) '
+                                   'WITHOUT ROWID'.format(table))
+
+    def session(self, stream_id, item_id, max_pending=MAX_PENDING):
+        return FingerprintSession(self, stream_id, item_id, max_pending)
+
+    def lookup(self, stream_id, item_id, keys):
+        """Stored hashes of `keys`, a list of record keys, by key."""
+        hashes = {}
+        with self._lock:
+            for chunk in _chunks(keys, LOOKUP_CHUNK):
+                hashes.update(self._conn.execute(
+                    'SELECT key, hash FROM fingerprints '
+                    'WHERE stream_id = ? AND item_id = ? AND key IN ({})'
+                    .format(', '.join('?' * len(chunk))),
+                    [stream_id, item_id] + chunk
+                ))
+        return hashes
+
+    def stage(self, stream_id, item_id, hashes):
+        """Stage `hashes`, a dict of record key to content hash."""
+        with self._lock, self._conn:
+            self._conn.executemany(
+                'INSERT OR REPLACE INTO pending_fingerprints '
+                'VALUES (?, ?, ?, ?)',
+                ((stream_id, item_id, k, h) for k, h in hashes.items())
+            )
+
+    def store(self, stream_id, item_id):
+        """Move the staged hashes of an item stream to the index."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO fingerprints '
+                'SELECT * FROM pending_fingerprints '
+                'WHERE stream_id = ? AND item_id = ?', (stream_id, item_id)
+            )
+            self._discard(stream_id, item_id)
+
+    def discard(self, stream_id, item_id):
+        """Drop the staged hashes of an item stream."""
+        with self._lock, self._conn:
+            self._discard(stream_id, item_id)
+
+    def _discard(self, stream_id, item_id):
+        self._conn.execute('DELETE FROM pending_fingerprints '
+                           'WHERE stream_id = ? AND item_id = ?',
+                           (stream_id, item_id))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class FingerprintSession:
+    """Change detection for the records of one item stream.
+
+    Stored hashes are looked up a page at a time by `prefetch`; records
+    that were not prefetched are looked up one by one. At most
+    `max_pending` new hashes are kept in memory, the rest are staged in the
+    index until `commit`.
+    """
+
+    def __init__(self, index, stream_id, item_id, max_pending=MAX_PENDING):
+        self.records = 0
+        self.skipped = 0
+        self._index = index
+        self._stream_id = stream_id
+        self._item_id = item_id
+        self._max_pending = max_pending
+        self._stored = {}
+        self._pending = {}
+        # Hashes staged by an interrupted run were never committed.
+        index.discard(stream_id, item_id)
+
+    def prefetch(self, keys):
+        """Look up the stored hashes of the next records at once."""
+        keys = [str(k) for k in keys]
+        # None for keys without a stored hash.
+        self._stored = dict.fromkeys(keys)
+        self._stored.update(self._index.lookup(self._stream_id,
+                                               self._item_id, keys))
+
+    def changed(self, key, record):
+        """Return False if `record` is the same as in the last run."""
+        self.records += 1
+        key = str(key)
+        hash_ = content_hash(record)
+        if key in self._stored:
+            stored = self._stored.pop(key)
+        else:
+            stored = self._index.lookup(self._stream_id, self._item_id,
+                                        [key]).get(key)
+        if stored == hash_:
+            self.skipped += 1
+            return False
+        self._pending[key] = hash_
+        if len(self._pending) >= self._max_pending:
+            self._stage()
+        return True
+
+    def commit(self):
+        self._stage()
+        self._index.store(self._stream_id, self._item_id)
+
+    def _stage(self):
+        if self._pending:
+            self._index.stage(self._stream_id, self._item_id, self._pending)
+            self._pending = {}
+
+    @property
+    def skip_ratio(self):
+        return self.skipped / self.records if self.records else 0
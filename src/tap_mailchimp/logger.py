@@ -1,10 +1,16 @@
 from logging import DEBUG, INFO, WARNING, ERROR, CRITICAL
+from logging.handlers import QueueHandler, QueueListener
+from contextlib import contextmanager
+import copy
+import queue
 import traceback
 import re
 import singer
+import singer.metrics
 import tap_mailchimp.jsonext as json
 
 _logger = None
+_listener = None
 
 def get_logger():
     global _logger
@@ -24,16 +30,42 @@ def _msg(level, obj):
                           skipkeys=True)
     except TypeError as e:
         # Last effort to log as JSON
-        return {'action': 'stringify',
-                'reason': 'unserializable object',
-                'obj_type': type(obj).__name__,
-                'obj_str': str(obj)}
+        return json.dumps({'action': 'stringify',
+                           'reason': 'unserializable object',
+                           'obj_type': type(obj).__name__,
+                           'obj_str': str(obj),
+                           'level': _level.get(level, 'notset')})
+
+class _LazyMsg:
+    """Serialized by the logging framework only if a handler emits it."""
+    __slots__ = ('level', 'obj')
+
+    def __init__(self, level, obj):
+        self.level = level
+        self.obj = obj
+
+    def __str__(self):
+        return _msg(self.level, self.obj)
 
 def log_json(logger, level, obj):
-    logger.log(level, 'JSON: %s', _msg(level, obj))
+    logger.log(level, 'JSON: %s', _LazyMsg(level, obj))
 
 def log(level, obj):
-    log_json(get_logger(), level, obj)
+    """Log `obj`, a dict or a callable returning one, as JSON.
+
+    Nothing is built or serialized if `level` is disabled. With
+    `async_logging` the JSON is serialized and written on a background
+    thread.
+    """
+    logger = get_logger()
+    if not logger.isEnabledFor(level):
+        return
+    if callable(obj):
+        obj = obj()
+    if _listener is not None:
+        # Copy so that later changes of the caller's dict are not logged.
+        obj = dict(obj)
+    log_json(logger, level, obj)
 
 def debug(obj):
     log(DEBUG, obj)
@@ -48,14 +80,68 @@ def error(obj):
     log(ERROR, obj)
 
 def exception(e, **context):
-    error({'type': 'exception',
-           'exception_type': type(e).__name__,
-           'message': str(e),
-           'args': e.args,
-           'context': context,
-           'traceback': traceback.format_exception(etype=type(e),
-                                                   value=e,
-                                                   tb=e.__traceback__)})
+    error(lambda: {'type': 'exception',
+                   'exception_type': type(e).__name__,
+                   'message': str(e),
+                   'args': e.args,
+                   'context': context,
+                   'traceback': traceback.format_exception(type(e), e,
+                                                           e.__traceback__)})
+
+class _QueueHandler(QueueHandler):
+    """Queue records for a `QueueListener`, blocking while the queue is full.
+
+    JSON messages are left to be serialized by the listener's handlers;
+    other records are formatted here, as `QueueHandler` does.
+    """
+
+    def enqueue(self, record):
+        self.queue.put(record)
+
+    def prepare(self, record):
+        if (record.exc_info is None and record.args and
+                all(isinstance(a, _LazyMsg) for a in record.args)):
+            return copy.copy(record)
+        return super().prepare(record)
+
+@contextmanager
+def async_logging(enabled=True, maxsize=10000):
+    """Write log records of the root logger on a background thread.
+
+    Records, including singer's metrics, are created on the calling thread
+    and handed to singer's handlers by a `QueueListener`.
+
+    Usage:
+        >>> with async_logging():
+        ...     tap.pour()
+    """
+    global _listener
+    if not enabled or _listener is not None:
+        yield
+        return
+    root = get_logger()
+    handlers = list(root.handlers)
+    queue_handler = _QueueHandler(queue.Queue(maxsize=maxsize))
+    listener = QueueListener(queue_handler.queue, *handlers,
+                             respect_handler_level=True)
+    for handler in handlers:
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    # singer's counters and timers call singer.get_logger(), which reloads
+    # singer's logging config and would drop the queue handler.
+    metrics_get_logger = singer.metrics.get_logger
+    singer.metrics.get_logger = lambda: root
+    _listener = listener
+    listener.start()
+    try:
+        yield
+    finally:
+        _listener = None
+        singer.metrics.get_logger = metrics_get_logger
+        listener.stop()
+        root.removeHandler(queue_handler)
+        for handler in handlers:
+            root.addHandler(handler)
 
 def parse(line):
     match = re.match(r'^[A-Z]+ JSON: (.*)$', line)
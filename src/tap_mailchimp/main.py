@@ -1,22 +1,47 @@
 """Entry point for tap-mailchimp."""
 
+import sys
 import singer.utils
-from .config import TapConfig
+import tap_mailchimp.jsonext as json
+import tap_mailchimp.logger as logger
+from .accounts import MultiAccountTap, is_multi_account
+from .config import DEFAULT_ASYNC_LOGGING, Keys, TapConfig
+from .shards import parse_shard_args
 from .state import TapState
 from tap_mailchimp.tap import MailChimpTap
 
 def main():
     """Entry point for tap-mailchimp."""
-    args = singer.utils.parse_args(TapConfig.required_keys)
-    cfg = TapConfig(args.config)
-    state = TapState(args.state)
-    tap = MailChimpTap(cfg, state)
-    if args.discover:
-        raise NotImplementedError('Discovery not yet implemented.')
-    elif args.catalog is not None:
-        raise NotImplementedError('Catalog support not yet implemented.')
+    shard_args, sys.argv[1:] = parse_shard_args(sys.argv[1:])
+    # Required keys are per account in a multi-account config.
+    args = singer.utils.parse_args([])
+    if shard_args.shard_count is not None:
+        args.config[Keys.shard_count] = shard_args.shard_count
+    if shard_args.shard_index is not None:
+        args.config[Keys.shard_index] = shard_args.shard_index
+    if args.catalog is not None:
+        catalog = args.catalog.to_dict()
     elif args.properties is not None:
-        raise NotImplementedError('Properties support not yet implemented.')
+        catalog = args.properties
+    else:
+        catalog = None
+    if is_multi_account(args.config):
+        tap = MultiAccountTap(args.config, args.state,
+                              catalog=None if args.discover else catalog)
+        async_logging = args.config.get(Keys.async_logging,
+                                       DEFAULT_ASYNC_LOGGING)
     else:
-        tap.pour()
+        singer.utils.check_config(args.config, TapConfig.required_keys)
+        cfg = TapConfig(args.config)
+        tap = MailChimpTap(cfg, TapState(args.state),
+                           catalog=None if args.discover else catalog)
+        async_logging = cfg.async_logging
+    if args.discover:
+        json.dump(tap.discover(), sys.stdout, indent=2)
+        return 0
+    with logger.async_logging(async_logging):
+        ok = tap.pour()
+    if ok is False:
+        # An account of a multi-account config failed; its error is logged.
+        return 1
     return 0
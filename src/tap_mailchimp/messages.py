@@ -0,0 +1,43 @@
+"""Thread-safe output of singer messages.
+
+Streams may be poured from several threads at once; every message is written
+to stdout under one lock so that lines never interleave. Messages are
+serialized before the lock is taken.
+"""
+
+import sys
+import threading
+import singer
+from singer.messages import RecordMessage, format_message
+
+_lock = threading.Lock()
+
+
+def write_schema(stream_name, schema, key_properties, **kwargs):
+    with _lock:
+        singer.write_schema(stream_name, schema, key_properties, **kwargs)
+
+
+def write_record(stream_name, record, stream_alias=None, time_extracted=None):
+    """Write a record message. Returns the number of characters written."""
+    line = format_message(RecordMessage(stream=(stream_alias or stream_name),
+                                        record=record,
+                                        time_extracted=time_extracted))
+    _write_line(line)
+    return len(line) + 1
+
+
+def write_state(value):
+    with _lock:
+        singer.write_state(value)
+
+
+def write_state_json(value_json):
+    """Write a state message whose value is already serialized to JSON."""
+    _write_line('{"type": "STATE", "value": %s}' % value_json)
+
+
+def _write_line(line):
+    with _lock:
+        sys.stdout.write(line + '\n')
+        sys.stdout.flush()
@@ -0,0 +1,97 @@
+"""Cache of per-list metadata needed to convert list members."""
+
+import threading
+import time
+import tap_mailchimp.logger as logger
+
+MERGE_FIELD_PROPERTIES = ('merge_id', 'name', 'tag', 'type')
+
+
+class ListMetadataCache:
+    """Merge fields per list, kept in the tap state between runs.
+
+    A list's merge fields are fetched at most once per run and reused by
+    the export and the API v3 paths. Cached merge fields are fetched again
+    when they are older than `max_age_hours`, or when a list record tapped
+    in this run shows a different fingerprint (merge field count).
+
+    Args:
+        client (MailChimp): API client.
+        state (TapState): State to persist the cache in.
+        max_age_hours (float): Largest age of cached merge fields. Optional,
+            default is no limit.
+    """
+
+    def __init__(self, client, state, max_age_hours=None):
+        self.max_age_hours = max_age_hours
+        self._client = client
+        self._state = state
+        self._fingerprints = {}
+        self._fresh = set()
+        self._lock = threading.Lock()
+        self._list_locks = {}
+
+    @staticmethod
+    def fingerprint(list_record):
+        stats = list_record.get('stats') or {}
+        return stats.get('merge_field_count')
+
+    def observe_list(self, list_record):
+        """Remember the fingerprint of a list tapped in this run."""
+        fingerprint = self.fingerprint(list_record)
+        if fingerprint is not None:
+            self._fingerprints[list_record['id']] = fingerprint
+
+    def merge_fields(self, list_id):
+        """Merge field specs (merge_id, name, tag, type) of a list."""
+        with self._list_lock(list_id):
+            cached = self._state.get_list_metadata(list_id)
+            if cached is None or not self._is_valid(list_id, cached):
+                cached = self._fetch(list_id)
+            return cached['merge_fields']
+
+    def refresh(self, list_id):
+        """Fetch the merge fields of a list again, e.g. on an unknown tag."""
+        with self._list_lock(list_id):
+            if list_id in self._fresh:
+                # Already fetched in this run; fetching again won't help.
+                return self._state.get_list_metadata(list_id)['merge_fields']
+            return self._fetch(list_id)['merge_fields']
+
+    def _is_valid(self, list_id, cached):
+        if list_id in self._fresh:
+            return True
+        fingerprint = self._fingerprints.get(list_id)
+        if (fingerprint is not None and
+                fingerprint != cached.get('fingerprint')):
+            return False
+        if self.max_age_hours is None:
+            return True
+        age = time.time() - cached.get('fetched_at', 0)
+        return age <= 3600 * self.max_age_hours
+
+    def _fetch(self, list_id):
+        merge_fields = [
+            {k: field.get(k) for k in MERGE_FIELD_PROPERTIES}
+            for field in self._client.iter_items(
+                'lists.merge_fields',
+                list_id=list_id,
+                get_all=True,
+                fields=','.join('merge_fields.' + k
+                                for k in MERGE_FIELD_PROPERTIES)
+            )
+        ]
+        fingerprint = self._fingerprints.get(list_id, len(merge_fields))
+        metadata = {'fingerprint': fingerprint,
+                    'fetched_at': time.time(),
+                    'merge_fields': merge_fields}
+        self._state.set_list_metadata(list_id, metadata)
+        self._fresh.add(list_id)
+        logger.info({'action': 'fetch_list_metadata',
+                     'list_id': list_id,
+                     'merge_fields': len(merge_fields)})
+        return metadata
+
+    def _list_lock(self, list_id):
+        with self._lock:
+            return self._list_locks.setdefault(list_id, threading.Lock())
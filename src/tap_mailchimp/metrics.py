@@ -1,8 +1,18 @@
 """Supplement to singer.metrics: Utilities for logging metrics."""
 
+import bisect
+import threading
 import time
-from singer import Counter
-from singer.metrics import log, Point, Tag, DEFAULT_LOG_INTERVAL
+from logging import INFO
+from singer import Counter, Timer
+from singer.metrics import log, Metric, Point, Status, Tag, DEFAULT_LOG_INTERVAL
+from .logger import get_logger
+
+DEFAULT_HTTP_METRICS_INTERVAL = 60
+# Upper bounds of the histogram buckets: 1 ms to ~9 h, and 1 B to 64 GiB.
+LATENCY_BUCKETS = [0.001 * 2 ** i for i in range(25)]
+BYTES_BUCKETS = [2 ** i for i in range(37)]
+PERCENTILES = (50, 90, 99)
 
 class ProgressCounter(Counter):
     def __init__(self, total_items=None, tags=None, metric='progress_counter',
@@ -22,3 +32,187 @@ def progress_counter(total_items=None, endpoint=None, tags=None,
     if endpoint:
         tags[Tag.endpoint] = endpoint
     return ProgressCounter(total_items, tags=tags, log_interval=log_interval)
+
+def response_bytes(n, endpoint=None, tags=None, wire_bytes=None):
+    """Log the size in bytes of an HTTP response body.
+
+    `n` is the decoded size; `wire_bytes` the size as transferred, i.e.
+    before gzip/deflate decompression, if known. Unless raw HTTP metrics are
+    configured the sizes are added to the histograms of `http_metrics`.
+    """
+    logger = get_logger()
+    if n is None or not logger.isEnabledFor(INFO):
+        return
+    if not http_metrics.raw:
+        http_metrics.add_bytes(endpoint, n, wire_bytes)
+        return
+    tags = dict(tags) if tags else {}
+    if endpoint:
+        tags[Tag.endpoint] = endpoint
+    log(logger, Point('counter', 'http_response_bytes', n, tags))
+    if wire_bytes is not None:
+        log(logger, Point('counter', 'http_response_wire_bytes', wire_bytes,
+                          dict(tags, compression_ratio=(
+                              round(n / wire_bytes, 2) if wire_bytes else None
+                          ))))
+
+
+class Histogram:
+    """Counts of values in fixed buckets, for approximate percentiles."""
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum = 0
+        self.max = None
+
+    def add(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = value if self.max is None else max(self.max, value)
+
+    def percentile(self, p):
+        """Upper bound of the bucket holding the `p`-th percentile."""
+        rank = p / 100 * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank and n:
+                if i < len(self.bounds):
+                    return min(self.bounds[i], self.max)
+                return self.max
+        return self.max
+
+    def summary(self):
+        summary = {'p{}'.format(p): self.percentile(p) for p in PERCENTILES}
+        summary.update(max=self.max, mean=self.sum / self.count,
+                       sum=self.sum)
+        return summary
+
+
+class HttpMetrics:
+    """Aggregates HTTP request metrics per endpoint.
+
+    Request durations, response sizes and statuses are added to histograms
+    keyed by endpoint (and action), and logged as one `histogram` metric per
+    key every `interval` seconds and on `flush`, instead of one metric per
+    request. With `raw` every request is logged as before.
+    """
+
+    def __init__(self, raw=False, interval=DEFAULT_HTTP_METRICS_INTERVAL):
+        self.raw = raw
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._status = threading.local()
+        self._reset()
+
+    def configure(self, raw=False, interval=DEFAULT_HTTP_METRICS_INTERVAL):
+        self.flush()
+        self.raw = raw
+        self.interval = interval
+
+    def timer(self, tags):
+        """Time a request, like `singer.Timer(Metric.http_request_duration)`.
+
+        Only the endpoint and action tags are kept when aggregating.
+        """
+        if self.raw:
+            return Timer(Metric.http_request_duration, tags)
+        return _RequestTimer(self, tags.get(Tag.endpoint), tags.get('action'))
+
+    def set_status(self, status_code):
+        """Remember the HTTP status of the current thread's request."""
+        self._status.code = status_code
+
+    def add_request(self, endpoint, action, elapsed, status):
+        key = (endpoint, action)
+        with self._lock:
+            self._latencies.setdefault(
+                key, Histogram(LATENCY_BUCKETS)
+            ).add(elapsed)
+            statuses = self._statuses.setdefault(key, {})
+            statuses[status] = statuses.get(status, 0) + 1
+        self._maybe_flush()
+
+    def add_bytes(self, endpoint, n, wire_bytes=None):
+        with self._lock:
+            self._bytes.setdefault(endpoint, Histogram(BYTES_BUCKETS)).add(n)
+            if wire_bytes is not None:
+                self._wire_bytes.setdefault(
+                    endpoint, Histogram(BYTES_BUCKETS)
+                ).add(wire_bytes)
+        self._maybe_flush()
+
+    def flush(self):
+        """Log and reset the aggregated metrics."""
+        with self._lock:
+            latencies, statuses = self._latencies, self._statuses
+            bytes_, wire_bytes = self._bytes, self._wire_bytes
+            interval = time.time() - self._start
+            self._reset()
+        logger = get_logger()
+        for (endpoint, action), histogram in latencies.items():
+            tags = {Tag.endpoint: endpoint, 'interval': interval,
+                    'statuses': statuses.get((endpoint, action), {}),
+                    **histogram.summary()}
+            if action is not None:
+                tags['action'] = action
+            log(logger, Point('histogram', Metric.http_request_duration,
+                              histogram.count, tags))
+        for metric, histograms in (('http_response_bytes', bytes_),
+                                   ('http_response_wire_bytes', wire_bytes)):
+            for endpoint, histogram in histograms.items():
+                log(logger, Point('histogram', metric, histogram.count,
+                                  {Tag.endpoint: endpoint,
+                                   'interval': interval,
+                                   **histogram.summary()}))
+
+    def _maybe_flush(self):
+        if time.time() - self._start >= self.interval:
+            self.flush()
+
+    def _reset(self):
+        self._start = time.time()
+        self._latencies = {}
+        self._statuses = {}
+        self._bytes = {}
+        self._wire_bytes = {}
+
+
+class _RequestTimer:
+    def __init__(self, metrics, endpoint, action):
+        self._metrics = metrics
+        self._endpoint = endpoint
+        self._action = action
+
+    def __enter__(self):
+        self._metrics._status.code = None
+        self._start = time.time()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        elapsed = time.time() - self._start
+        status = self._metrics._status.code
+        if status is None:
+            response = getattr(exc_value, 'response', None)
+            status = getattr(response, 'status_code', None)
+        if status is None:
+            status = Status.failed if exc_type else Status.succeeded
+        self._metrics.add_request(self._endpoint, self._action, elapsed,
+                                  str(status))
+
+
+http_metrics = HttpMetrics()
+
+def http_timer(tags):
+    """Time an HTTP request with the process-wide `http_metrics`."""
+    return http_metrics.timer(tags)
+
+def status_hook(response, *args, **kwargs):
+    """requests response hook recording the status for `http_timer`."""
+    http_metrics.set_status(response.status_code)
+    return response
+
+STATUS_HOOKS = {'response': status_hook}
@@ -0,0 +1,66 @@
+"""Adaptive page size for MailChimp API v3 pagination."""
+
+import tap_mailchimp.logger as logger
+
+
+class AdaptivePager:
+    """Tune the page size (`count`) of each API v3 endpoint.
+
+    Page sizes grow or shrink (at most by a factor of 2 per page) so that a
+    full page takes about `target_time` seconds and at most `max_bytes`
+    bytes, within `min_count` and `max_count`. Timeouts halve the page size.
+    Learned page sizes are kept in the tap state for the next run.
+
+    Args:
+        state (TapState): Tap state for learned page sizes.
+        min_count (int): Smallest page size.
+        max_count (int): Largest page size.
+        target_time (float): Target seconds per page.
+        max_bytes (int): Largest response size in bytes. Optional.
+    """
+
+    def __init__(self, state, min_count, max_count, target_time,
+                 max_bytes=None):
+        self._state = state
+        self.min_count = min_count
+        self.max_count = max_count
+        self.target_time = target_time
+        self.max_bytes = max_bytes
+
+    def count(self, endpoint, default):
+        count = self._state.get_page_size(endpoint) or default
+        return self._clamp(count or self.max_count)
+
+    def observe(self, endpoint, count, n, elapsed, n_bytes=None):
+        """Update the page size of `endpoint` from a page of `n` items."""
+        if n < count or n == 0 or elapsed <= 0:
+            # Partial pages are dominated by fixed request overhead.
+            return
+        target = count * self.target_time / elapsed
+        if n_bytes and self.max_bytes:
+            target = min(target, count * self.max_bytes / n_bytes)
+        new_count = self._clamp(int(max(count / 2, min(count * 2, target))))
+        self._set(endpoint, count, new_count, reason='observe',
+                  elapsed=elapsed, bytes=n_bytes)
+
+    def back_off(self, endpoint, count):
+        """Halve the page size after a timeout.
+
+        Returns False if the page size cannot be reduced any further.
+        """
+        if count <= self.min_count:
+            return False
+        self._set(endpoint, count, self._clamp(count // 2), reason='timeout')
+        return True
+
+    def _set(self, endpoint, old_count, new_count, **tags):
+        if new_count != old_count:
+            logger.info({'action': 'page_size',
+                         'endpoint': endpoint,
+                         'old': old_count,
+                         'new': new_count,
+                         **tags})
+        self._state.set_page_size(endpoint, new_count)
+
+    def _clamp(self, count):
+        return max(self.min_count, min(self.max_count, count))
@@ -0,0 +1,99 @@
+"""HTTP connection pools and a request rate limiter shared by API clients."""
+
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+
+DEFAULT_POOL_SIZE = 10
+
+
+def data_center(api_key):
+    """Data center of an API key, e.g. 'us1' for '...-us1'."""
+    return api_key.rpartition('-')[2]
+
+
+class RateLimiter:
+    """Token bucket limiting the requests of several threads.
+
+    Args:
+        rate (float): Requests per second on average.
+        burst (int): Requests that may be sent at once after a quiet
+            period. Optional, default is `rate` (at least 1).
+    """
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.burst = burst or max(1, rate)
+        self._tokens = self.burst
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Wait until a request may be sent."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                refill = (now - self._last) * self.rate
+                self._tokens = min(self.burst, self._tokens + refill)
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class PooledSession(requests.Session):
+    """Session keeping up to `pool_size` connections per host alive.
+
+    Every request first waits for `limiter`, if given.
+    """
+
+    def __init__(self, pool_size=DEFAULT_POOL_SIZE, limiter=None):
+        super().__init__()
+        self._limiter = limiter
+        adapter = HTTPAdapter(pool_connections=pool_size,
+                              pool_maxsize=pool_size)
+        self.mount('https://', adapter)
+        self.mount('http://', adapter)
+
+    def request(self, *args, **kwargs):
+        if self._limiter is not None:
+            self._limiter.acquire()
+        return super().request(*args, **kwargs)
+
+
+class SessionPool:
+    """One `PooledSession` per MailChimp data center.
+
+    Args:
+        pool_size (int): Connections kept alive per host.
+        max_requests_per_second (float): Requests per second of all
+            sessions together. Optional, default is no limit.
+    """
+
+    def __init__(self, pool_size=DEFAULT_POOL_SIZE,
+                 max_requests_per_second=None):
+        self.pool_size = pool_size
+        self.limiter = (RateLimiter(max_requests_per_second)
+                        if max_requests_per_second else None)
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def session(self, api_key):
+        """Session for the data center of `api_key`."""
+        dc = data_center(api_key)
+        with self._lock:
+            session = self._sessions.get(dc)
+            if session is None:
+                session = self._sessions[dc] = PooledSession(
+                    self.pool_size, self.limiter
+                )
+        return session
+
+    def close(self):
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions = {}
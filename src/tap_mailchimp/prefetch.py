@@ -0,0 +1,131 @@
+"""Producer/consumer prefetching of records within a stream."""
+
+import queue
+import threading
+import time
+from singer.metrics import log, Point
+from .logger import get_logger
+
+DEFAULT_CHUNK_SIZE = 100
+
+_END = object()
+
+
+class _Error:
+    def __init__(self, error):
+        self.error = error
+
+
+class Prefetcher:
+    """Iterate an iterable on a producer thread through a bounded queue.
+
+    The producer thread pulls items (and so fetches pages or export chunks)
+    while the consuming thread processes earlier items. Items are queued in
+    chunks of `chunk_size`; at most `depth` chunks are buffered. Exceptions
+    of the producer are re-raised in the consumer.
+
+    Usage:
+        >>> with Prefetcher(records, depth=4) as prefetched:
+        ...     for record in prefetched:
+        ...         write(record)
+
+    Args:
+        iterable (iterable): Items to prefetch.
+        depth (int): Largest number of queued chunks.
+        chunk_size (int): Items per queued chunk.
+    """
+
+    def __init__(self, iterable, depth, chunk_size=DEFAULT_CHUNK_SIZE):
+        self.depth = depth
+        self.chunk_size = chunk_size
+        self.consumer_stall = 0.0
+        self.producer_stall = 0.0
+        self.max_depth = 0
+        self._depth_total = 0
+        self._gets = 0
+        self._iterable = iterable
+        self._queue = queue.Queue(maxsize=depth)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._produce,
+                                        name='tap_mailchimp_prefetch',
+                                        daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __iter__(self):
+        while True:
+            depth = self._queue.qsize()
+            self.max_depth = max(self.max_depth, depth)
+            self._depth_total += depth
+            self._gets += 1
+            start = time.time()
+            chunk = self._queue.get()
+            self.consumer_stall += time.time() - start
+            if chunk is _END:
+                return
+            if isinstance(chunk, _Error):
+                raise chunk.error
+            yield from chunk
+
+    def close(self):
+        self._stop.set()
+        # Unblock a producer waiting on a full queue.
+        while self._thread.is_alive():
+            try:
+                self._queue.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        self._thread.join()
+
+    @property
+    def mean_depth(self):
+        return self._depth_total / self._gets if self._gets else 0
+
+    def log_metrics(self, tags):
+        """Log queue depth and stall times as metrics."""
+        logger = get_logger()
+        log(logger, Point('gauge', 'prefetch_queue_depth', self.mean_depth,
+                          dict(tags, max_depth=self.max_depth,
+                               queue_size=self.depth)))
+        log(logger, Point('timer', 'prefetch_consumer_stall',
+                          self.consumer_stall, tags))
+        log(logger, Point('timer', 'prefetch_producer_stall',
+                          self.producer_stall, tags))
+
+    def _produce(self):
+        iterator = iter(self._iterable)
+        try:
+            chunk = []
+            for item in iterator:
+                chunk.append(item)
+                if len(chunk) >= self.chunk_size:
+                    if not self._put(chunk):
+                        return
+                    chunk = []
+            if chunk and not self._put(chunk):
+                return
+            self._put(_END)
+        except Exception as e:
+            self._put(_Error(e))
+        finally:
+            close = getattr(iterator, 'close', None)
+            if close is not None:
+                close()
+
+    def _put(self, chunk):
+        start = time.time()
+        try:
+            while not self._stop.is_set():
+                try:
+                    self._queue.put(chunk, timeout=0.1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+        finally:
+            self.producer_stall += time.time() - start
@@ -0,0 +1,140 @@
+"""Split item streams across tap processes and merge their states.
+
+Usage:
+
+Run shard 0 of 3:
+
+    $ tap-mailchimp -c config.json -s state-0.json --shard-index 0 --shard-count 3
+
+Merge the shard states for the next run:
+
+    $ tap-mailchimp-merge-state state-0.json state-1.json state-2.json > state.json
+"""
+
+import argparse
+import hashlib
+import sys
+from datetime import datetime
+import dateutil
+from singer.utils import load_json
+import tap_mailchimp.jsonext as json
+from .state import Keys, TapState
+
+
+def shard_of(id_, shard_count):
+    """Shard of a list or campaign id; the same in every process."""
+    digest = hashlib.md5(str(id_).encode('utf-8')).digest()
+    return int.from_bytes(digest[:8], 'big') % shard_count
+
+
+def parse_shard_args(argv):
+    """Split `--shard-index`/`--shard-count` from the other arguments."""
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument('--shard-index', type=int, dest='shard_index')
+    parser.add_argument('--shard-count', type=int, dest='shard_count')
+    return parser.parse_known_args(argv)
+
+
+def merge_states(states):
+    """Merge the states of the shards of a run into one state dict.
+
+    The merged state is never ahead of any shard: the earliest last and
+    current run win, a parent stream is only done if it is done in every
+    shard, and the lowest high-water mark of an id wins, as does the
+    earliest start of a deferred item stream.
+    """
+    # A finished shard has no current run; TapState would start a new one.
+    current_runs = [_parse_time(s[Keys.current_run]) for s in states
+                    if s.get(Keys.current_run)]
+    states = [TapState(s) for s in states]
+    last_runs = [s.last_run for s in states]
+    merged = {Keys.last_run: (None if None in last_runs
+                              else min(last_runs)),
+              Keys.current_run: min(current_runs) if current_runs else None,
+              Keys.currently_syncing: None,
+              Keys.bookmarks: _merge_bookmarks([s.bookmarks for s in states]),
+              Keys.page_sizes: {},
+              Keys.high_water_marks: {},
+              Keys.estimates: {},
+              Keys.rates: {},
+              Keys.list_metadata: {},
+              Keys.deferred: {}}
+    for s in states:
+        merged[Keys.page_sizes].update(s.page_sizes)
+        _merge_nested(merged[Keys.estimates], s.estimates)
+        _merge_nested(merged[Keys.high_water_marks], s.high_water_marks,
+                      min)
+        _merge_nested(merged[Keys.deferred], s.deferred, _earliest_start)
+        for list_id, metadata in s.list_metadata.items():
+            old = merged[Keys.list_metadata].get(list_id)
+            if old is None or (metadata.get('fetched_at', 0) >
+                               old.get('fetched_at', 0)):
+                merged[Keys.list_metadata][list_id] = metadata
+    for stream_id in {k for s in states for k in s.rates}:
+        rates = [s.rates[stream_id] for s in states if stream_id in s.rates]
+        merged[Keys.rates][stream_id] = sum(rates) / len(rates)
+    return json.loads(json.dumps(merged))
+
+
+def _earliest_start(a, b):
+    starts = [a[Keys.start_date], b[Keys.start_date]]
+    if None in starts:
+        # From the configured start date.
+        return {Keys.start_date: None}
+    return {Keys.start_date: min(starts, key=_parse_time)}
+
+
+def _parse_time(value):
+    return value if isinstance(value, datetime) else dateutil.parser.parse(value)
+
+
+def _merge_nested(merged, other, resolve=None):
+    for stream_id, values in other.items():
+        target = merged.setdefault(stream_id, {})
+        for id_, value in values.items():
+            if resolve is not None and id_ in target:
+                value = resolve(target[id_], value)
+            target[id_] = value
+
+
+def _merge_bookmarks(bookmarks_list):
+    merged = {}
+    stream_ids = {k for b in bookmarks_list for k in b}
+    for stream_id in stream_ids:
+        bookmarks = [b.get(stream_id, {}) for b in bookmarks_list]
+        ids = set()
+        offsets = {}
+        for bookmark in bookmarks:
+            ids.update(bookmark.get(Keys.ids, []))
+            for key, value in bookmark.get(Keys.offset, {}).items():
+                if isinstance(value, dict):
+                    # Offset of an item stream, tapped by a single shard.
+                    old = offsets.get(key)
+                    if old is None or value.get(Keys.done):
+                        offsets[key] = value
+                elif key in offsets:
+                    offsets[key] = min(offsets[key], value)
+                else:
+                    offsets[key] = value
+        stream = {Keys.ids: sorted(ids),
+                  Keys.offset: offsets,
+                  Keys.done: all(b.get(Keys.done, False) for b in bookmarks)}
+        if stream[Keys.done]:
+            stream[Keys.offset] = {}
+        if any(Keys.count in b for b in bookmarks):
+            stream[Keys.count] = len(ids)
+        merged[stream_id] = stream
+    return merged
+
+
+def main():
+    """Entry point for tap-mailchimp-merge-state."""
+    parser = argparse.ArgumentParser(
+        description='Merge the states of tap-mailchimp shards.'
+    )
+    parser.add_argument('states', nargs='+', help='Shard state files')
+    args = parser.parse_args()
+    json.dump(merge_states([load_json(p) for p in args.states]), sys.stdout,
+              indent=2)
+    sys.stdout.write('\n')
+    return 0
@@ -1,8 +1,12 @@
+import functools
+import threading
 import time
+from contextlib import contextmanager
 from datetime import datetime
 import dateutil
-from singer import write_state
+import tap_mailchimp.jsonext as json
 from .jsonext import JsonObject
+from .messages import write_state_json
 
 SYNC_STATE_INTERVAL = 60
 
@@ -15,33 +19,81 @@ class Keys:
     ids = 'ids'
     done = 'done'
     count = 'count'
+    last_changed = 'last_changed'
     offset = 'offset'
+    page_sizes = 'page_sizes'
+    high_water_marks = 'high_water_marks'
+    estimates = 'estimates'
+    rates = 'rates'
+    list_metadata = 'list_metadata'
+    deferred = 'deferred'
+    start_date = 'start_date'
+
+
+def _locked(method):
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._lock:
+            return method(self, *args, **kwargs)
+    return wrapper
 
 
 class TapState(JsonObject):
+    """Tap state and bookmarks. Safe to update from several threads.
 
-    def __init__(self, state=None):
+    State messages are written by `writer(value_json)`, `write_state_json`
+    by default. A `read_only` state is updated but never written.
+    """
+
+    def __init__(self, state=None, writer=None):
         state = state or {}
+        self._writer = writer or write_state_json
+        self.read_only = False
+        self._lock = threading.RLock()
         self.last_run = state.get(Keys.last_run)
         self.current_run = (
             state.get(Keys.current_run) or datetime.now(dateutil.tz.tzutc())
         )
         self.currently_syncing = state.get(Keys.currently_syncing)
         self.bookmarks = state.get(Keys.bookmarks, {})
+        self.page_sizes = state.get(Keys.page_sizes, {})
+        self.high_water_marks = state.get(Keys.high_water_marks, {})
+        self.estimates = state.get(Keys.estimates, {})
+        self.rates = state.get(Keys.rates, {})
+        self.list_metadata = state.get(Keys.list_metadata, {})
+        # Item streams left for a later run; kept across runs until done.
+        self.deferred = state.get(Keys.deferred, {})
         self._current_session = time.time()
-        self._last_sync_state = time.time()
+        # Serialized bookmarks per stream; only dirty streams are dumped again.
+        self._bookmark_json = {}
+        self._dirty = set(self.bookmarks)
+        self._flush_due = False
+        self._flush_interval = SYNC_STATE_INTERVAL
+        self._flush_records = None
+        self._flush_bytes = None
+        self._records_since_flush = 0
+        self._bytes_since_flush = 0
 
     def __json__(self):
         return {Keys.last_run: self.last_run,
                 Keys.current_run: self.current_run,
                 Keys.currently_syncing: self.currently_syncing,
-                Keys.bookmarks: self.bookmarks}
-
+                Keys.bookmarks: self.bookmarks,
+                Keys.page_sizes: self.page_sizes,
+                Keys.high_water_marks: self.high_water_marks,
+                Keys.estimates: self.estimates,
+                Keys.rates: self.rates,
+                Keys.list_metadata: self.list_metadata,
+                Keys.deferred: self.deferred}
+
+    @_locked
     def finalize_run(self):
         self.last_run = self.current_run
         self.current_run = None
         self.currently_syncing = None
         self.bookmarks = {}
+        self._bookmark_json = {}
+        self._dirty = set()
 
     def session_time(self):
         return time.time() - self._current_session
@@ -68,39 +120,160 @@ class TapState(JsonObject):
         else:
             self._current_run = dateutil.parser.parse(value)
 
+    def configure_flush(self, interval=SYNC_STATE_INTERVAL, records=None,
+                        bytes_=None):
+        """Set when `sync` writes the state.
+
+        Args:
+            interval (float): Seconds between state messages, flagged by the
+                background flusher (see `flusher`). None to disable.
+            records (int): Records written between state messages. Optional.
+            bytes_ (int): Record bytes written between state messages.
+                Optional.
+        """
+        self._flush_interval = interval
+        self._flush_records = records
+        self._flush_bytes = bytes_
+
+    @contextmanager
+    def flusher(self):
+        """Run a background thread requesting a flush every interval."""
+        if not self._flush_interval:
+            yield
+            return
+        flusher = StateFlusher(self, self._flush_interval)
+        flusher.start()
+        try:
+            yield
+        finally:
+            flusher.stop()
+
+    def request_flush(self):
+        self._flush_due = True
+
+    def record_written(self, n_bytes=0):
+        """Count a written record towards the flush policy."""
+        self._records_since_flush += 1
+        self._bytes_since_flush += n_bytes
+        if ((self._flush_records and
+             self._records_since_flush >= self._flush_records) or
+                (self._flush_bytes and
+                 self._bytes_since_flush >= self._flush_bytes)):
+            self._flush_due = True
+
     def sync(self, force=False):
-        if force or (time.time() - self._last_sync_state > SYNC_STATE_INTERVAL):
+        """Write the state if forced or a flush is due.
+
+        Called after each record, so this must stay cheap.
+        """
+        if force or self._flush_due:
             self.write_state()
 
+    @_locked
     def write_state(self):
-        now = time.time()
+        self._flush_due = False
+        self._records_since_flush = 0
+        self._bytes_since_flush = 0
+        if self.read_only:
+            return
         state = self.__json__()
-        for k, v in state.items():
-            if isinstance(v, datetime):
-                state[k] = v.isoformat()
-        write_state(state)
-        self._last_sync_state = now
+        bookmarks = state.pop(Keys.bookmarks)
+        for stream_id in self._dirty:
+            if stream_id in bookmarks:
+                self._bookmark_json[stream_id] = json.dumps(
+                    bookmarks[stream_id]
+                )
+            else:
+                self._bookmark_json.pop(stream_id, None)
+        self._dirty.clear()
+        bookmarks_json = ', '.join('{}: {}'.format(json.dumps(k), v)
+                                   for k, v in self._bookmark_json.items())
+        state_json = json.dumps(state)
+        self._writer('{}, {}: {{{}}}}}'.format(state_json[:-1],
+                                               json.dumps(Keys.bookmarks),
+                                               bookmarks_json))
+
+    def get_page_size(self, endpoint, default=None):
+        return self.page_sizes.get(endpoint, default)
+
+    @_locked
+    def set_page_size(self, endpoint, count):
+        self.page_sizes[endpoint] = count
+
+    def get_high_water_mark(self, stream_id, id_, default=None):
+        return self.high_water_marks.get(stream_id, {}).get(id_, default)
+
+    @_locked
+    def set_high_water_mark(self, stream_id, id_, value):
+        self.high_water_marks.setdefault(stream_id, {})[id_] = value
+
+    def get_estimate(self, stream_id, id_, default=None):
+        return self.estimates.get(stream_id, {}).get(id_, default)
+
+    @_locked
+    def set_estimate(self, stream_id, id_, value):
+        self.estimates.setdefault(stream_id, {})[id_] = value
+
+    @_locked
+    def clear_estimate(self, stream_id, id_):
+        self.estimates.get(stream_id, {}).pop(id_, None)
+
+    def get_deferred(self, stream_id, id_):
+        return self.deferred.get(stream_id, {}).get(id_)
+
+    def get_deferred_ids(self, stream_id):
+        return list(self.deferred.get(stream_id, {}))
+
+    @_locked
+    def set_deferred(self, stream_id, id_, start_date):
+        """Leave an item stream to a later run starting at `start_date`."""
+        self.deferred.setdefault(stream_id, {})[id_] = {
+            Keys.start_date: start_date
+        }
+
+    @_locked
+    def clear_deferred(self, stream_id, id_):
+        self.deferred.get(stream_id, {}).pop(id_, None)
+
+    def get_rate(self, stream_id, default=None):
+        return self.rates.get(stream_id, default)
+
+    @_locked
+    def set_rate(self, stream_id, rate):
+        self.rates[stream_id] = rate
+
+    def get_list_metadata(self, list_id, default=None):
+        return self.list_metadata.get(list_id, default)
+
+    @_locked
+    def set_list_metadata(self, list_id, metadata):
+        self.list_metadata[list_id] = metadata
 
     def get_bookmark(self, stream_id, key, default=None):
         return self.bookmarks.get(stream_id, {}).get(key, default)
 
+    @_locked
     def write_bookmark(self, stream_id, key, val):
         self.bookmarks.setdefault(stream_id, {})[key] = val
+        self._dirty.add(stream_id)
 
     def get_offset(self, stream_id, default=None):
         return self.get_bookmark(stream_id, Keys.offset, default)
 
+    @_locked
     def set_offset(self, stream_id, offset_key, offset_value):
         offset = self.get_offset(stream_id, {})
         offset[offset_key] = offset_value
         self.write_bookmark(stream_id, Keys.offset, offset)
 
+    @_locked
     def clear_offset(self, stream_id):
         self.write_bookmark(stream_id, Keys.offset, {})
 
     def get_ids(self, stream_id):
         return set(self.get_bookmark(stream_id, Keys.ids, []))
 
+    @_locked
     def add_id(self, stream_id, id_):
         ids = set(self.get_ids(stream_id))
         ids.add(id_)
@@ -112,6 +285,7 @@ class TapState(JsonObject):
         except (TypeError, KeyError):
             return default
 
+    @_locked
     def set_id_offset(self, stream_id, id_, offset_key, offset_value):
         offset = self.get_id_offset(stream_id, id_, {})
         offset[offset_key] = offset_value
@@ -120,6 +294,7 @@ class TapState(JsonObject):
     def get_done(self, stream_id):
         return self.get_bookmark(stream_id, Keys.done, False)
 
+    @_locked
     def set_done(self, stream_id, done=True):
         self.write_bookmark(stream_id, Keys.done, done)
         if done:
@@ -128,6 +303,7 @@ class TapState(JsonObject):
     def get_id_done(self, stream_id, id_):
         return self.get_id_offset(stream_id, id_, {}).get(Keys.done, False)
 
+    @_locked
     def set_id_done(self, stream_id, id_, done=True):
         if done:
             # clear all other offset state for this id
@@ -138,11 +314,35 @@ class TapState(JsonObject):
     def get_count(self, stream_id):
         return self.get_offset(stream_id, {}).get(Keys.count, 0)
 
+    @_locked
     def set_count(self, stream_id, count):
         self.write_bookmark(stream_id, Keys.count, count)
 
     def get_id_count(self, stream_id, id_):
         return self.get_id_offset(stream_id, id_, {}).get(Keys.count, 0)
 
+    @_locked
     def set_id_count(self, stream_id, id_, count):
         self.set_id_offset(stream_id, id_, Keys.count, count)
+
+
+class StateFlusher(threading.Thread):
+    """Background thread requesting a state flush every `interval` seconds.
+
+    The state itself is still written by the streams at the next record
+    boundary, so state messages are always consistent with the records.
+    """
+
+    def __init__(self, state, interval):
+        super().__init__(name='tap_mailchimp_state_flusher', daemon=True)
+        self._state = state
+        self._interval = interval
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self._interval):
+            self._state.request_flush()
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
@@ -1,11 +1,24 @@
 import datetime
 import itertools
+import time
+from contextlib import contextmanager
 from abc import abstractmethod
-from singer import record_counter, Counter, Schema, write_schema, write_record
+from singer import record_counter, Counter, Schema
 from singer.metrics import Metric, Tag
 import tap_mailchimp.logger as logger
-from .client import Status
-from .utils import clean_links, fix_blank_date_time_format, tap_start_date
+from .client import ListMemberExportRow, Status
+from .messages import write_record, write_schema
+from .metadata import ListMetadataCache
+from .prefetch import Prefetcher
+from .state import Keys
+from .validation import RecordValidator
+from .utils import (DeadlineExceeded, clean_links, datify_utc,
+                    fix_blank_date_time_format, tap_start_date)
+
+# Fewest records for a stream to update its learned records per second.
+RATE_MIN_RECORDS = 100
+# Weight of the latest run in the learned records per second.
+RATE_WEIGHT = 0.5
 
 
 class Stream:
@@ -23,18 +36,33 @@ class Stream:
 
 class TapStream:
     key_properties = 'id'
+    replication_key = None
+    # Properties the tap itself needs even if they are not selected.
+    required_properties = ()
 
-    def __init__(self, client, stream_id, config, state):
+    def __init__(self, client, stream_id, config, state, properties=None,
+                 emit=True):
         self.stream_id = stream_id
+        self.properties = properties
+        self.emit = emit
         self._client = client
         self._config = config
         self._state = state
         self._schema = None
+        self._excluded_properties = None
+        self._listeners = []
+        self._deadline = None
+        self._validator = None
 
     @property
     def is_done(self):
         return self._state.get_done(self.stream_id)
 
+    @property
+    def checkpoints(self):
+        """True if a stopped stream resumes where it stopped."""
+        return True
+
     @property
     def _offset(self):
         return self._state.get_count(self.stream_id)
@@ -43,26 +71,162 @@ class TapStream:
     def api(self):
         return Stream.api[self.stream_id]
 
+    @property
+    def stream_name(self):
+        """Name of the stream in the output, prefixed per account."""
+        return (self._config.stream_prefix or '') + self.stream_id
+
     @property
     def schema(self):
         if self._schema is None:
-            self._schema = Schema.from_dict(self._client.item_schema(self.api))
+            raw_schema = self._select_schema(self._raw_schema())
+            self._schema = Schema.from_dict(raw_schema)
         return self._schema
 
+    def _raw_schema(self):
+        return self._client.item_schema(self.api)
+
+    @property
+    def _key_properties(self):
+        if isinstance(self.key_properties, str):
+            return [self.key_properties]
+        return list(self.key_properties)
+
+    @property
+    def _selected_properties(self):
+        """Selected top-level properties (always with key properties and the
+        replication key).
+
+        None means every property is selected.
+        """
+        if self.properties is None:
+            return None
+        selected = set(self.properties) | set(self._key_properties)
+        selected.update(self.required_properties)
+        if self.replication_key is not None:
+            selected.add(self.replication_key)
+        return selected
+
+    def _select_schema(self, raw_schema):
+        selected = self._selected_properties
+        if selected is not None and 'properties' in raw_schema:
+            self._excluded_properties = set(raw_schema['properties']) - selected
+            raw_schema['properties'] = {
+                k: v for k, v in raw_schema['properties'].items()
+                if k in selected
+            }
+        return raw_schema
+
+    def _v3_args(self):
+        """API v3 query args, projected on the (possibly trimmed) schema."""
+        args = {'count': self._config.count}
+        args.update(self._client.projection_args(self.api,
+                                                 self._selected_properties,
+                                                 self._excluded_properties))
+        return args
+
     def _set_done(self):
         self._state.set_done(self.stream_id, True)
 
-    def pour(self):
+    def add_listener(self, listener):
+        """Call `listener(stream, record)` after each record is poured."""
+        self._listeners.append(listener)
+
+    def pour(self, deadline=None):
+        """Pour schema and records.
+
+        If `deadline` expires, the stream checkpoints its state and stops at
+        the next page or chunk boundary without being marked done.
+        """
+        for _ in self.pour_pages(deadline):
+            pass
+
+    def pour_pages(self, deadline=None, page_size=None):
+        """Pour schema and records, pausing after every page.
+
+        A generator yielding the number of records poured so far after every
+        `page_size` records (`config.count` by default), so that several
+        streams can take turns. Closing it before it is exhausted checkpoints
+        the stream as an expired deadline does.
+        """
+        self._deadline = deadline
+        page_size = page_size or self._config.count
         self.pre_pour()
         self.pour_schema()
-        with self._record_counter() as counter:
-            for record in self._iter_records():
-                self._write_record(record)
-                self._update_state(record)
-                self._state.sync()
-                counter.increment()
+        # Time spent pouring this stream, not in other streams' turns.
+        busy, resumed, n = 0, time.time(), 0
+        limit = (self._config.test_mode_records if self._config.test_mode
+                 else None)
+        with self._records() as records, self._record_counter() as counter:
+            try:
+                for record in records:
+                    if n == limit:
+                        self._log_info(action='sample', records=n)
+                        break
+                    n_bytes = self._write_record(record)
+                    self._update_state(record)
+                    self._state.record_written(n_bytes)
+                    self._state.sync()
+                    counter.increment()
+                    n += 1
+                    for listener in self._listeners:
+                        listener(self, record)
+                    if n % page_size == 0:
+                        busy += time.time() - resumed
+                        yield n
+                        resumed = time.time()
+            except DeadlineExceeded:
+                self._stop()
+                return
+            except GeneratorExit:
+                self._stop(reason='closed')
+                raise
+        if limit is None:
+            self._update_rate(n, busy + time.time() - resumed)
         self.post_pour()
 
+    @contextmanager
+    def _records(self):
+        """Records to pour, prefetched on a producer thread if configured."""
+        records = self._iter_records()
+        if not self._config.prefetch_depth:
+            yield records
+            return
+        with Prefetcher(records, self._config.prefetch_depth) as prefetcher:
+            yield prefetcher
+        prefetcher.log_metrics(self._metric_tags)
+
+    @property
+    def _metric_tags(self):
+        return {Tag.endpoint: self.stream_id}
+
+    @property
+    def estimated_duration(self):
+        """Seconds this stream is expected to take, None if unknown."""
+        rate = self._state.get_rate(self.stream_id)
+        size = self._estimated_size
+        if not rate or size is None:
+            return None
+        return size / rate
+
+    @property
+    def _estimated_size(self):
+        return None
+
+    def _update_rate(self, n, elapsed):
+        # Records per second, learned across runs.
+        if n < RATE_MIN_RECORDS or elapsed <= 0:
+            return
+        rate = n / elapsed
+        old_rate = self._state.get_rate(self.stream_id)
+        if old_rate:
+            rate = (1 - RATE_WEIGHT) * old_rate + RATE_WEIGHT * rate
+        self._state.set_rate(self.stream_id, rate)
+
+    def _stop(self, reason='deadline'):
+        self._state.sync(force=True)
+        self._log_info(action='stop', reason=reason)
+
     def _record_counter(self):
         return record_counter(endpoint=self.stream_id)
 
@@ -73,20 +237,29 @@ class TapStream:
 
     def _iter_records(self):
         yield from self._client.iter_items(self.api,
-                                           count=self._config.count,
-                                           offset=self._offset)
+                                           offset=self._offset,
+                                           deadline=self._deadline,
+                                           **self._v3_args())
 
     def pour_schema(self):
-        write_schema(self.stream_id,
+        if not self.emit:
+            return
+        write_schema(self.stream_name,
                      self.schema.to_dict(),
                      key_properties=self.key_properties)
 
     def pre_pour(self):
         self._log_start(offset=self._offset)
-        self._state.currently_syncing = self.stream_id
+        if not self._config.pipeline_workers:
+            # Pipelined streams pour at once; none of them is the one syncing.
+            self._state.currently_syncing = self.stream_id
 
     def post_pour(self):
-        self._set_done()
+        if self._validator is not None:
+            self._validator.log_summary()
+        if not self._config.test_mode:
+            # A sample leaves the stream and its high-water mark as they were.
+            self._set_done()
         self._state.currently_syncing = None
         self._state.sync(force=True)
         self._log_finish()
@@ -105,8 +278,14 @@ class TapStream:
     def __json__(self):
         return {'stream_id': self.stream_id}
 
+    @property
+    def _log_tags(self):
+        if self._config.account is None:
+            return {'stream_id': self.stream_id}
+        return {'stream_id': self.stream_id, 'account': self._config.account}
+
     def _log_info(self, **tags):
-        logger.info({'stream_id': self.stream_id, **tags})
+        logger.info({**self._log_tags, **tags})
 
     def _log_start(self, offset=0):
         self._log_info(action='start', offset=offset)
@@ -125,15 +304,44 @@ class TapStream:
         return self._start_date - datetime.timedelta(days=self._config.lag)
 
     def _write_record(self, record):
+        """Write a record. Returns the number of bytes written."""
+        if not self.emit:
+            return 0
         if not self._config.keep_links:
             clean_links(record)
         fix_blank_date_time_format(self._schema, record)
-        write_record(self.stream_id, record)
+        if self._config.validation_rate:
+            self._validate(record)
+        return self._output(record)
+
+    def _validate(self, record):
+        if self._validator is None:
+            self._validator = RecordValidator(self.schema.to_dict(),
+                                              self._config.validation_rate,
+                                              self._log_tags)
+        self._validator.sample(record)
+
+    def _output(self, record):
+        return write_record(self.stream_name, record)
 
 class TapItemStream(TapStream):
-    def __init__(self, client, stream_id, item_id, config, state):
+    # Record property keying the content hashes of a fingerprint index.
+    fingerprint_key = None
+    # Record property naming the partitions of columnar output files.
+    partition_key = None
+
+    def __init__(self, client, stream_id, item_id, config, state,
+                 properties=None, fingerprints=None, sink=None):
         self.item_id = item_id
-        super().__init__(client, stream_id, config, state)
+        super().__init__(client, stream_id, config, state,
+                         properties=properties)
+        self._fingerprints = (fingerprints.session(stream_id, item_id)
+                              if fingerprints is not None and
+                              self.fingerprint_key is not None
+                              else None)
+        self._sink = sink if self.partition_key is not None else None
+        self._writer = None
+        self._unwritten = 0
 
     @property
     def is_done(self):
@@ -143,20 +351,122 @@ class TapItemStream(TapStream):
     def _offset(self):
         return self._state.get_id_count(self.stream_id, self.item_id)
 
+    @property
+    def _estimated_size(self):
+        size = self._state.get_estimate(self.stream_id, self.item_id)
+        if size is None or not self.checkpoints:
+            return size
+        # Less what earlier runs emitted before they stopped.
+        return max(0, size - self._offset)
+
+    @property
+    def _start_date(self):
+        deferred = self._state.get_deferred(self.stream_id, self.item_id)
+        if deferred is None:
+            return super()._start_date
+        # Where the run that deferred the stream would have started it.
+        start_date = deferred[Keys.start_date]
+        return datify_utc(start_date) if start_date else None
+
+    def defer(self):
+        """Leave the stream to a later run, from the same start date."""
+        if self._state.get_deferred(self.stream_id, self.item_id) is None:
+            start_date = self._start_date
+            self._state.set_deferred(
+                self.stream_id, self.item_id,
+                start_date.isoformat() if start_date else None
+            )
+
     @abstractmethod
     def _iter_records(self):
         raise NotImplementedError()
 
     def _record_counter(self):
-        return Counter(Metric.record_count, tags={Tag.endpoint: self.stream_id,
-                                                  'item_id': self.item_id})
+        return Counter(Metric.record_count, tags=self._metric_tags)
+
+    @property
+    def _metric_tags(self):
+        return {Tag.endpoint: self.stream_id, 'item_id': self.item_id}
+
+    @contextmanager
+    def _records(self):
+        with super()._records() as records:
+            if self._fingerprints is None:
+                yield records
+            else:
+                yield self._prefetch_fingerprints(records)
+
+    def _prefetch_fingerprints(self, records):
+        """Records, looking up the fingerprints of a page at a time."""
+        while True:
+            page = [self._expand_record(record) for record in
+                    itertools.islice(records, self._config.count)]
+            if not page:
+                return
+            self._fingerprints.prefetch(record[self.fingerprint_key]
+                                        for record in page)
+            yield from page
+
+    def _expand_record(self, record):
+        return record
 
     def _update_state(self, record):
+        if self._writer is None:
+            self._add_count(1)
+            return
+        # Only count records once they are in a columnar file.
+        self._unwritten += 1
+        if self._writer.full:
+            self._flush_writer()
+
+    def _add_count(self, n):
         old_count = self._state.get_id_count(self.stream_id, self.item_id)
-        self._state.set_id_count(self.stream_id, self.item_id, 1 + old_count)
+        self._state.set_id_count(self.stream_id, self.item_id, n + old_count)
+
+    def pour_schema(self):
+        if self._sink is None or not self.emit:
+            super().pour_schema()
+            return
+        self._writer = self._sink.writer(self.stream_id, self.partition_key,
+                                         self.item_id, self.schema.to_dict())
+
+    def _output(self, record):
+        if self._writer is None:
+            return super()._output(record)
+        self._writer.write(record)
+        return 0
+
+    def _flush_writer(self):
+        if self._writer is not None:
+            self._writer.flush()
+            self._add_count(self._unwritten)
+            self._unwritten = 0
+
+    def _stop(self, reason='deadline'):
+        self._flush_writer()
+        super()._stop(reason=reason)
 
     def _set_done(self):
         self._state.set_id_done(self.stream_id, self.item_id, True)
+        self._state.clear_deferred(self.stream_id, self.item_id)
+
+    def _write_record(self, record):
+        if (self._fingerprints is not None and
+                not self._fingerprints.changed(record[self.fingerprint_key],
+                                               record)):
+            # Unchanged since the last run.
+            return 0
+        return super()._write_record(record)
+
+    def post_pour(self):
+        self._flush_writer()
+        if self._fingerprints is not None:
+            self._fingerprints.commit()
+            self._log_info(action='fingerprint',
+                           records=self._fingerprints.records,
+                           skipped=self._fingerprints.skipped,
+                           skip_ratio=self._fingerprints.skip_ratio)
+        super().post_pour()
 
     def __str__(self):
         return '{}({}, {})'.format(type(self).__name__, self.stream_id,
@@ -170,108 +480,220 @@ class TapItemStream(TapStream):
     def __json__(self):
         return {'stream_id': self.stream_id, 'item_id': self.item_id}
 
-    def _log_info(self, **tags):
-        super()._log_info(item_id=self.item_id, **tags)
+    @property
+    def _log_tags(self):
+        return {**super()._log_tags, 'item_id': self.item_id}
 
 class ListStream(TapStream):
-    def __init__(self, client, config, state):
-        super().__init__(client, Stream.lists, config, state)
+    required_properties = ('stats',)
+
+    def __init__(self, client, config, state, properties=None, emit=True):
+        super().__init__(client, Stream.lists, config, state,
+                         properties=properties, emit=emit)
+
+    @staticmethod
+    def item_estimate(record):
+        """Estimated number of list members of a list record."""
+        stats = record.get('stats') or {}
+        return sum(stats.get(k) or 0 for k in ('member_count',
+                                                'unsubscribe_count',
+                                                'cleaned_count'))
 
 class CampaignStream(TapStream):
-    def __init__(self, client, config, state):
-        super().__init__(client, Stream.campaigns, config, state)
+    required_properties = ('emails_sent',)
+
+    def __init__(self, client, config, state, properties=None, emit=True):
+        super().__init__(client, Stream.campaigns, config, state,
+                         properties=properties, emit=emit)
+
+    @staticmethod
+    def item_estimate(record):
+        """Estimated number of email activity records of a campaign record."""
+        return record.get('emails_sent') or 0
 
     def _iter_records(self):
         if self._lag_date is None:
             yield from self._client.iter_items(
                 self.api,
-                count=self._config.count
+                deadline=self._deadline,
+                **self._v3_args()
             )
         else:
             gen_create = self._client.iter_items(
                 self.api,
-                count=self._config.count,
-                since_create_time=self._start_date.isoformat()
+                since_create_time=self._start_date.isoformat(),
+                deadline=self._deadline,
+                **self._v3_args()
             )
             gen_send = self._client.iter_items(
                 self.api,
-                count=self._config.count,
-                since_send_time=self._lag_date.isoformat()
+                since_send_time=self._lag_date.isoformat(),
+                deadline=self._deadline,
+                **self._v3_args()
             )
             yield from itertools.chain(gen_create, gen_send)
 
 class ListMemberStream(TapItemStream):
     key_properties = ['id', 'list_id']
-
-    def __init__(self, client, list_id, config, state):
-        super().__init__(client, Stream.list_members, list_id, config, state)
+    replication_key = 'last_changed'
+    fingerprint_key = 'id'
+    partition_key = 'list_id'
+
+    def __init__(self, client, list_id, config, state, properties=None,
+                 metadata=None, fingerprints=None, sink=None):
+        super().__init__(client, Stream.list_members, list_id, config, state,
+                         properties=properties, fingerprints=fingerprints,
+                         sink=sink)
+        self._metadata = metadata or ListMetadataCache(
+            client, state, max_age_hours=config.metadata_cache_ttl
+        )
         self._merge_fields = None
+        self._max_last_changed = None
 
     @property
-    def schema(self):
-        if self._schema is None:
-            raw_schema = self._client.item_schema(self.api)
-            if self._config.merge_fields_array:
-                # Replace merge fields object with array to make a separate table.
-                mf_desc = raw_schema['properties']['merge_fields']['description']
-                raw_schema['properties']['merge_fields'] = {
-                    'description': mf_desc,
-                    'type': 'array',
-                    'items': {'type': 'object',
-                              'properties': {'merge_id': {'type': 'number'},
-                                             'tag': {'type': 'string'},
-                                             'name': {'type': 'string'},
-                                             'type': {'type': 'string'},
-                                             'value': {'type': 'string'}}}
-                }
-            if self._config.interests_array:
-                # Replace interest object with array to make a separate table.
-                int_desc = raw_schema['properties']['interests']['description']
-                raw_schema['properties']['interests'] = {
-                    'description': int_desc,
-                    'type': 'array',
-                    'items': {'type': 'object'}
-                }
-            self._schema = Schema.from_dict(raw_schema)
-        return self._schema
+    def _start_date(self):
+        # Per-list high-water mark of last_changed from the previous runs.
+        hwm = self._state.get_high_water_mark(self.stream_id, self.item_id)
+        if hwm is None:
+            return super()._start_date
+        return datify_utc(hwm)
+
+    def _raw_schema(self):
+        raw_schema = self._client.item_schema(self.api)
+        if self._config.merge_fields_array:
+            # Replace merge fields object with array to make a separate table.
+            mf_desc = raw_schema['properties']['merge_fields']['description']
+            raw_schema['properties']['merge_fields'] = {
+                'description': mf_desc,
+                'type': 'array',
+                'items': {'type': 'object',
+                          'properties': {'merge_id': {'type': 'number'},
+                                         'tag': {'type': 'string'},
+                                         'name': {'type': 'string'},
+                                         'type': {'type': 'string'},
+                                         'value': {'type': 'string'}}}
+            }
+        if self._config.interests_array:
+            # Replace interest object with array to make a separate table.
+            int_desc = raw_schema['properties']['interests']['description']
+            raw_schema['properties']['interests'] = {
+                'description': int_desc,
+                'type': 'array',
+                'items': {'type': 'object'}
+            }
+        return raw_schema
 
     def _iter_records(self):
         args = {}
-        if self._config.use_list_member_export:
+        if self._config.use_list_member_batch:
+            # Batch Operations API: results are unordered, so always fetch
+            # the whole list.
+            if self._start_date is not None:
+                args['since_last_changed'] = self._start_date.isoformat()
+            yield from self._client.batch_iter_items(self.api,
+                                                     list_id=self.item_id,
+                                                     deadline=self._deadline,
+                                                     **args,
+                                                     **self._v3_args())
+        elif self._config.use_list_member_export:
             # Bulk Export API
             if self._start_date is not None:
                 args['since'] = self._start_date
-            iterables = []
+            selected = self._selected_properties
+            if selected is None or 'merge_fields' in selected:
+                args['merge_fields'] = self._metadata.merge_fields(
+                    self.item_id
+                )
             for status in Status._available:
-                yield from self._client.list_export_api_v3(list_id=self.item_id,
-                                                           status=status,
-                                                           **args)
+                yield from self._client.list_export_api_v3(
+                    list_id=self.item_id,
+                    status=status,
+                    compact=True,
+                    properties=selected,
+                    deadline=self._deadline,
+                    **args
+                )
         else:
-            # API v3
-            if self._start_date is not None:
-                args['since_last_changed'] = self._start_date.isoformat()
+            # API v3: all statuses (incl. unsubscribed and cleaned), oldest
+            # change first. A member changed since an earlier run moves to
+            # the end, so a stopped stream resumes from the last change it
+            # emitted rather than from an offset. A second earlier, as the
+            # filter may exclude its bound; members changed in that second
+            # are emitted again.
+            since = self._resume_last_changed
+            if since is not None:
+                since = datify_utc(since) - datetime.timedelta(seconds=1)
+            else:
+                since = self._start_date
+            if since is not None:
+                args['since_last_changed'] = since.isoformat()
             yield from self._client.iter_items(self.api,
                                                list_id=self.item_id,
-                                               count=self._config.count,
-                                               offset=self._offset)
-
-    def _get_merge_fields(self):
-        if self._merge_fields is None:
-            mf_response = self._client.lists.merge_fields.all(
-                list_id=self.item_id,
-                get_all=True,
-                fields=','.join(('merge_fields.merge_id',
-                                 'merge_fields.name',
-                                 'merge_fields.tag',
-                                 'merge_fields.type'))
-            )
+                                               offset=0,
+                                               sort_field='last_changed',
+                                               sort_dir='ASC',
+                                               deadline=self._deadline,
+                                               **args,
+                                               **self._v3_args())
+
+    @property
+    def checkpoints(self):
+        return self._resumes_by_last_changed
+
+    @property
+    def _resumes_by_last_changed(self):
+        # Only API v3 pages are sorted by last_changed.
+        return not (self._config.use_list_member_batch or
+                    self._config.use_list_member_export)
+
+    @property
+    def _resume_last_changed(self):
+        return self._state.get_id_offset(self.stream_id, self.item_id,
+                                         {}).get(Keys.last_changed)
+
+    def _add_count(self, n):
+        super()._add_count(n)
+        if self._resumes_by_last_changed and self._max_last_changed:
+            self._state.set_id_offset(self.stream_id, self.item_id,
+                                      Keys.last_changed,
+                                      self._max_last_changed)
+
+    def _track_last_changed(self, record):
+        last_changed = record.get('last_changed')
+        if last_changed and (self._max_last_changed is None or
+                             last_changed > self._max_last_changed):
+            self._max_last_changed = last_changed
+
+    def _set_done(self):
+        # An incremental run's size estimates the next one better than the
+        # list's member count; after a full run it is unknown.
+        if self._state.get_high_water_mark(self.stream_id,
+                                           self.item_id) is not None:
+            self._state.set_estimate(self.stream_id, self.item_id,
+                                     self._offset)
+        else:
+            self._state.clear_estimate(self.stream_id, self.item_id)
+        # Only advance the high-water mark once every change has been
+        # emitted; export rows are not ordered by last_changed.
+        if self._max_last_changed is not None:
+            self._state.set_high_water_mark(self.stream_id, self.item_id,
+                                            self._max_last_changed)
+        super()._set_done()
+
+    def _get_merge_fields(self, refresh=False):
+        if self._merge_fields is None or refresh:
+            merge_fields = (self._metadata.refresh(self.item_id) if refresh
+                            else self._metadata.merge_fields(self.item_id))
             self._merge_fields = {field_spec['tag']: field_spec
-                                  for field_spec in mf_response['merge_fields']}
+                                  for field_spec in merge_fields}
         return self._merge_fields
 
     def _convert_merge_fields(self, record):
         mf_lookup = self._get_merge_fields()
         mf_dict = record.get('merge_fields', {})
+        if not mf_dict.keys() <= mf_lookup.keys():
+            # Merge field added since the cached merge fields were fetched.
+            mf_lookup = self._get_merge_fields(refresh=True)
         mf_list = []
         for tag, value in mf_dict.items():
             mf_list.append({'merge_id': mf_lookup[tag]['merge_id'],
@@ -287,37 +709,70 @@ class ListMemberStream(TapItemStream):
             interest_list.append({'id': interest_id, 'value': interest_value})
         record['interests'] = interest_list
 
+    def _expand_record(self, record):
+        if isinstance(record, ListMemberExportRow):
+            # Compact export rows are only expanded right before writing.
+            return record.to_api_v3()
+        return record
+
     def _write_record(self, record):
-        if self._config.merge_fields_array:
+        record = self._expand_record(record)
+        self._track_last_changed(record)
+        selected = self._selected_properties
+        if self._config.merge_fields_array and (selected is None or
+                                                'merge_fields' in selected):
             self._convert_merge_fields(record)
-        if self._config.interests_array:
+        if self._config.interests_array and (selected is None or
+                                             'interests' in selected):
             self._convert_interests(record)
-        super()._write_record(record)
+        return super()._write_record(record)
 
 class EmailActivityStream(TapItemStream):
     key_properties = ['campaign_id', 'email_id']
+    fingerprint_key = 'email_id'
+    partition_key = 'campaign_id'
 
-    def __init__(self, client, campaign_id, config, state):
+    def __init__(self, client, campaign_id, config, state, properties=None,
+                 fingerprints=None, sink=None):
         super().__init__(client=client,
                          stream_id=Stream.email_activity_reports,
                          item_id=campaign_id,
                          config=config,
-                         state=state)
+                         state=state,
+                         properties=properties,
+                         fingerprints=fingerprints,
+                         sink=sink)
+
+    @property
+    def checkpoints(self):
+        # Batch results and exports start over; v3 pages resume at the
+        # offset.
+        return not (self._config.use_email_activity_batch or
+                    self._config.use_email_activity_export)
 
     def _iter_records(self):
         args = {}
-        if self._config.use_email_activity_export:
+        if self._config.use_email_activity_batch:
+            # Batch Operations API
+            yield from self._client.batch_iter_items(self.api,
+                                                     campaign_id=self.item_id,
+                                                     deadline=self._deadline,
+                                                     **self._v3_args())
+        elif self._config.use_email_activity_export:
             # Bulk Export API
             if self._start_date is not None:
                 args['since'] = self._start_date
             yield from self._client.subscriber_activity_export_api_v3(
                 campaign_id=self.item_id,
                 include_empty=self._config.include_empty_activity,
+                properties=self._selected_properties,
+                deadline=self._deadline,
                 **args
             )
         else:
             # API v3
             yield from self._client.iter_items(self.api,
                                                campaign_id=self.item_id,
-                                               count=self._config.count,
-                                               offset=self._offset)
+                                               offset=self._offset,
+                                               deadline=self._deadline,
+                                               **self._v3_args())
@@ -1,14 +1,25 @@
 """MailChimpTap for singer.io."""
 
 from collections import deque
+import contextlib
+import queue
+import threading
+import time
 from singer import job_timer
+from .catalog import (discover, load_cached_catalog, stream_selection,
+                      write_cached_catalog)
 from .client import MailChimp
+from .columnar import ColumnarSink, OutputFormat
+from .metadata import ListMetadataCache
+from .metrics import http_metrics
+from .pager import AdaptivePager
+from .shards import shard_of
 from .streams import (ListStream,
                       ListMemberStream,
                       CampaignStream,
                       EmailActivityStream,
                       Stream)
-from .utils import roundrobin
+from .utils import Deadline, makespan, weighted_roundrobin
 import itertools
 import tap_mailchimp.logger as logger
 
@@ -19,73 +30,507 @@ class MailChimpTap:
     Usage:
         >>> tap = MailChimpTap(config, state)
         >>> tap.pour()
+
+    If a `catalog` dict is given only its selected streams and properties
+    are tapped; otherwise everything is. A `session`, e.g. from
+    `pools.SessionPool`, sends every request of the tap. With
+    `shared_http_metrics` the caller configures and flushes the
+    process-wide HTTP metrics instead of the tap.
+
+    With `config.shard_count` > 1 only the list members and email activity
+    of the lists and campaigns in shard `config.shard_index` are tapped, and
+    only shard 0 emits the lists and campaigns themselves.
     """
 
-    def __init__(self, config, state):
+    def __init__(self, config, state, catalog=None, session=None,
+                 shared_http_metrics=False):
         self.config = config
         self.state = state
-        self.client = MailChimp(config.user_name,
-                                config.api_key,
-                                user_agent=config.user_agent,
-                                timeout=config.request_timeout,
-                                exclude_links=(not config.keep_links))
+        # A sample must not be resumed from: it would skip what it left out.
+        self.state.read_only = config.test_mode
+        self.session = session
+        self.selection = (stream_selection(catalog)
+                          if catalog is not None else None)
+        self.state.configure_flush(interval=config.state_flush_interval,
+                                   records=config.state_flush_records,
+                                   bytes_=config.state_flush_bytes)
+        self._shared_http_metrics = shared_http_metrics
+        if not shared_http_metrics:
+            http_metrics.configure(raw=config.raw_http_metrics,
+                                   interval=config.http_metrics_interval)
+        self.fingerprints = None
+        self.sink = None
+        self._client = None
+        self._metadata = None
+        # Ids of the item streams of each stream in test mode.
+        self._sampled_ids = {}
+
+    @property
+    def client(self):
+        """API client, set up on first use."""
+        if self._client is None:
+            config = self.config
+            self._client = MailChimp(
+                config.user_name,
+                config.api_key,
+                user_agent=config.user_agent,
+                timeout=config.request_timeout,
+                exclude_links=(not config.keep_links),
+                pager=self._pager(),
+                batch_poll_interval=config.batch_poll_interval,
+                batch_max_wait=config.batch_max_wait,
+                stream_json=config.stream_json,
+                session=self.session
+            )
+        return self._client
+
+    @property
+    def metadata(self):
+        if self._metadata is None:
+            self._metadata = ListMetadataCache(
+                self.client, self.state,
+                max_age_hours=self.config.metadata_cache_ttl
+            )
+        return self._metadata
 
     def pour(self):
         """Pour schemata and data from the Mailchimp tap."""
-        is_error = False
+        self._stopped = False
+        self.deadline = self._deadline()
+        if self.config.test_mode:
+            self._load_cached_schemas()
+        if self.config.fingerprint_index and not self.config.test_mode:
+            # A sample would mark records as emitted for the next real run.
+            from .fingerprints import FingerprintIndex
+            self.fingerprints = FingerprintIndex(self.config.fingerprint_index)
+        if self.config.output_format != OutputFormat.singer:
+            self.sink = ColumnarSink(self.config.output_dir,
+                                     self.config.output_format,
+                                     file_rows=self.config.output_file_rows)
+        try:
+            with self.state.flusher():
+                if self.config.pipeline_workers:
+                    ok = self._pour_pipelined()
+                else:
+                    ok = self._pour_sequential()
+        finally:
+            if self.fingerprints is not None:
+                self.fingerprints.close()
+            if not self._shared_http_metrics:
+                http_metrics.flush()
+        if self._stopped:
+            self.state.sync(force=True)
+            return
+        if ok and not self.config.test_mode:
+            # A sample does not advance the last run.
+            self.state.finalize_run()
+        self.state.sync(force=True)
+
+    def _load_cached_schemas(self):
+        """Take stream schemas from the catalog cache, if configured."""
+        if not self.config.catalog_cache:
+            return
+        for entry in self.discover()['streams']:
+            self.client.cache_item_schema(Stream.api[entry['stream']],
+                                          entry['schema'])
+
+    def _pour_sequential(self):
+        ok = True
         stream_gens = []
         stream_gens.append(self.lists_stream_gen())
         stream_gens.append(self.campaigns_stream_gen())
         stream_gens.append(self.list_members_stream_gen())
         stream_gens.append(self.email_activity_reports_stream_gen())
+        if self.config.interleave_streams:
+            for stream in itertools.chain(*stream_gens[:2]):
+                if self._stop_requested():
+                    return ok
+                ok = self._pour_stream(stream) and ok
+            return (self._pour_interleaved(itertools.chain(*stream_gens[2:]))
+                    and ok)
         for stream in itertools.chain(*stream_gens):
-            if self._check_stop():
-                self._log_early_stop()
-                return
-            if stream.is_done:
-                stream.log_skip('done')
-                continue
-            try:
-                with job_timer(job_type=stream.stream_id):
-                    stream.pour()
-            except Exception as e:
-                is_error = True
-                logger.exception(e, stream=stream)
-        if not is_error:
-            self.state.finalize_run()
-        self.state.sync(force=True)
+            if self._stop_requested():
+                return ok
+            ok = self._pour_stream(stream) and ok
+        return ok
+
+    def _pour_interleaved(self, streams):
+        """Pour item streams taking turns of a few pages each.
+
+        Up to `config.interleave_streams` streams take turns at once,
+        smallest first, so that no large item stream holds up the others.
+        Each turn a stream pours as many pages as the weight of its stream id
+        in `config.interleave_weights` (1 by default).
+        """
+        results = []
+        weights = self.config.interleave_weights
+        streams = sorted(streams, key=self._estimate)
+        turns = weighted_roundrobin(
+            ((self._pour_stream_pages(stream, results),
+              weights.get(stream.stream_id, 1)) for stream in streams),
+            width=self.config.interleave_streams
+        )
+        with contextlib.closing(turns):
+            if self._stop_requested():
+                return True
+            for _ in turns:
+                if self._stop_requested():
+                    # Checkpoints the streams that already started.
+                    break
+        return all(results)
+
+    def _pour_stream_pages(self, stream, results):
+        """Pour a stream page by page unless it is done, see `_pour_stream`.
+
+        Appends False to `results` if it failed.
+        """
+        if not self._should_pour(stream):
+            return
+        try:
+            with job_timer(job_type=stream.stream_id):
+                yield from stream.pour_pages(deadline=self.deadline)
+        except Exception as e:
+            logger.exception(e, stream=stream)
+            results.append(False)
+            return
+        if not stream.is_done:
+            # Stopped at the deadline.
+            self._stop_requested()
+
+    def _pour_pipelined(self):
+        """Pour item streams on worker threads as their parent ids arrive.
+
+        Queued item streams are started largest first.
+        """
+        ok = True
+        dependencies = ((self.lists_stream_gen,
+                         Stream.list_members,
+                         self._list_member_stream,
+                         self.list_members_stream_gen),
+                        (self.campaigns_stream_gen,
+                         Stream.email_activity_reports,
+                         self._email_activity_stream,
+                         self.email_activity_reports_stream_gen))
+        with PipelineScheduler(self._pour_item_stream,
+                               self.config.pipeline_workers,
+                               priority=self._estimate) as scheduler:
+            for parent_gen, child_id, child_factory, child_gen in dependencies:
+                for parent in parent_gen():
+                    if self._stop_requested():
+                        return ok
+                    parent.add_listener(
+                        lambda _, record, factory=child_factory:
+                        scheduler.submit(factory(record['id']))
+                    )
+                    ok = self._pour_stream(parent) and ok
+                # Ids from earlier runs or from a parent that was done.
+                for child in child_gen(log_plan=False):
+                    scheduler.submit(child)
+                if self._is_selected(child_id):
+                    self._log_plan(child_id, self.config.pipeline_workers)
+        return scheduler.ok and ok
+
+    def _pour_item_stream(self, stream):
+        if self._stop_requested():
+            stream.log_skip('exceeded session time')
+            return True
+        return self._pour_stream(stream)
+
+    def _pour_stream(self, stream):
+        """Pour a stream unless it is done. Return False if it failed."""
+        if not self._should_pour(stream):
+            return True
+        try:
+            with job_timer(job_type=stream.stream_id):
+                stream.pour(deadline=self.deadline)
+        except Exception as e:
+            logger.exception(e, stream=stream)
+            return False
+        if not stream.is_done:
+            # Stopped at the deadline.
+            self._stop_requested()
+        return True
+
+    def _should_pour(self, stream):
+        if stream.is_done:
+            stream.log_skip('done')
+            return False
+        if not self._fits_budget(stream):
+            # Leave it for a later run but keep going with other streams;
+            # the run still finishes.
+            stream.defer()
+            stream.log_skip('insufficient time budget')
+            return False
+        return True
+
+    def _fits_budget(self, stream):
+        """False if a stream that cannot checkpoint would not finish.
+
+        Streams that checkpoint always start; the deadline stops them at a
+        page boundary and the next run resumes them.
+        """
+        if stream.checkpoints:
+            return True
+        remaining = self.deadline.remaining()
+        duration = stream.estimated_duration
+        return remaining is None or duration is None or duration <= remaining
+
+    def _deadline(self):
+        if not self.config.max_run_time:
+            return Deadline()
+        session_start = time.time() - self.state.session_time()
+        return Deadline(session_start + 60 * self.config.max_run_time)
+
+    def discover(self):
+        """Return the catalog dict, from the on-disk cache when fresh."""
+        path = self.config.catalog_cache
+        catalog = load_cached_catalog(path, self.config.catalog_cache_ttl)
+        if catalog is None:
+            catalog = discover(self._schema_streams())
+            if path:
+                write_cached_catalog(path, catalog)
+        return catalog
 
     def lists_stream_gen(self):
-        stream = ListStream(self.client, self.config, self.state)
+        if self._is_selected(Stream.lists) and self._emits_parents:
+            stream = ListStream(self.client, self.config, self.state,
+                                properties=self._properties(Stream.lists))
+        elif self._is_selected(Stream.list_members):
+            # Only tap list ids for the list members stream.
+            stream = ListStream(self.client, self.config, self.state,
+                                properties=set(), emit=False)
+        else:
+            return
+        stream.add_listener(self._estimate_listener(Stream.list_members))
+        stream.add_listener(lambda _, record:
+                            self.metadata.observe_list(record))
         yield stream
 
-    def list_members_stream_gen(self):
-        for list_id in self.state.get_ids(Stream.lists):
-            stream = ListMemberStream(self.client, list_id, self.config,
-                                      self.state)
-            yield stream
+    def list_members_stream_gen(self, log_plan=True):
+        if not self._is_selected(Stream.list_members):
+            return
+        streams = [self._list_member_stream(list_id)
+                   for list_id in self._item_ids(Stream.list_members)]
+        streams = [stream for stream in streams if stream is not None]
+        yield from self._largest_first(streams, log_plan)
 
     def campaigns_stream_gen(self):
-        stream = CampaignStream(self.client, self.config, self.state)
+        if self._is_selected(Stream.campaigns) and self._emits_parents:
+            stream = CampaignStream(self.client, self.config, self.state,
+                                    properties=self._properties(Stream.campaigns))
+        elif self._is_selected(Stream.email_activity_reports):
+            # Only tap campaign ids for the email activity stream.
+            stream = CampaignStream(self.client, self.config, self.state,
+                                    properties=set(), emit=False)
+        else:
+            return
+        stream.add_listener(
+            self._estimate_listener(Stream.email_activity_reports)
+        )
         yield stream
 
-    def email_activity_reports_stream_gen(self):
-        for campaign_id in self.state.get_ids(Stream.campaigns):
-            stream = EmailActivityStream(self.client, campaign_id, self.config,
-                                         self.state)
-            yield stream
+    def email_activity_reports_stream_gen(self, log_plan=True):
+        if not self._is_selected(Stream.email_activity_reports):
+            return
+        streams = [self._email_activity_stream(campaign_id)
+                   for campaign_id in
+                   self._item_ids(Stream.email_activity_reports)]
+        streams = [stream for stream in streams if stream is not None]
+        yield from self._largest_first(streams, log_plan)
+
+    def _estimate_listener(self, item_stream_id):
+        """Keep the size estimate of the item stream of each parent record."""
+        def listener(parent, record):
+            # Incremental item streams keep the size of their last run.
+            if self.state.get_high_water_mark(item_stream_id,
+                                              record['id']) is None:
+                self.state.set_estimate(item_stream_id, record['id'],
+                                        parent.item_estimate(record))
+        return listener
+
+    def _estimate(self, stream):
+        return self.state.get_estimate(stream.stream_id, stream.item_id, 0)
+
+    def _largest_first(self, streams, log_plan=True):
+        streams = sorted(streams, key=self._estimate, reverse=True)
+        if log_plan and streams:
+            self._log_plan(streams[0].stream_id, 1)
+        return streams
+
+    def _log_plan(self, stream_id, workers):
+        estimates = self.state.estimates.get(stream_id, {})
+        sizes = [estimates.get(id_, 0) for id_ in self._item_ids(stream_id)]
+        logger.info({'action': 'plan',
+                     'stream_id': stream_id,
+                     'streams': len(sizes),
+                     'workers': workers,
+                     'total_items': sum(sizes),
+                     'makespan_items': makespan(sizes, workers)})
+
+    _parent_stream_id = {Stream.list_members: Stream.lists,
+                         Stream.email_activity_reports: Stream.campaigns}
+
+    def _list_member_stream(self, list_id):
+        if (not self._is_selected(Stream.list_members) or
+                not self._in_shard(list_id) or
+                not self._in_sample(Stream.list_members, list_id)):
+            return None
+        return ListMemberStream(self.client, list_id, self.config, self.state,
+                                properties=self._properties(Stream.list_members),
+                                metadata=self.metadata,
+                                fingerprints=self.fingerprints,
+                                sink=self.sink)
+
+    def _email_activity_stream(self, campaign_id):
+        if (not self._is_selected(Stream.email_activity_reports) or
+                not self._in_shard(campaign_id) or
+                not self._in_sample(Stream.email_activity_reports,
+                                    campaign_id)):
+            return None
+        return EmailActivityStream(
+            self.client, campaign_id, self.config, self.state,
+            properties=self._properties(Stream.email_activity_reports),
+            fingerprints=self.fingerprints,
+            sink=self.sink
+        )
+
+    @property
+    def _emits_parents(self):
+        return self.config.shard_index == 0
+
+    def _in_shard(self, id_):
+        if self.config.shard_count <= 1:
+            return True
+        return shard_of(id_, self.config.shard_count) == self.config.shard_index
+
+    def _in_sample(self, stream_id, id_):
+        if not self.config.test_mode:
+            return True
+        sampled = self._sampled_ids.setdefault(stream_id, set())
+        if id_ in sampled:
+            return True
+        if len(sampled) >= self.config.test_mode_item_streams:
+            return False
+        sampled.add(id_)
+        return True
+
+    def _shard_ids(self, stream_id):
+        return [id_ for id_ in self.state.get_ids(stream_id)
+                if self._in_shard(id_)]
+
+    def _item_ids(self, stream_id):
+        """Ids of the parents of this run and of deferred item streams."""
+        ids = self._shard_ids(self._parent_stream_id[stream_id])
+        return ids + [id_ for id_ in self.state.get_deferred_ids(stream_id)
+                      if self._in_shard(id_) and id_ not in ids]
+
+    def _schema_streams(self):
+        return [ListStream(self.client, self.config, self.state),
+                ListMemberStream(self.client, None, self.config, self.state),
+                CampaignStream(self.client, self.config, self.state),
+                EmailActivityStream(self.client, None, self.config, self.state)]
+
+    def _pager(self):
+        if not self.config.adaptive_count:
+            return None
+        return AdaptivePager(self.state,
+                             min_count=self.config.min_count,
+                             max_count=self.config.max_count,
+                             target_time=self.config.target_page_time,
+                             max_bytes=self.config.max_page_bytes)
+
+    def _is_selected(self, stream_id):
+        return self.selection is None or stream_id in self.selection
+
+    def _properties(self, stream_id):
+        if self.selection is None:
+            return None
+        return self.selection.get(stream_id)
 
     def __repr__(self):
         return '{}(config={!r}, state={!r})'.format(type(self).__name__,
                                                     self.config, self.state)
 
     def _check_stop(self):
-        if self.config.max_run_time:
-            runtime_minutes = self.state.session_time() / 60
-            return self.config.max_run_time < runtime_minutes
+        return self.deadline.expired()
+
+    def _stop_requested(self):
+        if self._check_stop():
+            if not self._stopped:
+                self._stopped = True
+                self._log_early_stop()
+            return True
         return False
 
     def _log_early_stop(self):
         logger.info({'action': 'stop',
                      'reason': 'exceeded session time',
                      'time': self.state.session_time() / 60})
+
+
+class PipelineScheduler:
+    """Pour item streams on a pool of worker threads.
+
+    Streams are queued as soon as they are submitted and started highest
+    priority first; a stream submitted twice (same stream and item id) is
+    only poured once.
+
+    Args:
+        pour (callable): Pours a stream, returns False if it failed.
+        workers (int): Number of worker threads.
+        priority (callable): Priority of a stream, e.g. its estimated size.
+            Optional.
+    """
+
+    def __init__(self, pour, workers, priority=None):
+        self._pour = pour
+        self._priority = priority or (lambda stream: 0)
+        self._queue = queue.PriorityQueue()
+        self._sequence = itertools.count()
+        self._results = []
+        self._submitted = set()
+        self._lock = threading.Lock()
+        self._threads = [threading.Thread(target=self._work,
+                                          name='tap_mailchimp_{}'.format(i),
+                                          daemon=True)
+                         for i in range(workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, stream):
+        if stream is None:
+            return
+        key = (stream.stream_id, getattr(stream, 'item_id', None))
+        with self._lock:
+            if key in self._submitted:
+                return
+            self._submitted.add(key)
+        # Highest priority first, then first come first served.
+        self._queue.put((-self._priority(stream), next(self._sequence),
+                         stream))
+
+    @property
+    def ok(self):
+        return all(self._results)
+
+    def _work(self):
+        while True:
+            _, _, stream = self._queue.get()
+            if stream is None:
+                return
+            try:
+                ok = self._pour(stream)
+            except Exception as e:
+                logger.exception(e, stream=stream)
+                ok = False
+            self._results.append(ok)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        # Stop signals sort after every queued stream.
+        for _ in self._threads:
+            self._queue.put((float('inf'), next(self._sequence), None))
+        for thread in self._threads:
+            thread.join()
@@ -3,6 +3,9 @@
 from collections import abc, deque
 import dateutil
 import hashlib
+import heapq
+from itertools import cycle, islice
+import time
 from singer import Schema
 import tap_mailchimp.logger as logger
 
@@ -125,6 +128,14 @@ def datify(dt):
         return dtobj.isoformat()
 
 
+def datify_utc(dt):
+    """Parse an ISO 8601 string to a datetime in UTC (naive means UTC)."""
+    dtobj = dateutil.parser.parse(dt)
+    if dtobj.tzinfo is None:
+        return dtobj.replace(tzinfo=dateutil.tz.tzutc())
+    return dtobj.astimezone(dateutil.tz.tzutc())
+
+
 def datify_or_none(dt):
     try:
         return datify(dt)
@@ -150,6 +161,56 @@ def tap_start_date(config, state):
     return state.last_run or config.start_date
 
 
+class DeadlineExceeded(Exception):
+    pass
+
+
+class Deadline:
+    """Run-wide deadline checked cooperatively by long running loops.
+
+    Args:
+        end_time (float): Deadline as a `time.time()` timestamp. None means
+            no deadline.
+    """
+
+    def __init__(self, end_time=None):
+        self.end_time = end_time
+
+    def remaining(self):
+        """Seconds left, or None if there is no deadline."""
+        if self.end_time is None:
+            return None
+        return self.end_time - time.time()
+
+    def expired(self):
+        return self.end_time is not None and time.time() >= self.end_time
+
+    def check(self):
+        if self.expired():
+            raise DeadlineExceeded(self.end_time)
+
+    def __json__(self):
+        return {'end_time': self.end_time}
+
+
+def check_deadline(deadline):
+    if deadline is not None:
+        deadline.check()
+
+
+def makespan(sizes, workers):
+    """Makespan of jobs scheduled largest first on the least busy worker.
+
+    Args:
+        sizes (iterable): Job sizes.
+        workers (int): Number of workers working in parallel.
+    """
+    loads = [0] * max(1, workers)
+    for size in sorted(sizes, reverse=True):
+        heapq.heapreplace(loads, loads[0] + size)
+    return max(loads)
+
+
 def roundrobin(*iterables):
     """roundrobin('ABC', 'D', 'EF') --> A D E B F C"""
     # From https://docs.python.org/3/library/itertools.html
@@ -163,3 +224,47 @@ def roundrobin(*iterables):
         except StopIteration:
             pending -= 1
             nexts = cycle(islice(nexts, pending))
+
+
+def weighted_roundrobin(weighted_iterables, width=None):
+    """Take turns between iterables, `weight` items per turn.
+
+    weighted_roundrobin([('ABC', 3), ('DE', 2), ('F', 1)], width=2)
+        --> A B C D E F
+
+    weighted_roundrobin([('ABCD', 1), ('E', 1), ('FG', 1)], width=2)
+        --> A E B C F D G
+
+    At most `width` iterables (all if None) take turns at once; the next one
+    joins when one is exhausted. `weighted_iterables`, an iterable of
+    `(iterable, weight)` pairs with weights of at least 1, is consumed
+    lazily. Closing the generator closes the iterators that joined.
+    """
+    pending = iter(weighted_iterables)
+    active = deque()
+    try:
+        while True:
+            while width is None or len(active) < width:
+                pair = next(pending, None)
+                if pair is None:
+                    break
+                it, weight = pair
+                if weight < 1:
+                    raise ValueError('Weights must be at least 1',
+                                     {'weight': weight})
+                active.append((iter(it), weight))
+            if not active:
+                return
+            it, weight = active.popleft()
+            for _ in range(weight):
+                try:
+                    item = next(it)
+                except StopIteration:
+                    break
+                yield item
+            else:
+                active.append((it, weight))
+    finally:
+        for it, _ in active:
+            if hasattr(it, 'close'):
+                it.close()
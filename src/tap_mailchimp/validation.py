@@ -0,0 +1,216 @@
+"""Validation of a sample of emitted records against their stream's schema.
+
+A JSON schema is compiled once into nested closures, so checking a record
+walks it without interpreting the schema again. The keywords MailChimp
+schemas use are checked: ``type``, ``enum``, ``format`` (date-time),
+``properties``, ``required``, ``additionalProperties``, ``items`` and
+``anyOf``; other keywords are ignored.
+"""
+
+import random
+import re
+import threading
+from collections import Counter
+import tap_mailchimp.jsonext as json
+import tap_mailchimp.logger as logger
+
+# Violations logged one by one per stream; later ones are only counted.
+MAX_LOGGED_VIOLATIONS = 10
+
+_DATE_TIME = re.compile(r'\d{4}-(0[1-9]|1[0-2])-(0[1-9]|[12]\d|3[01])'
+                        r'[T ]([01]\d|2[0-3]):[0-5]\d:[0-5]\d(\.\d+)?'
+                        r'(Z|[+-]\d\d:?\d\d)?$')
+
+_type_checks = {
+    'null': lambda v: v is None,
+    'boolean': lambda v: isinstance(v, bool),
+    'integer': lambda v: isinstance(v, int) and not isinstance(v, bool),
+    'number': lambda v: (isinstance(v, (int, float)) and
+                         not isinstance(v, bool)),
+    'string': lambda v: isinstance(v, str),
+    'object': lambda v: isinstance(v, dict),
+    'array': lambda v: isinstance(v, list)
+}
+
+
+def compile_schema(schema):
+    """Compile a JSON schema to `validate(value, path, errors)`.
+
+    `validate` appends a `(path, message)` tuple to `errors` for each
+    violation, `path` being a tuple of property names and array indices.
+    """
+    checks = []
+    types = schema.get('type')
+    if types is not None:
+        checks.append(_compile_type([types] if isinstance(types, str)
+                                    else list(types)))
+    if 'enum' in schema:
+        checks.append(_compile_enum(schema['enum']))
+    if schema.get('format') == 'date-time':
+        checks.append(_check_date_time)
+    if 'properties' in schema or 'required' in schema or \
+            isinstance(schema.get('additionalProperties'), (bool, dict)):
+        checks.append(_compile_object(schema))
+    if isinstance(schema.get('items'), dict):
+        checks.append(_compile_array(schema['items']))
+    if isinstance(schema.get('anyOf'), list):
+        checks.append(_compile_any_of(schema['anyOf']))
+    if not checks:
+        return _check_nothing
+    if len(checks) == 1:
+        return checks[0]
+
+    def validate(value, path, errors):
+        for check in checks:
+            check(value, path, errors)
+    return validate
+
+
+def _check_nothing(value, path, errors):
+    pass
+
+
+def _compile_type(types):
+    tests = [_type_checks[t] for t in types if t in _type_checks]
+    if len(tests) < len(types):
+        # Unknown type names: let anything through.
+        return _check_nothing
+    message = 'expected {}'.format(' or '.join(types))
+
+    def check(value, path, errors):
+        for test in tests:
+            if test(value):
+                return
+        errors.append((path, '{}, got {}'.format(message,
+                                                 type(value).__name__)))
+    return check
+
+
+def _compile_enum(enum):
+    message = 'expected one of {}'.format(enum)
+
+    def check(value, path, errors):
+        if value not in enum:
+            errors.append((path, message))
+    return check
+
+
+def _check_date_time(value, path, errors):
+    if isinstance(value, str) and not _DATE_TIME.match(value):
+        errors.append((path, 'expected a date-time'))
+
+
+def _compile_object(schema):
+    properties = [(name, compile_schema(prop))
+                  for name, prop in schema.get('properties', {}).items()]
+    known = {name for name, _ in properties}
+    required = schema.get('required', [])
+    additional = schema.get('additionalProperties', True)
+    check_additional = (compile_schema(additional)
+                        if isinstance(additional, dict) else None)
+
+    def check(value, path, errors):
+        if not isinstance(value, dict):
+            return
+        for name, validate in properties:
+            if name in value:
+                validate(value[name], path + (name,), errors)
+        for name in required:
+            if name not in value:
+                errors.append((path + (name,), 'missing required property'))
+        if additional is True:
+            return
+        for name in value.keys() - known:
+            if check_additional is None:
+                errors.append((path + (name,), 'unexpected property'))
+            else:
+                check_additional(value[name], path + (name,), errors)
+    return check
+
+
+def _compile_array(items):
+    validate_item = compile_schema(items)
+
+    def check(value, path, errors):
+        if not isinstance(value, list):
+            return
+        for i, item in enumerate(value):
+            validate_item(item, path + (i,), errors)
+    return check
+
+
+def _compile_any_of(schemas):
+    branches = [compile_schema(s) for s in schemas]
+
+    def check(value, path, errors):
+        for validate in branches:
+            branch_errors = []
+            validate(value, path, branch_errors)
+            if not branch_errors:
+                return
+        errors.append((path, 'expected a value matching anyOf'))
+    return check
+
+
+_compiled = {}
+_compiled_lock = threading.Lock()
+
+
+def compile_cached(schema):
+    """`compile_schema`, compiled once per distinct schema."""
+    key = json.dumps(schema, sort_keys=True)
+    with _compiled_lock:
+        validate = _compiled.get(key)
+        if validate is None:
+            validate = _compiled[key] = compile_schema(schema)
+    return validate
+
+
+class RecordValidator:
+    """Validate a random sample of the records of a stream.
+
+    Args:
+        schema (dict): JSON schema of the stream.
+        rate (float): Fraction of records to validate, in (0, 1].
+        log_tags (dict): Tags of the violations logged.
+    """
+
+    def __init__(self, schema, rate, log_tags):
+        self.checked = 0
+        self.invalid = 0
+        self.violations = Counter()
+        self._logged = 0
+        self._validate = compile_cached(schema)
+        self._rate = rate
+        self._log_tags = log_tags
+
+    def sample(self, record):
+        """Validate `record` if it is in the sample."""
+        if self._rate < 1 and random.random() >= self._rate:
+            return
+        errors = []
+        self._validate(record, (), errors)
+        self.checked += 1
+        if not errors:
+            return
+        self.invalid += 1
+        for path, message in errors:
+            # Count violations by property, whatever the array index.
+            key = '.'.join('*' if isinstance(p, int) else p for p in path)
+            self.violations['{}: {}'.format(key, message)] += 1
+            if self._logged < MAX_LOGGED_VIOLATIONS:
+                self._logged += 1
+                logger.warning({'action': 'validate',
+                                'record_id': record.get('id'),
+                                'path': '.'.join(str(p) for p in path),
+                                'message': message,
+                                **self._log_tags})
+
+    def log_summary(self):
+        if not self.checked:
+            return
+        logger.info({'action': 'validate',
+                     'checked': self.checked,
+                     'invalid': self.invalid,
+                     'violations': dict(self.violations.most_common(20)),
+                     **self._log_tags})
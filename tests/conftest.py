@@ -0,0 +1,127 @@
+import contextlib
+import io
+import json
+import pytest
+from tap_mailchimp import tap as tap_module
+from tap_mailchimp.config import TapConfig
+from tap_mailchimp.state import TapState
+from tap_mailchimp.utils import datify_utc
+
+SCHEMAS = {
+    'lists': {'type': 'object',
+              'properties': {'id': {'type': 'string'},
+                             'name': {'type': 'string'},
+                             'stats': {'type': 'object',
+                                       'properties': {
+                                           'member_count': {'type': 'integer'}
+                                       }}}},
+    'campaigns': {'type': 'object',
+                  'properties': {'id': {'type': 'string'},
+                                 'emails_sent': {'type': 'integer'}}},
+    'lists.members': {'type': 'object',
+                      'properties': {'id': {'type': 'string'},
+                                     'list_id': {'type': 'string'},
+                                     'email_address': {'type': 'string'},
+                                     'last_changed': {'type': 'string',
+                                                      'format': 'date-time'}}},
+    'reports.email_activity': {'type': 'object',
+                               'properties': {
+                                   'campaign_id': {'type': 'string'},
+                                   'email_id': {'type': 'string'},
+                                   'activity': {'type': 'array',
+                                                'items': {'type': 'object'}}
+                               }}
+}
+
+
+def members(list_id):
+    n = int(list_id[1:]) * 3 + 2
+    return [{'id': '{}-{}'.format(list_id, j),
+             'list_id': list_id,
+             'email_address': 'a{}@example.com'.format(j),
+             'last_changed': '2020-01-0{}T00:00:00+00:00'.format(j % 9 + 1)}
+            for j in range(n)]
+
+
+def activity(campaign_id):
+    return [{'campaign_id': campaign_id, 'email_id': 'e{}'.format(j),
+             'activity': []}
+            for j in range(3)]
+
+
+class FakeClient:
+    """Stand-in for `MailChimp` serving three lists and two campaigns."""
+
+    items = {'lists': [{'id': 'L{}'.format(i), 'name': 'n',
+                        'stats': {'member_count': (i + 1) * 10}}
+                       for i in range(3)],
+             'campaigns': [{'id': 'C{}'.format(i), 'emails_sent': (i + 1) * 5}
+                           for i in range(2)]}
+
+    def __init__(self):
+        self.schema_fetches = []
+        self.cached_schemas = {}
+
+    def members(self, list_id):
+        return members(list_id)
+
+    def item_schema(self, endpoint):
+        if endpoint in self.cached_schemas:
+            return json.loads(json.dumps(self.cached_schemas[endpoint]))
+        self.schema_fetches.append(endpoint)
+        return json.loads(json.dumps(SCHEMAS[endpoint]))
+
+    def cache_item_schema(self, endpoint, schema):
+        self.cached_schemas[endpoint] = schema
+
+    def projection_args(self, endpoint, included, excluded=None):
+        return {}
+
+    def iter_items(self, endpoint, offset=0, deadline=None, **kwargs):
+        if endpoint in self.items:
+            items = self.items[endpoint]
+        elif endpoint == 'lists.members':
+            items = self.members(kwargs['list_id'])
+            since = kwargs.get('since_last_changed')
+            if since is not None:
+                items = [m for m in items
+                         if datify_utc(m['last_changed']) >= datify_utc(since)]
+            if kwargs.get('sort_field') == 'last_changed':
+                items = sorted(items, key=lambda m: m['last_changed'])
+        else:
+            items = activity(kwargs['campaign_id'])
+        yield from items[offset:]
+
+
+@pytest.fixture
+def run_tap(monkeypatch):
+    """Run a MailChimpTap on a `FakeClient` or the given client.
+
+    Returns the tap, its client and the singer messages it wrote.
+    """
+    def run(config=None, state=None, catalog=None, client=None):
+        client = client or FakeClient()
+        monkeypatch.setattr(tap_module, 'MailChimp',
+                            lambda *args, **kwargs: client)
+        cfg = {'user_name': 'user', 'api_key': '0' * 32 + '-us1',
+               'use_export': False, 'merge_fields_array': False,
+               'interests_array': False}
+        cfg.update(config or {})
+        tap = tap_module.MailChimpTap(TapConfig(cfg), TapState(state),
+                                      catalog=catalog)
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            tap.pour()
+        messages = [json.loads(line) for line in out.getvalue().splitlines()]
+        return tap, client, messages
+    return run
+
+
+def records(messages, stream=None):
+    return [m['record'] for m in messages
+            if m['type'] == 'RECORD' and (stream is None or
+                                          m['stream'] == stream)]
+
+
+def states(messages):
+    return [m['value'] for m in messages if m['type'] == 'STATE']
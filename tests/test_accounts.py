@@ -0,0 +1,108 @@
+"""Several accounts tapped in one process."""
+
+import contextlib
+import io
+import json
+import pytest
+from conftest import FakeClient, records
+from tap_mailchimp import accounts
+from tap_mailchimp import tap as tap_module
+from tap_mailchimp.main import main
+
+CONFIG = {'accounts': [{'account': 'acme', 'user_name': 'acme',
+                        'api_key': '0' * 32 + '-us1'},
+                       {'account': 'globex', 'user_name': 'globex',
+                        'api_key': '1' * 32 + '-us6'}],
+          'use_export': False, 'merge_fields_array': False,
+          'interests_array': False, 'http_metrics_interval': 30}
+
+
+@pytest.fixture
+def configured(monkeypatch):
+    """Calls of `http_metrics.configure`; the tap runs on `FakeClient`s."""
+    monkeypatch.setattr(tap_module, 'MailChimp',
+                        lambda *args, **kwargs: FakeClient())
+    calls = []
+    monkeypatch.setattr(accounts.http_metrics, 'configure',
+                        lambda **kwargs: calls.append(kwargs))
+    monkeypatch.setattr(tap_module.http_metrics, 'configure',
+                        lambda **kwargs: calls.append(kwargs))
+    return calls
+
+
+def pour(catalog=None):
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        accounts.MultiAccountTap(CONFIG, catalog=catalog).pour()
+    return [json.loads(line) for line in out.getvalue().splitlines()]
+
+
+def select(catalog, *stream_ids):
+    entries = []
+    for entry in catalog['streams']:
+        if entry['tap_stream_id'] in stream_ids:
+            entries.append(dict(entry, metadata=entry['metadata'] + [
+                {'breadcrumb': [], 'metadata': {'selected': True}}
+            ]))
+    return {'streams': entries}
+
+
+def test_discover_prefixes_streams(configured):
+    catalog = accounts.MultiAccountTap(CONFIG).discover()
+    ids = [e['tap_stream_id'] for e in catalog['streams']]
+    assert ids == ['{}__{}'.format(account, stream)
+                   for account in ('acme', 'globex')
+                   for stream in ('lists', 'list_members', 'campaigns',
+                                  'email_activity_reports')]
+    assert all(e['stream'] == e['tap_stream_id'] for e in catalog['streams'])
+
+
+def test_select_streams_per_account(configured):
+    catalog = accounts.MultiAccountTap(CONFIG).discover()
+    messages = pour(select(catalog, 'acme__lists', 'globex__campaigns'))
+    streams = {m['stream'] for m in messages if m['type'] == 'RECORD'}
+    assert streams == {'acme__lists', 'globex__campaigns'}
+    assert len(records(messages, 'acme__lists')) == 3
+
+
+def test_unprefixed_streams_select_every_account(configured):
+    catalog = accounts.MultiAccountTap(CONFIG).discover()
+    plain = {'streams': [dict(e, tap_stream_id='lists', stream='lists')
+                         for e in catalog['streams']
+                         if e['tap_stream_id'] == 'acme__lists']}
+    messages = pour(select(plain, 'lists'))
+    streams = {m['stream'] for m in messages if m['type'] == 'RECORD'}
+    assert streams == {'acme__lists', 'globex__lists'}
+
+
+def test_http_metrics_configured_once(configured):
+    pour()
+    assert configured == [{'raw': False, 'interval': 30}]
+
+
+def test_process_settings_per_account():
+    config = dict(CONFIG, accounts=[dict(CONFIG['accounts'][0],
+                                         raw_http_metrics=True)])
+    with pytest.raises(ValueError):
+        accounts.account_configs(config)
+
+
+def client(user_name, api_key, **kwargs):
+    if user_name == 'globex':
+        raise ValueError('Invalid API key')
+    return FakeClient()
+
+
+@pytest.mark.parametrize('accounts_, exit_code',
+                         [(CONFIG['accounts'][:1], 0), (CONFIG['accounts'], 1)])
+def test_exit_code(monkeypatch, tmp_path, accounts_, exit_code):
+    monkeypatch.setattr(tap_module, 'MailChimp', client)
+    path = tmp_path / 'config.json'
+    path.write_text(json.dumps(dict(CONFIG, accounts=accounts_)))
+    monkeypatch.setattr('sys.argv', ['tap-mailchimp', '-c', str(path)])
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        assert main() == exit_code
+    # The other account was still tapped.
+    assert records([json.loads(line) for line in
+                    out.getvalue().splitlines()], 'acme__lists')
@@ -0,0 +1,180 @@
+"""Batch operations against a local stand-in of the MailChimp batch API."""
+
+import io
+import json
+import tarfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+import pytest
+from tap_mailchimp.batch import BatchError, BatchOperations
+from tap_mailchimp.client import MailChimp
+
+MEMBERS = [{'id': 'm{}'.format(i)} for i in range(7)]
+
+
+class BatchApi:
+    """Serves /3.0/batches, the batch status and the tar.gz results.
+
+    Args:
+        polls (int): Status requests answered 'started' before 'finished'.
+        final_status (str): Status after `polls` requests.
+        files (int): JSON files the results are split into.
+        failed_operation (str): Operation id answered with a 404.
+        expired (bool): Answer the results download with a 403.
+    """
+
+    def __init__(self, polls=1, final_status='finished', files=2,
+                 failed_operation=None, expired=False):
+        self.polls = polls
+        self.final_status = final_status
+        self.files = files
+        self.failed_operation = failed_operation
+        self.expired = expired
+        self.operations = []
+        self.status_requests = 0
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers['Content-Length']))
+                api.operations = json.loads(body)['operations']
+                self._json({'id': 'b1', 'status': 'pending'})
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                if url.path == '/3.0/batches/b1':
+                    self._json(api.status())
+                elif url.path == '/results/b1.tar.gz':
+                    if api.expired:
+                        self.send_error(403)
+                    else:
+                        self._send(api.archive(), 'application/x-gzip')
+                elif url.path.endswith('/members'):
+                    # total_items of the collection.
+                    self._json({'total_items': len(MEMBERS)})
+                else:
+                    self.send_error(404)
+
+            def _json(self, obj):
+                self._send(json.dumps(obj).encode(), 'application/json')
+
+            def _send(self, body, content_type):
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = 'http://127.0.0.1:{}'.format(self.server.server_port)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def status(self):
+        self.status_requests += 1
+        if self.status_requests <= self.polls:
+            return {'id': 'b1', 'status': 'started'}
+        return {'id': 'b1', 'status': self.final_status,
+                'total_operations': len(self.operations),
+                'errored_operations': 0,
+                'response_body_url': self.url + '/results/b1.tar.gz'}
+
+    def archive(self):
+        results = [self.result(op) for op in self.operations]
+        buffer = io.BytesIO()
+        with tarfile.open(fileobj=buffer, mode='w:gz') as archive:
+            directory = tarfile.TarInfo('b1')
+            directory.type = tarfile.DIRTYPE
+            archive.addfile(directory)
+            for i in range(self.files):
+                data = json.dumps(results[i::self.files]).encode()
+                info = tarfile.TarInfo('b1/{}.json'.format(i))
+                info.size = len(data)
+                archive.addfile(info, io.BytesIO(data))
+        return buffer.getvalue()
+
+    def result(self, operation):
+        if operation['operation_id'] == self.failed_operation:
+            return {'operation_id': operation['operation_id'],
+                    'status_code': 404,
+                    'response': json.dumps({'title': 'Resource Not Found'})}
+        params = operation['params']
+        page = MEMBERS[params['offset']:params['offset'] + params['count']]
+        return {'operation_id': operation['operation_id'],
+                'status_code': 200,
+                'response': json.dumps({'members': page,
+                                        'total_items': len(MEMBERS)})}
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def batch_api(request):
+    api = BatchApi(**getattr(request, 'param', {}))
+    yield api
+    api.close()
+
+
+def operations(n):
+    return [{'method': 'GET', 'path': '/lists/L1/members',
+             'operation_id': str(i), 'params': {'count': 3, 'offset': 3 * i}}
+            for i in range(n)]
+
+
+def batch(api, **kwargs):
+    return BatchOperations(api.url + '/3.0', poll_interval=0.01, **kwargs)
+
+
+def test_results_of_every_file(batch_api):
+    results = list(batch(batch_api).run(operations(3)))
+    assert sorted(r['operation_id'] for r in results) == ['0', '1', '2']
+    ids = [m['id'] for r in results for m in r['response']['members']]
+    assert sorted(ids) == [m['id'] for m in MEMBERS]
+    assert batch_api.status_requests == 2
+
+
+@pytest.mark.parametrize('batch_api', [{'failed_operation': '1'}],
+                         indirect=True)
+def test_failed_operation(batch_api):
+    with pytest.raises(BatchError) as e:
+        list(batch(batch_api).run(operations(3)))
+    assert e.value.args[1]['status_code'] == 404
+
+
+@pytest.mark.parametrize('batch_api', [{'expired': True}], indirect=True)
+def test_expired_results(batch_api):
+    with pytest.raises(BatchError) as e:
+        list(batch(batch_api).run(operations(3)))
+    assert e.value.args[1]['status_code'] == 403
+
+
+@pytest.mark.parametrize('batch_api', [{'final_status': 'canceled'}],
+                         indirect=True)
+def test_failed_batch(batch_api):
+    with pytest.raises(BatchError) as e:
+        list(batch(batch_api).run(operations(3)))
+    assert e.value.args[1]['status'] == 'canceled'
+
+
+@pytest.mark.parametrize('batch_api', [{'polls': 1000}], indirect=True)
+def test_max_wait(batch_api):
+    with pytest.raises(BatchError) as e:
+        list(batch(batch_api, max_wait=0.05).run(operations(3)))
+    assert e.value.args[1]['status'] == 'started'
+
+
+@pytest.mark.parametrize('batch_api', [{'files': 3}], indirect=True)
+def test_client_batch_iter_items(batch_api):
+    # The installed mailchimp3 takes the API key first.
+    client = MailChimp('0' * 32 + '-us1', 'user', batch_poll_interval=0.01)
+    client._mc3.base_url = batch_api.url + '/3.0/'
+    items = list(client.batch_iter_items('lists.members', count=3,
+                                         list_id='L1'))
+    assert sorted(m['id'] for m in items) == [m['id'] for m in MEMBERS]
+    assert [op['params']['offset'] for op in batch_api.operations] == [0, 3, 6]
+    assert {op['path'] for op in batch_api.operations} == {'/lists/L1/members'}
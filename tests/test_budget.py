@@ -0,0 +1,63 @@
+"""Streams larger than the time budget of max_run_time."""
+
+from conftest import FakeClient, records, states
+
+LAST_RUN = '2020-01-01T00:00:00+00:00'
+# 100 list members per second learned by earlier runs.
+STATE = {'last_run': LAST_RUN, 'rates': {'list_members': 100}}
+
+
+class BigListClient(FakeClient):
+    """L2 reports 10M members; batch operations are served like pages."""
+
+    items = dict(FakeClient.items, lists=[
+        dict(l, stats={'member_count': 10 ** 7}) if l['id'] == 'L2' else l
+        for l in FakeClient.items['lists']
+    ])
+
+    def __init__(self):
+        super().__init__()
+        self.batch_args = {}
+
+    def batch_iter_items(self, endpoint, deadline=None, **kwargs):
+        self.batch_args[kwargs['list_id']] = kwargs
+        return self.iter_items(endpoint, deadline=deadline, **kwargs)
+
+
+def list_ids(messages):
+    return {m['list_id'] for m in records(messages, 'list_members')}
+
+
+def test_big_list_progresses_over_runs(run_tap):
+    config = {'max_run_time': 1}
+    state = STATE
+    for run in range(3):
+        _, _, messages = run_tap(config, state=state, client=BigListClient())
+        state = states(messages)[-1]
+        if run == 0:
+            assert list_ids(messages) == {'L0', 'L1', 'L2'}
+        assert state['last_run'] != LAST_RUN
+        assert state['deferred'] == {}
+    # Incremental runs estimate the next one from their own size, not
+    # from the list's member count.
+    assert state['estimates']['list_members']['L2'] == 1
+
+
+def test_big_batch_list_is_deferred(run_tap):
+    config = {'max_run_time': 1, 'use_list_member_batch': True}
+    _, _, first = run_tap(config, state=STATE, client=BigListClient())
+    assert list_ids(first) == {'L0', 'L1'}
+    state = states(first)[-1]
+    # The run still finishes; L2 is left to a later one.
+    assert state['last_run'] != LAST_RUN
+    assert state['deferred'] == {'list_members': {
+        'L2': {'start_date': LAST_RUN}}}
+
+    client = BigListClient()
+    config = {'use_list_member_batch': True}
+    _, _, second = run_tap(config, state=state, client=client)
+    assert list_ids(second) == {'L0', 'L1', 'L2'}
+    # L2 starts where the first run would have started it.
+    assert client.batch_args['L2']['since_last_changed'] == LAST_RUN
+    assert client.batch_args['L1']['since_last_changed'] != LAST_RUN
+    assert states(second)[-1]['deferred'] == {'list_members': {}}
@@ -0,0 +1,75 @@
+"""Columnar output of list members, read back with pyarrow."""
+
+import json
+import os
+import pytest
+from conftest import members, records, states
+
+pa = pytest.importorskip('pyarrow')
+import pyarrow.ipc  # noqa: E402
+import pyarrow.parquet  # noqa: E402
+
+LIST_IDS = ['L0', 'L1', 'L2']
+
+
+def run_columnar(run_tap, tmp_path, output_format):
+    return run_tap({'output_format': output_format,
+                    'output_dir': str(tmp_path),
+                    'output_file_rows': 2,
+                    'state_flush_records': 1})
+
+
+def read_table(path, output_format):
+    if output_format == 'parquet':
+        return pa.parquet.read_table(path)
+    with pa.ipc.open_file(path) as reader:
+        return reader.read_all()
+
+
+def manifest(tmp_path):
+    with open(os.path.join(str(tmp_path), 'manifest.jsonl')) as f:
+        return [json.loads(line) for line in f]
+
+
+@pytest.mark.parametrize('output_format', ['parquet', 'arrow'])
+def test_partitions(run_tap, tmp_path, output_format):
+    _, _, messages = run_columnar(run_tap, tmp_path, output_format)
+    assert records(messages, 'list_members') == []
+    entries = [e for e in manifest(tmp_path) if e['stream'] == 'list_members']
+    assert {e['item_id'] for e in entries} == set(LIST_IDS)
+    for list_id in LIST_IDS:
+        files = [e for e in entries if e['item_id'] == list_id]
+        # Two rows per file; the last one holds the rest.
+        assert [e['rows'] for e in files] == [
+            min(2, len(members(list_id)) - i)
+            for i in range(0, len(members(list_id)), 2)
+        ]
+        rows = []
+        for e in files:
+            assert e['format'] == output_format
+            assert e['path'].startswith(
+                os.path.join('list_members', 'list_id=' + list_id)
+            )
+            rows += read_table(os.path.join(str(tmp_path), e['path']),
+                               output_format).to_pylist()
+        assert rows == members(list_id)
+    with open(os.path.join(str(tmp_path), 'list_members',
+                           'schema.json')) as f:
+        assert 'email_address' in json.load(f)['properties']
+
+
+def test_offsets_count_flushed_rows(run_tap, tmp_path):
+    _, _, messages = run_columnar(run_tap, tmp_path, 'parquet')
+    counts = {}
+    for state in states(messages):
+        offset = state['bookmarks'].get('list_members', {}).get('offset', {})
+        for list_id, item in offset.items():
+            if 'count' in item:
+                counts.setdefault(list_id, []).append(item['count'])
+    assert set(counts) == set(LIST_IDS)
+    assert 2 in counts['L2']
+    for list_id, seen in counts.items():
+        n = len(members(list_id))
+        # Counts only move when a file is written.
+        assert set(seen) <= set(range(2, n, 2)) | {n}
+    assert states(messages)[-1]['bookmarks'] == {}
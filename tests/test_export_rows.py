@@ -0,0 +1,32 @@
+from tap_mailchimp.client import ApiVersionTool, ExportRow, Status
+
+HEADERS = ['Email Address', 'First Name', 'MEMBER_RATING', 'LAST_CHANGED',
+           'Age', 'First Name']
+MERGE_FIELDS = [{'type': 'text', 'name': 'First Name', 'tag': 'FNAME'},
+                {'type': 'number', 'name': 'Age', 'tag': 'AGE'}]
+
+
+def row(values, headers=HEADERS):
+    return ExportRow(headers, {h: i for i, h in enumerate(headers)}, values)
+
+
+def test_to_dict_matches_dict_of_zip_with_duplicate_headers():
+    values = ['a@example.com', 'Ann', '3', '2020-01-01 00:00:00', '41', 'Bo']
+    assert row(values).to_dict() == dict(zip(HEADERS, values))
+
+
+def test_compact_rows_expand_like_dict_rows():
+    mappings = ApiVersionTool.api_v3_map_with_merge_fields(MERGE_FIELDS)
+    headers = HEADERS[:-1]
+    plan = ApiVersionTool.compile_list_export_plan(
+        mappings, {h: i for i, h in enumerate(headers)}
+    )
+    for values in (['a@example.com', 'Ann', '3', '2020-01-01 00:00:00', '41'],
+                   ['b@example.com', '', '2', '', '2.5'],
+                   ['c@example.com', 'Cy']):
+        expected = ApiVersionTool.coerce_list_export_to_api_v3(
+            mappings, 'L1', Status.subscribed, row(values, headers).to_dict()
+        )
+        assert ApiVersionTool.expand_list_export_row(
+            plan, 'L1', Status.subscribed, values
+        ) == expected
@@ -0,0 +1,86 @@
+"""Fingerprint index lookups a page at a time and staged hashes."""
+
+import pytest
+from conftest import members, records
+from tap_mailchimp.fingerprints import FingerprintIndex
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = FingerprintIndex(str(tmp_path / 'fingerprints.db'))
+    yield index
+    index.close()
+
+
+def count_selects(index):
+    selects = []
+    index._conn.set_trace_callback(
+        lambda sql: selects.append(sql) if sql.startswith('SELECT') else None
+    )
+    return selects
+
+
+def pour(session, page, prefetch=True):
+    if prefetch:
+        session.prefetch(r['id'] for r in page)
+    return [r['id'] for r in page if session.changed(r['id'], r)]
+
+
+def test_one_lookup_per_page(index):
+    page = members('L2')
+    session = index.session('list_members', 'L2')
+    pour(session, page)
+    session.commit()
+    selects = count_selects(index)
+    session = index.session('list_members', 'L2')
+    page[3] = dict(page[3], email_address='new@example.com')
+    assert pour(session, page) == [page[3]['id']]
+    assert len(selects) == 1
+    assert (session.records, session.skipped) == (len(page), len(page) - 1)
+
+
+def test_records_not_prefetched(index):
+    page = members('L1')
+    session = index.session('list_members', 'L1')
+    pour(session, page)
+    session.commit()
+    session = index.session('list_members', 'L1')
+    assert pour(session, page, prefetch=False) == []
+
+
+def test_pending_hashes_are_staged(index):
+    page = members('L2')
+    session = index.session('list_members', 'L2', max_pending=3)
+    pour(session, page)
+    assert len(session._pending) < 3
+    staged = index._conn.execute(
+        'SELECT COUNT(*) FROM pending_fingerprints').fetchone()[0]
+    assert staged + len(session._pending) == len(page)
+    # Not stored before the stream finished.
+    assert index.lookup('list_members', 'L2', [r['id'] for r in page]) == {}
+    session.commit()
+    assert len(index.lookup('list_members', 'L2',
+                            [r['id'] for r in page])) == len(page)
+    assert index._conn.execute(
+        'SELECT COUNT(*) FROM pending_fingerprints').fetchone()[0] == 0
+
+
+def test_interrupted_session_is_discarded(index):
+    page = members('L2')
+    session = index.session('list_members', 'L2', max_pending=1)
+    pour(session, page)
+    session = index.session('list_members', 'L2')
+    session.commit()
+    assert index.lookup('list_members', 'L2', [r['id'] for r in page]) == {}
+    assert pour(session, page) == [r['id'] for r in page]
+
+
+def test_unchanged_members_are_skipped(run_tap, tmp_path):
+    config = {'fingerprint_index': str(tmp_path / 'fingerprints.db'),
+              'count': 2}
+    _, _, messages = run_tap(config)
+    assert len(records(messages, 'list_members')) == 2 + 5 + 8
+    _, _, messages = run_tap(config)
+    assert records(messages, 'list_members') == []
+    assert records(messages, 'email_activity_reports') == []
+    assert len(records(messages, 'lists')) == 3
@@ -0,0 +1,71 @@
+import pytest
+from tap_mailchimp import streams
+from tap_mailchimp import tap as tap_module
+from conftest import FakeClient, members, records, states
+
+INTERLEAVED = {'interleave_streams': 2, 'count': 2}
+
+
+def test_interleaved_run_taps_everything(run_tap):
+    _, _, messages = run_tap(INTERLEAVED)
+    members = records(messages, 'list_members')
+    assert len(members) == 2 + 5 + 8
+    # The largest list starts before the second largest is done.
+    order = [m['list_id'] for m in members]
+    assert order.index('L2') < len(order) - order[::-1].index('L1') - 1
+
+
+def test_interleaved_run_resumes_after_stop(run_tap, monkeypatch):
+    checks = iter(range(1000))
+    monkeypatch.setattr(tap_module.MailChimpTap, '_check_stop',
+                        lambda self: next(checks) >= 6)
+    _, _, first = run_tap(INTERLEAVED)
+    monkeypatch.undo()
+    _, _, second = run_tap(INTERLEAVED, state=states(first)[-1])
+    first_ids = [m['id'] for m in records(first, 'list_members')]
+    second_ids = [m['id'] for m in records(second, 'list_members')]
+    assert len(first_ids) == len(set(first_ids))
+    assert len(set(first_ids + second_ids)) == 2 + 5 + 8
+    # A stopped list resumes from the last change it emitted, which is
+    # emitted again.
+    stopped = {m['list_id'] for m in records(second, 'list_members')}
+    assert len(set(first_ids) & set(second_ids)) <= len(stopped)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+
+class SlowClient(FakeClient):
+    """Lists of 200 members, each taking 10 ms of `clock` to fetch."""
+
+    items = dict(FakeClient.items, lists=FakeClient.items['lists'][:2])
+
+    def __init__(self, clock):
+        super().__init__()
+        self.clock = clock
+
+    def members(self, list_id):
+        return [dict(m, id='{}-{}'.format(list_id, i))
+                for i in range(200) for m in members(list_id)[:1]]
+
+    def iter_items(self, endpoint, offset=0, deadline=None, **kwargs):
+        for item in super().iter_items(endpoint, offset, deadline, **kwargs):
+            if endpoint == 'lists.members':
+                self.clock.now += 0.01
+            yield item
+
+
+def test_interleaved_rate(run_tap, monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(streams, 'time', clock)
+    _, _, messages = run_tap({'interleave_streams': 2, 'count': 50},
+                             client=SlowClient(clock))
+    assert len(records(messages, 'list_members')) == 400
+    # 100 records per second of each stream's own turns.
+    assert states(messages)[-1]['rates']['list_members'] == \
+        pytest.approx(100)
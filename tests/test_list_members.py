@@ -0,0 +1,45 @@
+"""List members resumed by their last change after a stopped run."""
+
+from conftest import FakeClient, members, records, states
+from tap_mailchimp import tap as tap_module
+
+CONFIG = {'count': 2, 'interleave_streams': 1}
+
+
+class ChangingClient(FakeClient):
+    """Serves the list L2, whose first member changes once `changed`."""
+
+    items = dict(FakeClient.items, lists=FakeClient.items['lists'][2:])
+    changed = False
+
+    def members(self, list_id):
+        items = members(list_id)
+        if self.changed:
+            items[0] = dict(items[0],
+                            last_changed='2020-02-01T00:00:00+00:00')
+        return items
+
+
+def test_resume_after_a_member_changed(run_tap, monkeypatch):
+    client = ChangingClient()
+    checks = iter(range(1000))
+    # Stop L2 after two pages.
+    monkeypatch.setattr(tap_module.MailChimpTap, '_check_stop',
+                        lambda self: next(checks) >= 6)
+    _, _, first = run_tap(CONFIG, client=client)
+    monkeypatch.undo()
+    state = states(first)[-1]
+    assert state['bookmarks']['list_members']['offset']['L2'] == {
+        'count': 4, 'last_changed': '2020-01-04T00:00:00+00:00'
+    }
+    client.changed = True
+    _, _, second = run_tap(CONFIG, state=state, client=client)
+    first_ids = [m['id'] for m in records(first, 'list_members')]
+    second_ids = [m['id'] for m in records(second, 'list_members')]
+    assert first_ids == ['L2-0', 'L2-1', 'L2-2', 'L2-3']
+    # The last member emitted is emitted again, then the rest of the list
+    # including the member that changed.
+    assert second_ids == ['L2-3', 'L2-4', 'L2-5', 'L2-6', 'L2-7', 'L2-0']
+    assert states(second)[-1]['high_water_marks']['list_members'] == {
+        'L2': '2020-02-01T00:00:00+00:00'
+    }
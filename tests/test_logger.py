@@ -0,0 +1,77 @@
+"""Log records written on a background thread with `async_logging`."""
+
+import logging
+import threading
+import pytest
+import singer.metrics
+from tap_mailchimp import logger
+
+
+class Capture(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append((record, record.getMessage(),
+                             threading.current_thread().name))
+
+
+@pytest.fixture
+def capture():
+    root = logger.get_logger()
+    handler = Capture()
+    root.addHandler(handler)
+    yield handler
+    root.removeHandler(handler)
+
+
+def test_records_keep_the_calling_thread(capture):
+    obj = {'action': 'a'}
+
+    def work():
+        logger.info(obj)
+        obj['action'] = 'changed'
+
+    with logger.async_logging():
+        thread = threading.Thread(target=work, name='worker')
+        thread.start()
+        thread.join()
+    (record, message, emitted_by), = capture.records
+    assert record.threadName == 'worker'
+    assert emitted_by not in ('worker', threading.current_thread().name)
+    assert logger.parse('INFO ' + message) == {'action': 'a',
+                                               'level': 'info'}
+
+
+def test_singer_metrics(capture):
+    root = logger.get_logger()
+    handlers = list(root.handlers)
+    with logger.async_logging():
+        with singer.metrics.record_counter('lists') as counter:
+            counter.increment(3)
+        # singer did not reload its logging config over the queue handler.
+        assert root.handlers[0].__class__.__name__ == '_QueueHandler'
+    assert root.handlers == handlers
+    (record, message, emitted_by), = capture.records
+    assert message.startswith('METRIC: ')
+    assert '"value": 3' in message
+    assert emitted_by != threading.current_thread().name
+
+
+def test_exceptions_are_formatted_by_the_caller(capture):
+    with logger.async_logging():
+        try:
+            raise ValueError('boom')
+        except ValueError:
+            logger.get_logger().exception('failed')
+    (record, message, _), = capture.records
+    assert record.exc_info is None
+    assert 'ValueError: boom' in message
+
+
+def test_disabled(capture):
+    with logger.async_logging(enabled=False):
+        logger.info({'action': 'a'})
+    (_, _, emitted_by), = capture.records
+    assert emitted_by == threading.current_thread().name
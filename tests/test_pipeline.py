@@ -0,0 +1,73 @@
+"""Item streams poured on worker threads by PipelineScheduler."""
+
+import threading
+from conftest import records, states
+from tap_mailchimp.state import TapState
+from tap_mailchimp.tap import PipelineScheduler
+
+
+class Item:
+
+    def __init__(self, item_id, size=0, stream_id='list_members'):
+        self.stream_id = stream_id
+        self.item_id = item_id
+        self.size = size
+
+
+def test_scheduler_pours_largest_first():
+    poured = []
+    started = threading.Event()
+    release = threading.Event()
+
+    def pour(stream):
+        if not poured:
+            # Hold the only worker until every stream is queued.
+            started.set()
+            release.wait(5)
+        poured.append(stream.item_id)
+        return True
+
+    with PipelineScheduler(pour, 1,
+                           priority=lambda s: s.size) as scheduler:
+        scheduler.submit(Item('first'))
+        assert started.wait(5)
+        for item_id, size in [('a', 1), ('b', 3), ('c', 2), ('d', 3)]:
+            scheduler.submit(Item(item_id, size))
+        # Already queued, not poured again.
+        scheduler.submit(Item('b', 3))
+        release.set()
+    assert poured == ['first', 'b', 'd', 'c', 'a']
+    assert scheduler.ok
+
+
+def test_scheduler_keeps_going_after_a_failing_stream():
+    poured = []
+
+    def pour(stream):
+        if stream.item_id == 'bad':
+            raise ValueError('failed')
+        poured.append(stream.item_id)
+        return stream.item_id != 'false'
+
+    with PipelineScheduler(pour, 2) as scheduler:
+        for item_id in ['a', 'bad', 'b', 'false', 'c']:
+            scheduler.submit(Item(item_id))
+    assert sorted(poured) == ['a', 'b', 'c', 'false']
+    assert not scheduler.ok
+
+
+def test_pipelined_run_leaves_currently_syncing_unset(run_tap, monkeypatch):
+    syncing = []
+    set_attr = TapState.__setattr__
+
+    def record_syncing(state, name, value):
+        if name == 'currently_syncing' and value is not None:
+            syncing.append(value)
+        set_attr(state, name, value)
+
+    monkeypatch.setattr(TapState, '__setattr__', record_syncing)
+    _, _, messages = run_tap({'pipeline_workers': 3})
+    assert {r['list_id'] for r in records(messages, 'list_members')} == \
+        {'L0', 'L1', 'L2'}
+    assert syncing == []
+    assert states(messages)[-1]['last_run'] is not None
@@ -0,0 +1,79 @@
+"""Merging the states of the shards of a run."""
+
+from tap_mailchimp.shards import merge_states, shard_of
+
+
+def shard_state(**kwargs):
+    state = {'last_run': '2020-01-01T00:00:00+00:00',
+             'current_run': '2020-02-01T00:00:00+00:00',
+             'bookmarks': {}}
+    state.update(kwargs)
+    return state
+
+
+def test_shard_of_is_stable():
+    assert [shard_of(i, 3) for i in ('L1', 'L2', 'L3')] == \
+        [shard_of(i, 3) for i in ('L1', 'L2', 'L3')]
+    assert {shard_of('L{}'.format(i), 3) for i in range(100)} == {0, 1, 2}
+
+
+def test_done_and_in_progress_shards():
+    done = shard_state(
+        current_run=None, last_run='2020-02-01T00:00:00+00:00',
+        bookmarks={'lists.members': {
+            'ids': ['L1'], 'done': True, 'offset': {}}}
+    )
+    running = shard_state(bookmarks={'lists.members': {
+        'ids': ['L2'], 'done': False,
+        'offset': {'L2': {'offset': 300}, 'L3': {'done': True}}}})
+    merged = merge_states([done, running])
+    assert merged['bookmarks']['lists.members'] == {
+        'ids': ['L1', 'L2'], 'done': False,
+        'offset': {'L2': {'offset': 300}, 'L3': {'done': True}}
+    }
+    # The finished shard has no current run; the running one's is kept.
+    assert merged['current_run'] == '2020-02-01T00:00:00+00:00'
+    assert merged['last_run'] == '2020-01-01T00:00:00+00:00'
+    assert merged['currently_syncing'] is None
+
+
+def test_all_shards_done():
+    states = [shard_state(current_run=None,
+                          bookmarks={'lists': {'done': True, 'ids': [i],
+                                               'offset': {'offset': 5}}})
+              for i in ('L1', 'L2')]
+    merged = merge_states(states)
+    assert merged['current_run'] is None
+    assert merged['bookmarks']['lists'] == {'ids': ['L1', 'L2'],
+                                            'done': True, 'offset': {}}
+
+
+def test_lowest_offset_and_high_water_mark_win():
+    a = shard_state(
+        bookmarks={'campaigns': {'offset': {'offset': 200}}},
+        high_water_marks={'lists.members': {
+            'L1': '2020-01-20T00:00:00+00:00',
+            'L2': '2020-01-05T00:00:00+00:00'}}
+    )
+    b = shard_state(
+        bookmarks={'campaigns': {'offset': {'offset': 100}}},
+        high_water_marks={'lists.members': {
+            'L1': '2020-01-10T00:00:00+00:00',
+            'L3': '2020-01-15T00:00:00+00:00'}}
+    )
+    merged = merge_states([a, b])
+    assert merged['bookmarks']['campaigns']['offset'] == {'offset': 100}
+    assert merged['high_water_marks'] == {'lists.members': {
+        'L1': '2020-01-10T00:00:00+00:00',
+        'L2': '2020-01-05T00:00:00+00:00',
+        'L3': '2020-01-15T00:00:00+00:00'}}
+
+
+def test_last_run():
+    earliest = shard_state(last_run='2019-12-01T00:00:00+00:00')
+    later = shard_state(last_run='2020-01-01T00:00:00+00:00')
+    assert merge_states([later, earliest])['last_run'] == \
+        '2019-12-01T00:00:00+00:00'
+    # A shard that never finished a run makes the next run a full one.
+    first = shard_state(last_run=None)
+    assert merge_states([later, first])['last_run'] is None
@@ -0,0 +1,42 @@
+"""Import time of the tap's entry point, measured with ``-X importtime``."""
+
+import os
+import subprocess
+import sys
+
+# Modules only needed once a sync runs or an option is enabled.
+DEFERRED = ('mailchimp3', 'ijson', 'pyarrow')
+# Microseconds; about 2 ms of the tap's own modules and 70 ms in all here.
+OWN_BUDGET = 30000
+TOTAL_BUDGET = 1000000
+
+SRC = os.path.join(os.path.dirname(__file__), '..', 'src')
+
+
+def import_times(module):
+    """Self and cumulative import time in microseconds, by module name."""
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(
+        p for p in (SRC, env.get('PYTHONPATH')) if p
+    )
+    stderr = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import ' + module],
+        env=env, stderr=subprocess.PIPE, universal_newlines=True, check=True
+    ).stderr
+    times = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        own, cumulative, name = line[len('import time:'):].split('|')
+        times[name.strip()] = (int(own), int(cumulative))
+    return times
+
+
+def test_main_import():
+    times = import_times('tap_mailchimp.main')
+    imported = {name.split('.')[0] for name in times}
+    assert not imported & set(DEFERRED)
+    own = sum(t[0] for name, t in times.items()
+              if name.split('.')[0] == 'tap_mailchimp')
+    assert own < OWN_BUDGET
+    assert times['tap_mailchimp.main'][1] < TOTAL_BUDGET
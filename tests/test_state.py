@@ -0,0 +1,105 @@
+"""State messages stitched from cached bookmarks match the state dict."""
+
+import json
+import threading
+import tap_mailchimp.jsonext as jsonext
+from tap_mailchimp.state import TapState
+
+
+def state_with_writer(state=None):
+    written = []
+    return TapState(state, writer=written.append), written
+
+
+def expected(state):
+    return json.loads(jsonext.dumps(state))
+
+
+def test_updates():
+    state, written = state_with_writer(
+        {'bookmarks': {'lists': {'done': True}},
+         'last_run': '2020-01-01T00:00:00+00:00'}
+    )
+    steps = [
+        lambda: state.set_offset('lists.members', 'L1', {'offset': 100}),
+        lambda: state.set_id_count('lists.members', 'L1', 7),
+        lambda: state.set_high_water_mark('lists.members', 'L1',
+                                          '2020-02-03T00:00:00+00:00'),
+        lambda: state.set_page_size('/lists/{list_id}/members', 500),
+        lambda: state.set_id_done('lists.members', 'L1'),
+        lambda: state.set_done('campaigns'),
+        lambda: state.set_done('lists.members'),
+        lambda: state.set_done('lists', False),
+    ]
+    for step in steps:
+        step()
+        state.write_state()
+        assert json.loads(written[-1]) == expected(state)
+
+
+def test_unchanged_streams_keep_their_bookmarks():
+    state, written = state_with_writer()
+    state.set_offset('campaigns', 'offset', 50)
+    state.write_state()
+    state.set_offset('lists', 'offset', 10)
+    state.write_state()
+    assert json.loads(written[-1])['bookmarks'] == {
+        'campaigns': {'offset': {'offset': 50}},
+        'lists': {'offset': {'offset': 10}}
+    }
+
+
+def test_finalize_run_drops_cached_bookmarks():
+    state, written = state_with_writer(
+        {'bookmarks': {'lists': {'done': True}}}
+    )
+    state.write_state()
+    state.finalize_run()
+    state.write_state()
+    assert json.loads(written[-1])['bookmarks'] == {}
+    state.set_offset('campaigns', 'offset', 5)
+    state.write_state()
+    assert json.loads(written[-1]) == expected(state)
+
+
+def test_non_ascii_ids():
+    state, written = state_with_writer()
+    state.set_id_offset('reports.email_activity', 'café ☃ "q"',
+                        'offset', 3)
+    state.set_high_water_mark('lists.members', 'リスト', 'x')
+    state.write_state()
+    assert json.loads(written[-1]) == expected(state)
+
+
+def test_concurrent_updates():
+    state, written = state_with_writer()
+    state.configure_flush(interval=None, records=10)
+
+    def work(thread):
+        for i in range(200):
+            state.set_id_offset('lists.members', 'L{}'.format(thread),
+                                'offset', i)
+            state.record_written(100)
+            state.sync()
+
+    threads = [threading.Thread(target=work, args=(t,)) for t in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    state.sync(force=True)
+    assert len(written) > 1
+    for value_json in written:
+        json.loads(value_json)
+    assert json.loads(written[-1]) == expected(state)
+    assert json.loads(written[-1])['bookmarks']['lists.members']['offset'] == {
+        'L{}'.format(t): {'offset': 199} for t in range(4)
+    }
+
+
+def test_read_only():
+    state, written = state_with_writer()
+    state.read_only = True
+    state.set_done('lists')
+    state.sync(force=True)
+    assert written == []
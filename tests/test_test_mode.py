@@ -0,0 +1,35 @@
+from conftest import records, states
+
+SAMPLE = {'test_mode': True, 'test_mode_records': 2,
+          'test_mode_item_streams': 1}
+
+
+def test_sample_is_bounded(run_tap):
+    _, _, messages = run_tap(SAMPLE)
+    members = records(messages, 'list_members')
+    assert len(members) == 2
+    assert len({m['list_id'] for m in members}) == 1
+    assert len(records(messages, 'email_activity_reports')) == 2
+
+
+def test_sample_leaves_no_state(run_tap):
+    tap, _, messages = run_tap(SAMPLE)
+    assert states(messages) == []
+    assert not tap.state.get_done('lists')
+    assert tap.state.high_water_marks == {}
+    assert tap.state.last_run is None
+
+
+def test_full_run_after_sample_taps_everything(run_tap):
+    run_tap(SAMPLE)
+    _, _, messages = run_tap()
+    assert len(records(messages, 'list_members')) == 2 + 5 + 8
+
+
+def test_sample_reads_schemas_from_catalog_cache(run_tap, tmp_path):
+    config = dict(SAMPLE, catalog_cache=str(tmp_path / 'catalog.json'))
+    _, client, _ = run_tap(config)
+    assert client.schema_fetches
+    _, client, messages = run_tap(config)
+    assert client.schema_fetches == []
+    assert records(messages, 'lists')
@@ -0,0 +1,57 @@
+import pytest
+from tap_mailchimp.config import TapConfig
+from tap_mailchimp.utils import roundrobin, weighted_roundrobin
+
+CONFIG = {'user_name': 'user', 'api_key': 'key-us1'}
+
+
+def test_roundrobin():
+    assert ''.join(roundrobin('ABC', 'D', 'EF')) == 'ADEBFC'
+
+
+def test_weighted_roundrobin():
+    assert ''.join(weighted_roundrobin([('ABC', 3), ('DE', 2), ('F', 1)],
+                                       width=2)) == 'ABCDEF'
+    assert ''.join(weighted_roundrobin([('ABCD', 1), ('E', 1), ('FG', 1)],
+                                       width=2)) == 'AEBCFDG'
+    assert ''.join(weighted_roundrobin([('AB', 1), ('CD', 2)])) == 'ACDB'
+
+
+def test_weighted_roundrobin_closes_started_iterators():
+    closed = []
+
+    def gen(name):
+        try:
+            yield from name * 3
+        finally:
+            closed.append(name)
+
+    turns = weighted_roundrobin(((gen(n), 1) for n in 'ABC'), width=2)
+    assert next(turns) == 'A'
+    assert next(turns) == 'B'
+    turns.close()
+    assert sorted(closed) == ['A', 'B']
+
+
+@pytest.mark.parametrize('weight', [0, -1])
+def test_weighted_roundrobin_rejects_weights_below_one(weight):
+    with pytest.raises(ValueError):
+        list(weighted_roundrobin([('AB', weight)]))
+
+
+@pytest.mark.parametrize('weight', [0, -2, 1.5, '2', True])
+def test_config_rejects_bad_interleave_weights(weight):
+    with pytest.raises(ValueError):
+        TapConfig(dict(CONFIG, interleave_weights={'list_members': weight}))
+
+
+def test_config_accepts_interleave_weights():
+    config = TapConfig(dict(CONFIG, interleave_weights={'list_members': 3}))
+    assert config.interleave_weights == {'list_members': 3}
+
+
+@pytest.mark.parametrize('interleave', [{'interleave_streams': 2},
+                                        {'interleave_weights': {'x': 2}}])
+def test_config_rejects_interleave_with_pipeline_workers(interleave):
+    with pytest.raises(ValueError):
+        TapConfig(dict(CONFIG, pipeline_workers=2, **interleave))
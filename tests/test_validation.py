@@ -0,0 +1,92 @@
+"""Compiled schemas agree with jsonschema, which singer targets validate with."""
+
+from datetime import datetime
+import pytest
+from jsonschema import Draft4Validator, FormatChecker
+from tap_mailchimp.validation import RecordValidator, compile_schema
+
+# jsonschema only checks date-time with an optional RFC 3339 package.
+format_checker = FormatChecker([])
+
+
+@format_checker.checks('date-time', raises=ValueError)
+def is_date_time(value):
+    if not isinstance(value, str):
+        return True
+    if len(value) < 19 or value[10] not in 'T ':
+        return False
+    datetime.fromisoformat(value.replace('Z', '+00:00'))
+    return True
+
+
+CASES = [
+    ({'type': ['null', 'string']},
+     [None, 'a', '', 1, 1.5, True, [], {}]),
+    ({'type': ['null', 'integer']},
+     [None, 0, 3, -1, 1.5, True, False, '1']),
+    ({'type': 'number'},
+     [0, 1.5, -2, True, None, '1.5']),
+    ({'anyOf': [{'type': 'null'},
+                {'type': 'string', 'enum': ['a', 'b']},
+                {'type': 'object', 'properties': {'x': {'type': 'integer'}},
+                 'required': ['x']}]},
+     [None, 'a', 'c', {'x': 1}, {'x': '1'}, {}, 1, []]),
+    ({'type': ['null', 'array'],
+      'items': {'type': 'array', 'items': {'type': ['null', 'integer']}}},
+     [None, [], [[]], [[1, None, 2]], [[1, 'x']], [1], [[1], [2.5]],
+      [[[1]]], 'x']),
+    ({'type': 'array',
+      'items': {'type': 'object',
+                'properties': {'tags': {'type': 'array',
+                                        'items': {'type': 'string'}}}}},
+     [[], [{}], [{'tags': []}], [{'tags': ['a', 'b']}], [{'tags': [1]}],
+      [{'tags': 'a'}], [None]]),
+    ({'type': ['null', 'string'], 'format': 'date-time'},
+     [None, '2020-01-02T03:04:05Z', '2020-01-02T03:04:05+00:00',
+      '2020-01-02T03:04:05.123+02:00', '2020-01-02 03:04:05',
+      '2020-01-02T03:04:05', '2020-01-02', '2020-13-02T03:04:05Z',
+      '2020-01-32T03:04:05Z', '2020-01-02T24:04:05Z', 'yesterday', '', 5]),
+    ({'type': 'object',
+      'properties': {'id': {'type': 'string'}},
+      'additionalProperties': False},
+     [{}, {'id': 'a'}, {'id': 1}, {'other': 1}, {'id': 'a', 'x': None},
+      [], None]),
+    ({'type': 'object',
+      'properties': {'id': {'type': 'string'}},
+      'additionalProperties': {'type': 'integer'}},
+     [{'id': 'a'}, {'id': 'a', 'n': 1}, {'n': 'x'}, {'n': 1, 'm': 2.5}]),
+    ({'type': 'object',
+      'properties': {'merge_fields': {
+          'type': ['null', 'object'],
+          'additionalProperties': {'type': ['null', 'string', 'number']}}},
+      'required': ['merge_fields']},
+     [{'merge_fields': None}, {'merge_fields': {'FNAME': 'a', 'SCORE': 1}},
+      {'merge_fields': {'ADDR': {'city': 'x'}}}, {}]),
+]
+
+
+@pytest.mark.parametrize('schema, values', CASES)
+def test_agrees_with_jsonschema(schema, values):
+    validate = compile_schema(schema)
+    reference = Draft4Validator(schema, format_checker=format_checker)
+    for value in values:
+        errors = []
+        validate(value, (), errors)
+        assert (not errors) == reference.is_valid(value), value
+
+
+def test_error_paths():
+    validate = compile_schema(CASES[5][0])
+    errors = []
+    validate([{'tags': ['a']}, {'tags': ['b', 2]}], (), errors)
+    assert errors == [((1, 'tags', 1), 'expected string, got int')]
+
+
+def test_record_validator_counts_by_property():
+    validator = RecordValidator(CASES[5][0]['items'], 1, {})
+    validator.sample({'tags': [1, 2]})
+    validator.sample({'tags': ['a']})
+    assert (validator.checked, validator.invalid) == (2, 1)
+    assert validator.violations == {
+        'tags.*: expected string, got int': 2
+    }